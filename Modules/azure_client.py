@@ -0,0 +1,94 @@
+import os
+import queue
+import asyncio
+import threading
+import concurrent.futures
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+
+
+# -------------------------------------------------------
+# Process-wide Azure OpenAI client on a persistent event loop
+#   One AsyncAzureOpenAI + pooled httpx connections shared by every module
+#   and every Streamlit session, instead of a fresh client (and TLS handshake)
+#   per rerun. All coroutines run on one background loop so the pool's
+#   keep-alive connections are never orphaned by a closed per-rerun loop.
+# -------------------------------------------------------
+load_dotenv()
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "180"))
+
+_lock = threading.Lock()
+_loop = None
+_client = None
+
+
+def get_event_loop():
+    """Start (once) and return the background event loop that owns the shared client."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
+
+
+def get_async_client():
+    """Return the shared AsyncAzureOpenAI client with a tuned keep-alive connection pool."""
+    global _client
+    with _lock:
+        if _client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+                timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT_SECONDS, connect=10.0),
+            )
+            _client = AsyncAzureOpenAI(
+                azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
+                api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
+                api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION"),
+                http_client=http_client,
+                max_retries=0,  # retries/backoff are handled by Modules.scheduler
+            )
+        return _client
+
+
+class UiDispatcher:
+    """
+    Streamlit elements may only be touched from the script thread.
+    Callbacks fired on the background loop are queued here and replayed by run_async.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def wrap(self, fn):
+        def dispatch(*args, **kwargs):
+            self._queue.put((fn, args, kwargs))
+        return dispatch
+
+    def drain(self):
+        while True:
+            try:
+                fn, args, kwargs = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args, **kwargs)
+
+
+def run_async(coro, ui=None, poll_interval=0.05):
+    """Run a coroutine on the shared loop and block until it finishes, replaying UI callbacks meanwhile."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    if ui is not None:
+        while not future.done():
+            concurrent.futures.wait([future], timeout=poll_interval)
+            ui.drain()
+        ui.drain()
+    return future.result()
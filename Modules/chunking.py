@@ -0,0 +1,267 @@
+import os
+import re
+from dotenv import load_dotenv
+from PyPDF2 import PdfReader
+import docx
+from pptx import Presentation
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from Modules.embeddings import EMBEDDING_MODEL_NAME, get_passage_tokenizer
+
+
+# -------------------------------------------------------
+# Passage chunking for the reference knowledge base
+#   Documents are read as ordered blocks (headings, paragraphs, tables) and
+#   packed into passages small enough for the embedding model's window.
+#   Headings start a new passage and are carried as context; tables are kept
+#   whole when they fit, otherwise split by rows with the header repeated.
+# -------------------------------------------------------
+load_dotenv()
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces, so passages stay well below that.
+# Sizes are counted in the embedding model's own word pieces (not LLM tokens).
+KB_CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "180"))
+KB_CHUNK_OVERLAP_TOKENS = int(os.getenv("KB_CHUNK_OVERLAP_TOKENS", "30"))
+# Bump when the chunking rules change so the index is rebuilt
+CHUNKER_VERSION = "v2"
+
+_PDF_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.)\s+[A-Z][^.!?]{2,80}$")
+
+
+def chunker_config():
+    """Settings that change passage boundaries (stored in the index manifest)."""
+    return {
+        "version": CHUNKER_VERSION, "tokenizer": EMBEDDING_MODEL_NAME,
+        "chunk_tokens": KB_CHUNK_TOKENS, "overlap_tokens": KB_CHUNK_OVERLAP_TOKENS,
+    }
+
+
+# -------------------------------------------------------
+# Block extraction
+# -------------------------------------------------------
+
+def _table_rows(table):
+    rows = []
+    for row in table.rows:
+        cells = []
+        for cell in row.cells:
+            text = " ".join(cell.text.split())
+            # Merged cells repeat the same object; keep one copy
+            if not cells or cells[-1] != text:
+                cells.append(text)
+        if any(cells):
+            rows.append(cells)
+    return rows
+
+
+def extract_docx_blocks(path):
+    """Heading / paragraph / table blocks of a DOCX in document order."""
+    document = docx.Document(path)
+    blocks = []
+    for element in document.element.body.iterchildren():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            para = Paragraph(element, document)
+            text = para.text.strip()
+            if not text:
+                continue
+            style = para.style.name if para.style is not None else ""
+            match = re.match(r"Heading (\d)", style)
+            if match or style == "Title":
+                blocks.append({"type": "heading", "text": text, "level": int(match.group(1)) if match else 1})
+            else:
+                blocks.append({"type": "paragraph", "text": text})
+        elif tag == "tbl":
+            rows = _table_rows(Table(element, document))
+            if rows:
+                blocks.append({"type": "table", "rows": rows})
+    return blocks
+
+
+def extract_pdf_blocks(path):
+    """Paragraph blocks of a PDF (numbered short lines become headings), tagged with page numbers."""
+    blocks = []
+    reader = PdfReader(path)
+    for page_number, page in enumerate(reader.pages, start=1):
+        text = page.extract_text() or ""
+        for para in re.split(r"\n\s*\n", text):
+            lines = [line.strip() for line in para.split("\n") if line.strip()]
+            current = []
+            for line in lines:
+                if _PDF_HEADING.match(line):
+                    if current:
+                        blocks.append({"type": "paragraph", "text": " ".join(current), "page": page_number})
+                        current = []
+                    level = line.split()[0].rstrip(".").count(".") + 1
+                    blocks.append({"type": "heading", "text": line, "level": level, "page": page_number})
+                else:
+                    current.append(line)
+            if current:
+                blocks.append({"type": "paragraph", "text": " ".join(current), "page": page_number})
+    return blocks
+
+
+def extract_pptx_blocks(path):
+    """Per slide: the title as a heading, then text frames and tables, tagged with the slide number."""
+    blocks = []
+    presentation = Presentation(path)
+
+    def shape_blocks(shape, slide_number):
+        if getattr(shape, "has_table", False) and shape.has_table:
+            rows = [[" ".join(cell.text.split()) for cell in row.cells] for row in shape.table.rows]
+            rows = [row for row in rows if any(row)]
+            return [{"type": "table", "rows": rows, "page": slide_number}] if rows else []
+        if hasattr(shape, "shapes"):  # grouped shapes
+            return [b for sub_shape in shape.shapes for b in shape_blocks(sub_shape, slide_number)]
+        if getattr(shape, "has_text_frame", False) and shape.has_text_frame:
+            return [
+                {"type": "paragraph", "text": " ".join(p.text.split()), "page": slide_number}
+                for p in shape.text_frame.paragraphs if p.text.strip()
+            ]
+        return []
+
+    for slide_number, slide in enumerate(presentation.slides, start=1):
+        title_shape = slide.shapes.title
+        title = " ".join(title_shape.text.split()) if title_shape is not None and title_shape.has_text_frame else ""
+        blocks.append({"type": "heading", "text": title or f"Slide {slide_number}", "level": 1, "page": slide_number})
+        for shape in slide.shapes:
+            if title_shape is not None and shape.shape_id == title_shape.shape_id:
+                continue
+            blocks.extend(shape_blocks(shape, slide_number))
+    return blocks
+
+
+def extract_blocks(path):
+    if path.endswith(".docx"):
+        return extract_docx_blocks(path)
+    if path.endswith(".pptx"):
+        return extract_pptx_blocks(path)
+    if path.endswith(".pdf"):
+        return extract_pdf_blocks(path)
+    return []
+
+
+# -------------------------------------------------------
+# Packing blocks into passages
+# -------------------------------------------------------
+
+def _token_spans(text):
+    """(start, end) character offsets of each word piece of text."""
+    return get_passage_tokenizer().encode(text, add_special_tokens=False).offsets
+
+
+def count_passage_tokens(text):
+    return len(_token_spans(text))
+
+
+def _split_long_text(text, chunk_tokens, overlap_tokens):
+    """Cut text longer than a passage on token boundaries with overlap (pieces are slices of the original text)."""
+    spans = _token_spans(text)
+    step = max(1, chunk_tokens - overlap_tokens)
+    return [text[spans[i][0]:spans[min(i + chunk_tokens, len(spans)) - 1][1]] for i in range(0, len(spans), step)
+            if i == 0 or i + overlap_tokens < len(spans)]
+
+
+def _tail(text, tokens):
+    """The last `tokens` word pieces of text, as a slice of the original text."""
+    spans = _token_spans(text)
+    return text[spans[-tokens][0]:] if len(spans) > tokens else text
+
+
+def _table_passages(rows, chunk_tokens, overlap_tokens):
+    """Render a table as 'Header: value' lines, split by rows into passages."""
+    if len(rows) == 1:
+        lines = [" | ".join(v for v in rows[0] if v)]
+    else:
+        header = rows[0]
+        lines = [
+            " | ".join(f"{h}: {v}" for h, v in zip(header, row) if v) if len(row) == len(header)
+            else " | ".join(v for v in row if v)
+            for row in rows[1:]
+        ]
+
+    passages, current = [], []
+    for line in lines:
+        if count_passage_tokens(line) > chunk_tokens:
+            if current:
+                passages.append("\n".join(current))
+                current = []
+            passages.extend(_split_long_text(line, chunk_tokens, overlap_tokens))
+            continue
+        if current and count_passage_tokens("\n".join(current + [line])) > chunk_tokens:
+            passages.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def chunk_blocks(blocks, chunk_tokens=KB_CHUNK_TOKENS, overlap_tokens=KB_CHUNK_OVERLAP_TOKENS):
+    """
+    Pack blocks into passages of at most ~chunk_tokens.
+    Returns dicts with text, section (heading path), kind ("text" / "table") and page.
+    Passage text is prefixed with its heading path so it embeds with its context.
+    """
+    passages = []
+    headings = []
+    buffer, buffer_page, overlap = [], None, ""
+    budget = chunk_tokens
+
+    def emit(text, kind, page):
+        section = " > ".join(text for _, text in headings)
+        body = f"{section}\n{text}" if section else text
+        passages.append({"text": body, "section": section, "kind": kind, "page": page})
+
+    def flush():
+        nonlocal buffer, buffer_page, overlap
+        if buffer:
+            emit("\n".join(([overlap] if overlap else []) + buffer), "text", buffer_page)
+            # The tail of this passage opens the next one in the same section
+            overlap = _tail(buffer[-1], overlap_tokens) if overlap_tokens else ""
+        buffer, buffer_page = [], None
+
+    for block in blocks:
+        kind = block["type"]
+        page = block.get("page")
+
+        if kind == "heading":
+            flush()
+            overlap = ""
+            level = block.get("level", 1)
+            headings = [(lvl, text) for lvl, text in headings if lvl < level] + [(level, block["text"])]
+            # The heading path is prepended to every passage, so it counts against the size
+            section_tokens = count_passage_tokens(" > ".join(text for _, text in headings)) + 1
+            budget = max(chunk_tokens - section_tokens, chunk_tokens // 2)
+            continue
+
+        if kind == "table":
+            flush()
+            overlap = ""
+            for text in _table_passages(block["rows"], budget, overlap_tokens):
+                emit(text, "table", page)
+            continue
+
+        text = block["text"]
+        if count_passage_tokens(text) > budget:
+            flush()
+            overlap = ""
+            for piece in _split_long_text(text, budget, overlap_tokens):
+                emit(piece, "text", page)
+            continue
+
+        candidate = "\n".join(([overlap] if overlap else []) + buffer + [text])
+        if buffer and count_passage_tokens(candidate) > budget:
+            flush()
+            if count_passage_tokens(f"{overlap}\n{text}") > budget:
+                overlap = ""
+        if buffer_page is None:
+            buffer_page = page
+        buffer.append(text)
+
+    flush()
+    return passages
+
+
+def chunk_file(path, chunk_tokens=KB_CHUNK_TOKENS, overlap_tokens=KB_CHUNK_OVERLAP_TOKENS):
+    return chunk_blocks(extract_blocks(path), chunk_tokens, overlap_tokens)
@@ -0,0 +1,207 @@
+import os
+import re
+import asyncio
+import hashlib
+from dotenv import load_dotenv
+from Modules.llm import async_chat_completion
+from Modules.llm_cache import LLM_CACHE_BYPASS, get_llm_cache
+from Modules.routing import get_route, track_route
+from Modules.tokens import count_tokens, fit_prompt_parts, get_encoding
+
+
+# -------------------------------------------------------
+# Map-reduce condensation of long RFPs
+#   map:    token-bounded chunks summarized concurrently (shared rate limiter)
+#   reduce: chunk briefs + reference merged into the 800–1000 token brief
+#   Chunk summaries are cached by chunk hash, so re-uploads only pay for changed chunks.
+# -------------------------------------------------------
+load_dotenv()
+
+# Deployments, output sizes and temperatures come from the "condense" / "condense_chunk" routes
+CONDENSE_INPUT_TOKENS = int(os.getenv("CONDENSE_INPUT_TOKENS", "12000"))
+CONDENSE_CHUNK_TOKENS = int(os.getenv("CONDENSE_CHUNK_TOKENS", "3000"))
+CONDENSE_CHUNK_OVERLAP_TOKENS = int(os.getenv("CONDENSE_CHUNK_OVERLAP_TOKENS", "150"))
+# Bump when the map prompt changes so cached chunk summaries are not reused
+CHUNK_PROMPT_VERSION = "v1"
+
+
+def build_condense_prompt(rfp_text, reference_text):
+    return f"""
+    You are a professional SAP proposal analyst.
+    Summarize the following RFP and reference text into about 800–1000 tokens.
+    Include:
+    - Project purpose
+    - Scope
+    - Objectives
+    - Detected technologies and tone
+    ---
+    RFP TEXT:
+    {rfp_text}
+
+    REFERENCE MATERIAL:
+    {reference_text}
+    """
+
+
+def build_chunk_prompt(chunk_text, index, total):
+    return f"""
+    You are a professional SAP proposal analyst reading part {index} of {total} of a client RFP.
+    Extract only facts relevant to writing the proposal, as terse bullet points:
+    - Project purpose, objectives and business drivers
+    - Scope items: interface / ICO / integration lists and counts, systems, modules
+    - Timelines, milestones, go-live dates and phases
+    - Technologies, platforms and versions
+    - Commercial, staffing, governance and communication requirements
+    - Constraints, assumptions and exclusions
+    Keep numbers, names and identifiers verbatim. If the part has nothing relevant, answer "None".
+    ---
+    RFP PART {index}/{total}:
+    {chunk_text}
+    """
+
+
+def build_reduce_prompt(chunk_briefs, reference_text):
+    return f"""
+    You are a professional SAP proposal analyst.
+    The notes below were extracted, in order, from every part of a long client RFP.
+    Merge them with the reference material into one brief of about 800–1000 tokens.
+    Include:
+    - Project purpose
+    - Scope (keep interface counts, lists and timelines exact)
+    - Objectives
+    - Detected technologies and tone
+    Remove duplicates; do not invent facts.
+    ---
+    RFP NOTES:
+    {chunk_briefs}
+
+    REFERENCE MATERIAL:
+    {reference_text}
+    """
+
+
+def split_into_chunks(text, model, chunk_tokens=CONDENSE_CHUNK_TOKENS, overlap_tokens=CONDENSE_CHUNK_OVERLAP_TOKENS):
+    """
+    Split text into chunks of at most chunk_tokens, packing whole paragraphs where possible.
+    Paragraphs longer than a chunk are cut on token boundaries; consecutive chunks share
+    overlap_tokens of context so facts spanning a boundary are not lost.
+    """
+    encoding = get_encoding(model)
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n|\n(?=\s*(?:\d+(?:\.\d+)*\.?\s|[-•]\s))", text) if p.strip()]
+
+    pieces = []
+    for para in paragraphs:
+        tokens = encoding.encode(para, disallowed_special=())
+        step = chunk_tokens - overlap_tokens
+        if len(tokens) <= chunk_tokens:
+            pieces.append(tokens)
+        else:
+            pieces.extend(tokens[i:i + chunk_tokens] for i in range(0, len(tokens), step))
+
+    chunks, current = [], []
+    newline = encoding.encode("\n\n")
+    for piece in pieces:
+        if current and len(current) + len(newline) + len(piece) > chunk_tokens:
+            chunks.append(current)
+            keep = min(overlap_tokens, max(0, chunk_tokens - len(newline) - len(piece)))
+            current = current[-keep:] if keep else []
+        current = current + newline + piece if current else list(piece)
+    if current:
+        chunks.append(current)
+    return [encoding.decode(chunk) for chunk in chunks]
+
+
+async def summarize_chunk(client, chunk_text, index, total):
+    """Map step: brief one chunk, reusing a cached brief for identical chunk text."""
+    route = get_route("condense_chunk")
+    model = route["deployment"]
+    chunk_hash = hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+    key = f"chunk-summary:{CHUNK_PROMPT_VERSION}:{model}:{chunk_hash}"
+    cache = get_llm_cache()
+    if not LLM_CACHE_BYPASS:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    # The part number is only a hint to the model; the cache key ignores it so
+    # a chunk that moved within a re-uploaded RFP is still a hit.
+    prompt = build_chunk_prompt(chunk_text, index, total)
+    brief = await track_route(route, prompt, async_chat_completion(
+        client,
+        model=model,
+        prompt=prompt,
+        temperature=route["temperature"],
+        max_tokens=route["max_tokens"],
+        bypass_cache=True,
+    ))
+    if brief and not LLM_CACHE_BYPASS:
+        cache.put(key, brief)
+    return brief
+
+
+async def reduce_briefs(client, briefs, reference_text):
+    """Reduce step: merge chunk briefs (hierarchically if they exceed the budget) into the final brief."""
+    route = get_route("condense")
+    model = route["deployment"]
+    notes = "\n\n".join(b for b in briefs if b and b.strip().lower() != "none")
+    instructions = count_tokens(build_reduce_prompt("", ""), model)
+    notes_budget = CONDENSE_INPUT_TOKENS - instructions
+
+    if count_tokens(notes, model) > notes_budget and len(briefs) > 1:
+        # Too many notes for one call: condense groups of notes, then reduce again
+        groups = split_into_chunks(notes, model, chunk_tokens=max(notes_budget // 2, 500), overlap_tokens=0)
+        briefs = await asyncio.gather(*[
+            summarize_chunk(client, group, i + 1, len(groups)) for i, group in enumerate(groups)
+        ])
+        return await reduce_briefs(client, list(briefs), reference_text)
+
+    fitted = fit_prompt_parts(
+        build_reduce_prompt,
+        {"chunk_briefs": notes, "reference_text": reference_text},
+        model,
+        route["max_tokens"],
+        weights={"chunk_briefs": 3.0, "reference_text": 1.0},
+        cap=CONDENSE_INPUT_TOKENS,
+    )
+    prompt = build_reduce_prompt(**fitted)
+    return await track_route(route, prompt, async_chat_completion(
+        client,
+        model=model,
+        prompt=prompt,
+        temperature=route["temperature"],
+        max_tokens=route["max_tokens"],
+    ))
+
+
+async def condense_rfp(client, reference_text, rfp_text):
+    """Condense an RFP of any length plus reference text into the brief the section prompts expect."""
+    route = get_route("condense")
+    model = route["deployment"]
+    instructions = count_tokens(build_condense_prompt("", ""), model)
+    rfp_budget = CONDENSE_INPUT_TOKENS - instructions
+
+    # Short RFPs: one direct call, as before
+    if count_tokens(rfp_text, model) <= rfp_budget * 2 // 3:
+        fitted = fit_prompt_parts(
+            build_condense_prompt,
+            {"rfp_text": rfp_text, "reference_text": reference_text},
+            model,
+            route["max_tokens"],
+            weights={"rfp_text": 2.0, "reference_text": 1.0},
+            cap=CONDENSE_INPUT_TOKENS,
+        )
+        prompt = build_condense_prompt(**fitted)
+        return await track_route(route, prompt, async_chat_completion(
+            client,
+            model=model,
+            prompt=prompt,
+            temperature=route["temperature"],
+            max_tokens=route["max_tokens"],
+        ))
+
+    chunks = split_into_chunks(rfp_text, model)
+    print(f"🧩 Condensing RFP in {len(chunks)} chunks (map-reduce)")
+    briefs = await asyncio.gather(*[
+        summarize_chunk(client, chunk, i + 1, len(chunks)) for i, chunk in enumerate(chunks)
+    ])
+    return await reduce_briefs(client, list(briefs), reference_text)
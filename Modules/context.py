@@ -0,0 +1,107 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from Modules.knowledge_base import format_reference, vector_id
+from Modules.tokens import count_tokens
+from Modules.vector_index import normalize
+
+
+# -------------------------------------------------------
+# Reference context assembly
+#   Retrieved passages are not joined blindly: the SOWs share boilerplate
+#   (the same legal, governance and assumption paragraphs appear in several of
+#   them), so the assembler
+#     1. orders candidates by maximal marginal relevance over their embeddings
+#        (one similarity matrix, vectorised greedy selection),
+#     2. drops passages nearly identical to one already selected,
+#     3. packs passages greedily into the caller's token budget,
+#   and renders the survivors in document order with format_reference().
+# -------------------------------------------------------
+load_dotenv()
+
+# MMR trade-off: 1.0 = pure relevance, 0.0 = pure diversity
+KB_MMR_LAMBDA = float(os.getenv("KB_MMR_LAMBDA", "0.7"))
+# Cosine similarity above which a passage counts as a duplicate of a selected one
+KB_DEDUP_SIMILARITY = float(os.getenv("KB_DEDUP_SIMILARITY", "0.95"))
+# Budget for the whole-RFP reference (feeds the condensed brief)
+KB_REFERENCE_TOKENS = int(os.getenv("KB_REFERENCE_TOKENS", "1500"))
+# "\n\n" between passages
+SEPARATOR_TOKENS = 1
+
+
+def passage_vectors(knowledge_base, docs):
+    """
+    Unit embeddings of retrieved passages: read back from the vector store when
+    it keeps them (NumPy index, Chroma), otherwise re-embedded in one batch.
+    """
+    store = knowledge_base.vector_store
+    ids = [vector_id(doc.metadata.get("source", ""), doc.metadata.get("chunk_index", 0)) for doc in docs]
+    vectors = None
+    if hasattr(store, "vectors_by_id"):
+        vectors = store.vectors_by_id(ids)
+    elif hasattr(store, "get"):
+        try:
+            stored = store.get(ids=ids, include=["embeddings"])
+            by_id = dict(zip(stored["ids"], stored["embeddings"]))
+            if all(vid in by_id for vid in ids):
+                vectors = np.asarray([by_id[vid] for vid in ids], dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Could not read stored passage vectors ({e}); re-embedding")
+    if vectors is None:
+        vectors = np.asarray(store.embeddings.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+    return normalize(vectors)
+
+
+def passage_relevance(docs):
+    """Rerank scores when every passage has one, else fused scores; min-max scaled to [0, 1]."""
+    field = "rerank_score" if all("rerank_score" in doc.metadata for doc in docs) else "score"
+    scores = np.array([doc.metadata.get(field) or 0.0 for doc in docs], dtype=np.float32)
+    spread = scores.max() - scores.min()
+    return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+
+def mmr_order(relevance, vectors, lambda_mult=KB_MMR_LAMBDA, dedup_similarity=KB_DEDUP_SIMILARITY):
+    """
+    Greedy MMR over all candidates: each step picks
+    argmax(lambda * relevance - (1 - lambda) * max similarity to the selected set).
+    Returns (selected indices in pick order, indices dropped as near-duplicates).
+    """
+    n = len(relevance)
+    similarity = vectors @ vectors.T
+    closest = np.zeros(n, dtype=np.float32)  # max similarity to anything selected so far
+    available = np.ones(n, dtype=bool)
+    selected, duplicates = [], []
+    while available.any():
+        mmr = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * closest, -np.inf)
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[best])
+        duplicate = available & (similarity[best] >= dedup_similarity)
+        duplicates.extend(np.flatnonzero(duplicate).tolist())
+        available &= ~duplicate
+    return selected, duplicates
+
+
+def pack_passages(docs, max_tokens, model=None):
+    """Greedily keep passages (in the given order) that still fit the token budget; returns (kept, tokens used)."""
+    kept, used = [], 0
+    for doc in docs:
+        cost = count_tokens(doc.page_content, model) + (SEPARATOR_TOKENS if kept else 0)
+        if used + cost <= max_tokens:
+            kept.append(doc)
+            used += cost
+    return kept, used
+
+
+def assemble_reference(knowledge_base, docs, max_tokens, model=None):
+    """Prompt reference text from retrieved passages: MMR-ordered, de-duplicated and packed into max_tokens."""
+    if not docs:
+        return ""
+    order, duplicates = mmr_order(passage_relevance(docs), passage_vectors(knowledge_base, docs))
+    kept, used = pack_passages([docs[i] for i in order], max_tokens, model)
+    print(
+        f"🧩 Reference context: {len(kept)}/{len(docs)} passages, {used} tokens"
+        + (f" ({len(duplicates)} near-duplicates dropped)" if duplicates else "")
+    )
+    return format_reference(kept)
@@ -0,0 +1,287 @@
+import os
+import time
+import hashlib
+import threading
+import importlib.util
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+
+# -------------------------------------------------------
+# Embedding service
+#   One process-wide embedder behind LangChain's Embeddings interface, with
+#   two runtimes for all-MiniLM-L6-v2:
+#     "onnx"                  — int8-quantized ONNX export run by onnxruntime
+#                               (no torch import, a fraction of the memory)
+#     "sentence-transformers" — the original PyTorch model
+#   "auto" (default) uses ONNX when onnxruntime + tokenizers are installed.
+#   Query embeddings are kept in an LRU cache keyed by text hash, so repeated
+#   RFP chunks and section queries skip inference.
+#   Benchmark both runtimes with:  python -m Modules.embeddings
+# -------------------------------------------------------
+load_dotenv()
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "auto").strip().lower()
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", os.getenv("KB_EMBED_BATCH_SIZE", "64")))
+# Intra-op threads for inference (0 = runtime default)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "4096"))
+# Quantized export shipped in the model repo; pick the variant matching the CPU
+# (model_qint8_avx512.onnx, model_qint8_avx512_vnni.onnx, model_qint8_arm64.onnx)
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+# Local folder holding the ONNX file and tokenizer.json (offline deployments)
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "")
+# MiniLM was trained on 256 word pieces; longer inputs are truncated
+EMBEDDING_MAX_LENGTH = 256
+
+
+# -------------------------------------------------------
+# Runtimes
+# -------------------------------------------------------
+
+def model_file(filename, model_name=EMBEDDING_MODEL_NAME, model_dir=EMBEDDING_ONNX_DIR):
+    """Local path of a file from the model repo (EMBEDDING_ONNX_DIR, else the Hugging Face cache)."""
+    if model_dir:
+        return os.path.join(model_dir, filename)
+    from huggingface_hub import hf_hub_download
+
+    return hf_hub_download(model_name, filename)
+
+
+class OnnxMiniLM:
+    """Tokenizer + ONNX Runtime session with mean pooling and L2 normalisation."""
+
+    name = "onnx"
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, onnx_file=EMBEDDING_ONNX_FILE, model_dir=EMBEDDING_ONNX_DIR,
+                 threads=EMBEDDING_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = model_file(onnx_file, model_name, model_dir)
+        self.tokenizer = Tokenizer.from_file(model_file("tokenizer.json", model_name, model_dir))
+        self.tokenizer.enable_truncation(max_length=EMBEDDING_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            vectors.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        return np.vstack(vectors) if vectors else np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+
+
+class SentenceTransformerMiniLM:
+    """The PyTorch sentence-transformers model (the previous HuggingFaceEmbeddings path)."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, threads=EMBEDDING_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        return self.model.encode(
+            list(texts), batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True,
+        )
+
+
+@lru_cache(maxsize=1)
+def get_passage_tokenizer():
+    """
+    The model's own WordPiece tokenizer (tokenizer.json, shared by both runtimes) with
+    truncation and padding off, for sizing passages against EMBEDDING_MAX_LENGTH.
+    """
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(model_file("tokenizer.json"))
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+EMBEDDING_RUNTIMES = {
+    "onnx": OnnxMiniLM,
+    "sentence-transformers": SentenceTransformerMiniLM,
+}
+
+
+def resolve_backend(backend=EMBEDDING_BACKEND):
+    """The runtime name `backend` loads; "auto" is resolved without importing either runtime."""
+    if backend == "auto":
+        modules = ["onnxruntime", "tokenizers"] + ([] if EMBEDDING_ONNX_DIR else ["huggingface_hub"])
+        if all(importlib.util.find_spec(module) is not None for module in modules):
+            return "onnx"
+        return "sentence-transformers"
+    if backend not in EMBEDDING_RUNTIMES:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected auto or one of {sorted(EMBEDDING_RUNTIMES)})")
+    return backend
+
+
+def embedding_config(backend=EMBEDDING_BACKEND):
+    """
+    Model, runtime and ONNX export the index is embedded with. The runtimes' vectors
+    differ slightly (int8 ONNX vs PyTorch), so an index built by one is not reused by the other.
+    """
+    runtime = resolve_backend(backend)
+    return {
+        "model": EMBEDDING_MODEL_NAME,
+        "runtime": runtime,
+        "onnx_file": EMBEDDING_ONNX_FILE if runtime == "onnx" else None,
+    }
+
+
+def load_runtime(backend=EMBEDDING_BACKEND):
+    runtime = resolve_backend(backend)
+    if backend == "auto" and runtime != "onnx":
+        print("⚠️ onnxruntime/tokenizers not installed — using the sentence-transformers runtime")
+    return EMBEDDING_RUNTIMES[runtime]()
+
+
+# -------------------------------------------------------
+# Service
+# -------------------------------------------------------
+
+class EmbeddingService(Embeddings):
+    """LangChain embeddings over a runtime, with an LRU cache for query embeddings."""
+
+    def __init__(self, runtime, batch_size=EMBEDDING_BATCH_SIZE, cache_size=EMBEDDING_QUERY_CACHE_SIZE):
+        self.runtime = runtime
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        """Embed passages in batches (not cached — indexing would only evict queries)."""
+        return self.runtime.encode(list(texts), self.batch_size).tolist()
+
+    def embed_queries(self, texts):
+        """Embed query texts, reusing cached vectors; all misses are encoded in one batch."""
+        texts = list(texts)
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[i] = self._cache[key]
+            missing = [i for i, v in enumerate(vectors) if v is None]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # Encode each distinct missing text once
+            unique = list(dict.fromkeys(keys[i] for i in missing))
+            first = {keys[i]: i for i in reversed(missing)}
+            encoded = dict(zip(unique, self.runtime.encode([texts[first[key]] for key in unique], self.batch_size).tolist()))
+            with self._lock:
+                for key, vector in encoded.items():
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for i in missing:
+                vectors[i] = encoded[keys[i]]
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service():
+    """Process-wide embedding service (the model is loaded once per process)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            start = time.perf_counter()
+            runtime = load_runtime()
+            _service = EmbeddingService(runtime)
+            print(f"🧠 Embedding model loaded ({runtime.name}) in {time.perf_counter() - start:.1f}s")
+        return _service
+
+
+def embed_queries(embeddings, texts):
+    """Query embeddings through the service cache when available (any LangChain embeddings otherwise)."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(list(texts))
+
+
+# -------------------------------------------------------
+# Micro-benchmark:  python -m Modules.embeddings [n_texts]
+# -------------------------------------------------------
+
+def benchmark(n_texts=512, batch_size=EMBEDDING_BATCH_SIZE):
+    """Load time, throughput and agreement of each installed runtime on the same passages."""
+    from Modules.chunking import chunk_file
+    from Modules.knowledge_base import KNOWLEDGE_FOLDER, list_repo_files
+
+    texts = [p["text"] for path in list_repo_files() for p in chunk_file(os.path.join(KNOWLEDGE_FOLDER, path))]
+    texts = (texts * (n_texts // max(len(texts), 1) + 1))[:n_texts] or ["SAP PI/PO to Integration Suite migration"]
+
+    results, runtimes = {}, {}
+    for backend, runtime_cls in EMBEDDING_RUNTIMES.items():
+        try:
+            start = time.perf_counter()
+            runtime = runtime_cls()
+            load_time = time.perf_counter() - start
+        except Exception as e:
+            print(f"{backend:>22}: unavailable ({e})")
+            continue
+        runtime.encode(texts[:batch_size], batch_size)  # warm-up
+        start = time.perf_counter()
+        vectors = runtime.encode(texts, batch_size)
+        elapsed = time.perf_counter() - start
+        results[backend] = vectors
+        runtimes[backend] = runtime
+        print(f"{backend:>22}: load {load_time:.1f}s, {len(texts) / elapsed:.0f} passages/s (batch {batch_size})")
+
+    if len(results) == 2:
+        a, b = results.values()
+        print(f"{'cosine agreement':>22}: mean {np.mean(np.sum(a * b, axis=1)):.4f}, min {np.min(np.sum(a * b, axis=1)):.4f}")
+
+    if not runtimes:
+        return
+    service = EmbeddingService(next(iter(runtimes.values())), batch_size)
+    queries = texts[:64]
+    for label in ("cold", "cached"):
+        start = time.perf_counter()
+        service.embed_queries(queries)
+        print(f"{'queries ' + label:>22}: {(time.perf_counter() - start) * 1000:.1f} ms for {len(queries)}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 512)
@@ -0,0 +1,374 @@
+import os
+import json
+import hashlib
+import threading
+from dotenv import load_dotenv
+from langchain_core.documents import Document as LDocument
+from Modules.chunking import chunk_file, chunker_config
+from Modules.embeddings import embedding_config, get_embedding_service
+
+
+# -------------------------------------------------------
+# Knowledge_Repo indexing with a local manifest
+#   manifest: relative path -> content hash, mtime, size, vector IDs
+#   Startup only stat()s the repo; new/changed files are upserted under
+#   deterministic IDs (re-indexing overwrites instead of duplicating) and
+#   vectors of deleted files are removed from the store.
+#   Files are indexed as passages (Modules.chunking) embedded in large batches.
+#   Sub-folders are indexed recursively; each passage carries the namespace of
+#   the module it belongs to so searches can be filtered per module.
+# -------------------------------------------------------
+load_dotenv()
+
+KNOWLEDGE_FOLDER = "Knowledge_Repo"
+KB_MANIFEST_PATH = os.getenv("KB_MANIFEST_PATH", ".cache/kb_manifest.json")
+PINECONE_INDEX_NAME = "response-generator"
+KB_EXTENSIONS = (".pdf", ".docx", ".pptx")
+MANIFEST_VERSION = 3
+# Top-level sub-folder -> namespace; files directly in the repo belong to the
+# integration (PI/PO) proposals, other sub-folders use their lowercased name
+KB_NAMESPACES = {"GTS": "gts", "Coreassess_KR": "coreassess"}
+DEFAULT_NAMESPACE = "integration"
+# Passages per vector-store upsert (embedding batch size: EMBEDDING_BATCH_SIZE)
+KB_UPSERT_BATCH_SIZE = int(os.getenv("KB_UPSERT_BATCH_SIZE", "512"))
+# Passages retrieved per query
+KB_TOP_K = int(os.getenv("KB_TOP_K", "6"))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def vector_id(rel_path, index):
+    """Deterministic vector ID for passage `index` of a repo file."""
+    return f"{hashlib.sha1(rel_path.encode('utf-8')).hexdigest()}-{index}"
+
+
+def list_repo_files(folder=KNOWLEDGE_FOLDER):
+    """Relative paths ("/"-separated) of indexable files anywhere under the knowledge folder."""
+    paths = []
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in names:
+            # Skip Office lock files ("~$Proposal.docx")
+            if name.endswith(KB_EXTENSIONS) and not name.startswith("~$"):
+                paths.append(os.path.relpath(os.path.join(root, name), folder).replace(os.sep, "/"))
+    return sorted(paths)
+
+
+def namespace_for(rel_path):
+    """Module namespace of a repo file, from its top-level sub-folder."""
+    if "/" not in rel_path:
+        return DEFAULT_NAMESPACE
+    top = rel_path.split("/", 1)[0]
+    return KB_NAMESPACES.get(top, top.lower())
+
+
+def build_file_documents(folder, rel_path):
+    """One LangChain document per passage of a repo file, with provenance metadata."""
+    docs = []
+    for i, passage in enumerate(chunk_file(os.path.join(folder, rel_path))):
+        metadata = {
+            "source": rel_path,
+            "namespace": namespace_for(rel_path),
+            "chunk_index": i,
+            "section": passage["section"],
+            "kind": passage["kind"],
+        }
+        # Vector stores reject null metadata values
+        if passage["page"] is not None:
+            metadata["page"] = passage["page"]
+        docs.append(LDocument(page_content=passage["text"], metadata=metadata))
+    return docs
+
+
+def format_reference(docs):
+    """Join retrieved passages into prompt reference text, in document order per source."""
+    ordered = sorted(docs, key=lambda d: (d.metadata.get("source", ""), d.metadata.get("chunk_index", 0)))
+    return "\n\n".join(d.page_content for d in ordered)
+
+
+# -------------------------------------------------------
+# Manifest
+# -------------------------------------------------------
+
+def load_manifest(index_name, path=KB_MANIFEST_PATH):
+    """
+    Manifest for `index_name`; an unreadable manifest or one for another index starts empty.
+    When the chunker settings or embedding runtime changed, every file is marked for
+    re-indexing but its old vector IDs are kept so they can be deleted.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    config = {"version": MANIFEST_VERSION, "chunker": chunker_config(), "embedding": embedding_config()}
+    if manifest.get("index") != index_name:
+        return {**config, "index": index_name, "files": {}}
+    if any(manifest.get(field) != value for field, value in config.items()):
+        for entry in manifest.get("files", {}).values():
+            entry.update(sha256=None, mtime=None, size=None)
+        manifest.update(config)
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(manifest, path=KB_MANIFEST_PATH):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def sync_knowledge_base(vector_store, index_name, folder=KNOWLEDGE_FOLDER, manifest_path=KB_MANIFEST_PATH,
+                        sparse_index=None):
+    """
+    Bring the vector store (and the BM25 index, if given) in line with the knowledge folder.
+    Unchanged files (same mtime + size, or same content hash) cost one stat();
+    passages of changed files are upserted in batches of KB_UPSERT_BATCH_SIZE.
+    Returns counts of added / updated / removed / unchanged files and upserted passages.
+    """
+    manifest = load_manifest(index_name, manifest_path)
+    files = manifest["files"]
+    if sparse_index is not None and not len(sparse_index):
+        # No BM25 index yet: re-index every file so both indexes hold the same passages
+        for entry in files.values():
+            entry.update(sha256=None, mtime=None, size=None)
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "passages": 0}
+    pending_docs, pending_ids, pending_files = [], [], {}
+    changed = False
+
+    def flush():
+        # Upsert the pending passages, then record their files in the manifest
+        if pending_docs:
+            vector_store.add_documents(pending_docs, ids=pending_ids)
+            if sparse_index is not None:
+                sparse_index.add_documents(pending_docs, pending_ids)
+            counts["passages"] += len(pending_docs)
+        if sparse_index is not None:
+            sparse_index.save()
+        files.update(pending_files)
+        save_manifest(manifest, manifest_path)
+        pending_docs.clear(), pending_ids.clear(), pending_files.clear()
+
+    current = list_repo_files(folder)
+    for rel_path in current:
+        stat = os.stat(os.path.join(folder, rel_path))
+        entry = files.get(rel_path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            counts["unchanged"] += 1
+            continue
+
+        content_hash = file_sha256(os.path.join(folder, rel_path))
+        if entry and entry["sha256"] == content_hash:
+            # Touched but not modified: refresh the stat fields only
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            counts["unchanged"] += 1
+            changed = True
+            continue
+
+        docs = build_file_documents(folder, rel_path)
+        ids = [vector_id(rel_path, i) for i in range(len(docs))]
+        stale = sorted(set((entry or {}).get("vector_ids", [])) - set(ids))
+        if stale:
+            vector_store.delete(ids=stale)
+            if sparse_index is not None:
+                sparse_index.delete(stale)
+
+        pending_docs.extend(docs)
+        pending_ids.extend(ids)
+        pending_files[rel_path] = {
+            "sha256": content_hash,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "vector_ids": ids,
+        }
+        counts["updated" if entry else "added"] += 1
+        changed = True
+        if len(pending_docs) >= KB_UPSERT_BATCH_SIZE:
+            flush()
+
+    for rel_path in set(files) - set(current):
+        ids = files.pop(rel_path).get("vector_ids", [])
+        if ids:
+            vector_store.delete(ids=ids)
+            if sparse_index is not None:
+                sparse_index.delete(ids)
+        counts["removed"] += 1
+        changed = True
+
+    if changed:
+        flush()
+    return counts
+
+
+# -------------------------------------------------------
+# Vector store backends
+#   VECTOR_STORE_BACKEND picks the dense store build_knowledge_base() uses:
+#     "chroma"   — persistent local HNSW index in CHROMA_PERSIST_DIR; offline,
+#                  in-process queries, no network round trip (default)
+#     "numpy"    — memory-mapped embedding matrix in NUMPY_INDEX_DIR searched
+#                  with one matrix product (Modules.vector_index)
+#     "pinecone" — Pinecone serverless index (needs PINECONE_API_KEY)
+#   Each backend returns (vector_store, index name, manifest path) so the
+#   incremental sync keeps one manifest per store.
+# -------------------------------------------------------
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma").strip().lower()
+# Generated index state stays under the gitignored .cache/ (the tracked chroma_db/
+# folder holds the old 1536-dim "rfp_responses" collection and is never written)
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", ".cache/chroma_db")
+CHROMA_COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", PINECONE_INDEX_NAME)
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", ".cache/kb_index")
+# float32 / float16 rows, or quantized "int8" (4x smaller) / "binary" (32x smaller) codes
+# searched in two stages: codes rank all rows, float vectors re-score the best k * factor
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32")
+# (default 4 for int8, 16 for binary)
+NUMPY_INDEX_RESCORE_FACTOR = int(os.getenv("NUMPY_INDEX_RESCORE_FACTOR", "0")) or None
+# Portable index exported with `python -m Modules.snapshot export`; when set, served by the NumPy backend
+KB_SNAPSHOT_PATH = os.getenv("KB_SNAPSHOT_PATH", "")
+
+def get_embedding_model():
+    """Process-wide embedding service (ONNX or sentence-transformers runtime, see Modules.embeddings)."""
+    return get_embedding_service()
+
+
+def get_chroma_vector_store(persist_dir=CHROMA_PERSIST_DIR, collection_name=CHROMA_COLLECTION_NAME):
+    from langchain_chroma import Chroma
+
+    vector_store = Chroma(
+        collection_name=collection_name,
+        embedding_function=get_embedding_model(),
+        persist_directory=persist_dir,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+    # The manifest lives next to the index it describes, so deleting the store resets both
+    return vector_store, collection_name, os.path.join(persist_dir, f"{collection_name}_manifest.json")
+
+
+def get_numpy_vector_store(index_dir=NUMPY_INDEX_DIR, name=PINECONE_INDEX_NAME, dtype=NUMPY_INDEX_DTYPE):
+    from Modules.vector_index import NumpyVectorStore
+
+    vector_store = NumpyVectorStore(
+        get_embedding_model(), index_dir, name=name, dtype=dtype, rescore_factor=NUMPY_INDEX_RESCORE_FACTOR,
+    )
+    return vector_store, name, os.path.join(index_dir, f"{name}_manifest.json")
+
+
+def get_pinecone_vector_store(index_name=PINECONE_INDEX_NAME):
+    from pinecone import Pinecone, ServerlessSpec
+    from langchain_pinecone import PineconeVectorStore
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+
+    # Create index if it doesn't exist
+    if index_name not in [idx["name"] for idx in pc.list_indexes()]:
+        pc.create_index(
+            name=index_name,
+            dimension=384,  # ✅ MiniLM-L6-v2 has 384 dims (not 1024)
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+
+    return PineconeVectorStore(index=pc.Index(index_name), embedding=get_embedding_model()), index_name, KB_MANIFEST_PATH
+
+
+VECTOR_STORE_BACKENDS = {
+    "chroma": get_chroma_vector_store,
+    "numpy": get_numpy_vector_store,
+    "pinecone": get_pinecone_vector_store,
+}
+
+
+def get_vector_store(backend=None):
+    """Open the configured vector store; returns (vector_store, index name, manifest path)."""
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}' (expected one of {sorted(VECTOR_STORE_BACKENDS)})")
+    return VECTOR_STORE_BACKENDS[backend]()
+
+
+def index_fingerprint(manifest_path):
+    """
+    Version of the indexed content: a hash of the synced manifest (changes with
+    any added/updated/removed file or chunker setting), its path (one per
+    backend) and the embedding model and runtime.
+    """
+    embedding = json.dumps(embedding_config(), sort_keys=True)
+    digest = hashlib.sha256(f"{manifest_path}\n{embedding}\n".encode("utf-8"))
+    try:
+        with open(manifest_path, "rb") as f:
+            digest.update(f.read())
+    except OSError:
+        pass
+    return digest.hexdigest()
+
+
+class KnowledgeBase:
+    """Dense vector store plus the BM25 index built from the same passages."""
+
+    def __init__(self, vector_store, sparse_index, index_name, manifest_path):
+        self.vector_store = vector_store
+        self.sparse_index = sparse_index
+        self.index_name = index_name
+        self.manifest_path = manifest_path
+        # Keys cached retrievals; read after sync so it reflects the current index
+        self.index_version = index_fingerprint(manifest_path)
+
+
+def load_knowledge_base(folder=KNOWLEDGE_FOLDER, backend=None, snapshot_path=KB_SNAPSHOT_PATH):
+    """
+    Open the configured vector store and BM25 index and incrementally sync them with the knowledge folder.
+    With a valid snapshot (see Modules.snapshot) the NumPy backend is seeded from it first, so the
+    sync finds every file unchanged; without the folder the snapshot is served as-is.
+    """
+    from Modules.sparse_index import SparseIndex
+
+    snapshot = None
+    if snapshot_path and os.path.exists(snapshot_path):
+        from Modules.snapshot import open_snapshot
+
+        try:
+            snapshot = open_snapshot(snapshot_path)
+            backend = "numpy"
+        except ValueError as e:
+            print(f"⚠️ Ignoring knowledge-base snapshot {snapshot_path}: {e}")
+
+    backend = backend or VECTOR_STORE_BACKEND
+    vector_store, index_name, manifest_path = get_vector_store(backend)
+    # The BM25 index sits next to the manifest of the store it mirrors
+    sparse_index = SparseIndex(f"{os.path.splitext(manifest_path)[0]}_bm25")
+    if snapshot is not None:
+        from Modules.snapshot import install_snapshot
+
+        install_snapshot(*snapshot, vector_store, index_name, manifest_path, sparse_index)
+
+    if snapshot is not None and not os.path.isdir(folder):
+        print(f"📚 Knowledge base '{index_name}' ({backend}): {len(sparse_index)} passages from snapshot")
+    else:
+        counts = sync_knowledge_base(vector_store, index_name, folder, manifest_path, sparse_index)
+        print(
+            f"📚 Knowledge base '{index_name}' ({backend}): {counts['added']} added, "
+            f"{counts['updated']} updated, {counts['removed']} removed, {counts['unchanged']} unchanged files "
+            f"({counts['passages']} passages upserted)"
+        )
+    return KnowledgeBase(vector_store, sparse_index, index_name, manifest_path)
+
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base(folder=KNOWLEDGE_FOLDER):
+    """Process-wide knowledge base shared by every module page (synced on first use)."""
+    global _knowledge_base
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            _knowledge_base = load_knowledge_base(folder)
+        return _knowledge_base
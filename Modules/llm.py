@@ -0,0 +1,149 @@
+import time
+import contextvars
+from Modules.llm_cache import LLM_CACHE_BYPASS, get_llm_cache, make_cache_key
+from Modules.scheduler import estimate_tokens, get_limiter, run_scheduled
+from Modules.tokens import CHAT_OVERHEAD_TOKENS, count_tokens
+
+
+# -------------------------------------------------------
+# Shared async chat.completions wrapper with response cache + scheduler
+#   Use with Modules.azure_client.get_async_client(); sync callers wrap
+#   the coroutine in Modules.azure_client.run_async().
+# -------------------------------------------------------
+
+# Set by each completion call in the calling task's context, so a wrapper awaiting
+# the call (Modules.routing.track_route) can tell a cache hit from a real request
+_served_from_cache = contextvars.ContextVar("served_from_cache", default=False)
+
+
+def last_call_cached():
+    """True when the last completion awaited in this task was answered from the LLM cache."""
+    return _served_from_cache.get()
+
+
+def _build_messages(prompt):
+    return [{"role": "user", "content": prompt}]
+
+
+def _cache_key(model, messages, temperature, max_tokens, response_format):
+    # Plain-text requests keep their original keys; structured ones also hash the schema
+    if response_format is None:
+        return make_cache_key(model, messages, temperature, max_tokens)
+    return make_cache_key(model, messages, temperature, max_tokens, response_format=response_format)
+
+
+def _settle_usage(model, estimated, usage, fallback_total=None):
+    # Correct the TPM bucket with the real token count once Azure reports it (or our count otherwise)
+    total = getattr(usage, "total_tokens", None) or fallback_total
+    if total:
+        get_limiter(model).tokens.refund(estimated - total)
+
+
+async def async_chat_completion(client, model, prompt, temperature=0.3, max_tokens=None, bypass_cache=False,
+                                response_format=None, validate=None):
+    """
+    Call client.chat.completions.create, serving identical requests from the local cache.
+    response_format is passed through (e.g. a json_schema format); only text accepted by
+    validate(text) is cached when a validator is given.
+    """
+    messages = _build_messages(prompt)
+    use_cache = not (bypass_cache or LLM_CACHE_BYPASS)
+    key = _cache_key(model, messages, temperature, max_tokens, response_format)
+
+    _served_from_cache.set(False)
+    if use_cache:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            _served_from_cache.set(True)
+            return cached
+
+    kwargs = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    estimated = estimate_tokens(prompt, max_tokens, model)
+    response = await run_scheduled(model, estimated, lambda: client.chat.completions.create(**kwargs))
+    _settle_usage(model, estimated, getattr(response, "usage", None))
+    text = (response.choices[0].message.content or "").strip()
+
+    if use_cache and text and (validate is None or validate(text)):
+        get_llm_cache().put(key, text)
+    return text
+
+
+def cache_stats():
+    """Hit/miss counters of the shared LLM cache."""
+    return get_llm_cache().stats()
+
+
+# -------------------------------------------------------
+# Streaming variant — push partial text to a callback as tokens arrive
+# -------------------------------------------------------
+STREAM_UPDATE_INTERVAL = 0.15  # seconds between UI refreshes while streaming
+
+
+def _delta_text(chunk):
+    # Azure sends a leading chunk with no choices (content-filter results)
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+async def async_stream_chat_completion(client, model, prompt, temperature=0.3, max_tokens=None,
+                                       on_delta=None, bypass_cache=False, response_format=None, validate=None):
+    """Stream a completion, calling on_delta(text_so_far) as it grows. Returns the final text."""
+    messages = _build_messages(prompt)
+    use_cache = not (bypass_cache or LLM_CACHE_BYPASS)
+    key = _cache_key(model, messages, temperature, max_tokens, response_format)
+
+    _served_from_cache.set(False)
+    if use_cache:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            _served_from_cache.set(True)
+            if on_delta:
+                on_delta(cached)
+            return cached
+
+    # include_usage adds a final chunk (no choices) carrying the request's token usage
+    kwargs = {
+        "model": model, "messages": messages, "temperature": temperature,
+        "stream": True, "stream_options": {"include_usage": True},
+    }
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+
+    start = time.perf_counter()
+    first_token_at = None
+    last_update = 0.0
+    parts = []
+    usage = None
+    estimated = estimate_tokens(prompt, max_tokens, model)
+    # Only the request itself is scheduled/retried; once tokens flow we stay on this stream
+    stream = await run_scheduled(model, estimated, lambda: client.chat.completions.create(**kwargs))
+    async for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        piece = _delta_text(chunk)
+        if not piece:
+            continue
+        now = time.perf_counter()
+        if first_token_at is None:
+            first_token_at = now
+            print(f"⏱️ {model}: first token after {first_token_at - start:.2f}s")
+        parts.append(piece)
+        if on_delta and now - last_update >= STREAM_UPDATE_INTERVAL:
+            on_delta("".join(parts))
+            last_update = now
+
+    text = "".join(parts).strip()
+    # API versions without include_usage send no usage chunk: settle from the streamed text instead
+    counted = None if usage else count_tokens(prompt, model) + CHAT_OVERHEAD_TOKENS + count_tokens(text, model)
+    _settle_usage(model, estimated, usage, fallback_total=counted)
+    if on_delta:
+        on_delta(text)
+    if use_cache and text and (validate is None or validate(text)):
+        get_llm_cache().put(key, text)
+    return text
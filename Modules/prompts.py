@@ -1,3 +1,25 @@
+import os
+from Modules.tokens import fit_prompt_parts
+
+# Upper bound on prompt input tokens for a single section call
+SECTION_INPUT_TOKENS = int(os.getenv("SECTION_INPUT_TOKENS", "12000"))
+
+
+def build_fitted_prompt(prompt_fn, model, max_tokens, reference_text, condensed_rfp, *args):
+    """
+    Render one of the section prompts below with reference text and condensed RFP
+    fitted to the deployment's token budget (instead of slicing by characters).
+    """
+    fitted = fit_prompt_parts(
+        lambda reference_text, condensed_rfp: prompt_fn(reference_text, condensed_rfp, *args),
+        {"reference_text": reference_text, "condensed_rfp": condensed_rfp},
+        model,
+        max_tokens,
+        cap=SECTION_INPUT_TOKENS,
+    )
+    return prompt_fn(fitted["reference_text"], fitted["condensed_rfp"], *args)
+
+
 
 
 def get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, num_interfaces=None):
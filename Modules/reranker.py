@@ -0,0 +1,155 @@
+import os
+import time
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from Modules.embeddings import EMBEDDING_THREADS
+
+
+# -------------------------------------------------------
+# Cross-encoder reranking
+#   Fused dense + BM25 retrieval picks the candidates; a MiniLM cross-encoder
+#   then reads each (query, passage) pair together and reorders the top
+#   RERANK_CANDIDATES. Scoring runs on CPU in small batches under a wall-clock
+#   budget: if the budget is (or is projected to be) exceeded, the fused
+#   ordering is kept. Disabled unless RERANKER_BACKEND is set:
+#     "onnx" | "sentence-transformers" | "auto" (ONNX when installed) | "off"
+# -------------------------------------------------------
+load_dotenv()
+
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "off").strip().lower()
+RERANKER_MODEL_NAME = os.getenv("RERANKER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L6-v2")
+RERANKER_ONNX_FILE = os.getenv("RERANKER_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+# Local folder holding the reranker's ONNX file and tokenizer.json (offline deployments)
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", "")
+# Fused candidates passed to the cross-encoder per retrieval
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# Wall-clock budget for scoring one retrieval's candidates (0 = unlimited)
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "750"))
+# The budget is checked between batches
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+RERANK_MAX_LENGTH = 512
+
+
+class OnnxCrossEncoder:
+    """Pair tokenizer + ONNX Runtime session returning one relevance logit per pair."""
+
+    name = "onnx"
+
+    def __init__(self, model_name=RERANKER_MODEL_NAME, onnx_file=RERANKER_ONNX_FILE, model_dir=RERANKER_ONNX_DIR,
+                 threads=EMBEDDING_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        if model_dir:
+            model_path = os.path.join(model_dir, onnx_file)
+            tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        else:
+            from huggingface_hub import hf_hub_download
+
+            model_path = hf_hub_download(model_name, onnx_file)
+            tokenizer_path = hf_hub_download(model_name, "tokenizer.json")
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=RERANK_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def score(self, pairs):
+        encoded = self.tokenizer.encode_batch([tuple(pair) for pair in pairs])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encoded], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        return self.session.run(None, feeds)[0].reshape(len(pairs), -1)[:, 0].tolist()
+
+
+class SentenceTransformerCrossEncoder:
+    """The PyTorch sentence-transformers CrossEncoder."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name=RERANKER_MODEL_NAME, threads=EMBEDDING_THREADS):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = CrossEncoder(model_name, device="cpu", max_length=RERANK_MAX_LENGTH)
+
+    def score(self, pairs):
+        return np.asarray(self.model.predict([tuple(pair) for pair in pairs], batch_size=len(pairs))).ravel().tolist()
+
+
+RERANKER_RUNTIMES = {
+    "onnx": OnnxCrossEncoder,
+    "sentence-transformers": SentenceTransformerCrossEncoder,
+}
+
+
+def load_reranker(backend=RERANKER_BACKEND):
+    if backend == "auto":
+        try:
+            return OnnxCrossEncoder()
+        except ImportError:
+            return SentenceTransformerCrossEncoder()
+    if backend not in RERANKER_RUNTIMES:
+        raise ValueError(f"Unknown RERANKER_BACKEND '{backend}' (expected off, auto or one of {sorted(RERANKER_RUNTIMES)})")
+    return RERANKER_RUNTIMES[backend]()
+
+
+_reranker = None
+_reranker_failed = False
+_reranker_lock = threading.Lock()
+
+
+def reranker_enabled():
+    return RERANKER_BACKEND not in ("", "off", "0", "false", "none")
+
+
+def get_reranker():
+    """Process-wide cross-encoder, or None when reranking is off or the model could not be loaded."""
+    global _reranker, _reranker_failed
+    if not reranker_enabled():
+        return None
+    with _reranker_lock:
+        if _reranker is None and not _reranker_failed:
+            start = time.perf_counter()
+            try:
+                _reranker = load_reranker()
+            except Exception as e:
+                # Retrieval still works on fused scores; don't retry on every request
+                _reranker_failed = True
+                print(f"⚠️ Reranker unavailable, using fused ordering: {e}")
+                return None
+            print(f"🧠 Reranker loaded ({_reranker.name}) in {time.perf_counter() - start:.1f}s")
+        return _reranker
+
+
+def rerank_scores(pairs, budget_ms=RERANK_BUDGET_MS, batch_size=RERANK_BATCH_SIZE):
+    """
+    Cross-encoder scores for (query, passage) pairs, or None when reranking is
+    off/unavailable or the batches would not finish within `budget_ms`.
+    """
+    reranker = get_reranker()
+    if reranker is None or not pairs:
+        return None
+    start = time.perf_counter()
+    scores = []
+    for offset in range(0, len(pairs), batch_size):
+        if budget_ms and scores:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # Stop as soon as the remaining batches are projected to overrun
+            if elapsed_ms * len(pairs) / len(scores) > budget_ms:
+                print(f"⏱️ Rerank over budget ({elapsed_ms:.0f} ms for {len(scores)}/{len(pairs)} pairs) — using fused ordering")
+                return None
+        scores.extend(reranker.score(pairs[offset:offset + batch_size]))
+    return scores
@@ -0,0 +1,331 @@
+import os
+import re
+import asyncio
+import numpy as np
+from dotenv import load_dotenv
+from Modules.chunking import KB_CHUNK_TOKENS, chunk_blocks
+from Modules.context import assemble_reference
+from Modules.embeddings import embed_queries
+from Modules.knowledge_base import DEFAULT_NAMESPACE, KB_TOP_K
+from Modules.reranker import (
+    RERANK_CANDIDATES, RERANKER_BACKEND, RERANKER_MODEL_NAME, get_reranker, rerank_scores,
+)
+from Modules.retrieval_cache import load_retrieval, make_retrieval_key, store_retrieval
+
+
+# -------------------------------------------------------
+# Multi-vector hybrid RFP retrieval
+#   The embedding model only reads the first ~256 word pieces of its input, so
+#   embedding the whole RFP as one query retrieves on the cover page. Instead
+#   the RFP is cut into query chunks, embedded in one batch, and also scored
+#   against the BM25 index (exact SAP terms like PI/PO, ICO, GTS that dense
+#   vectors blur). Per chunk, the dense and BM25 rankings are merged with
+#   reciprocal-rank fusion into a (query chunk x passage) score matrix.
+#   Reference documents are ranked by pooling that matrix (weighted max + mean
+#   over chunks) and the best passages of the best documents are returned.
+# -------------------------------------------------------
+load_dotenv()
+
+KB_QUERY_CHUNK_TOKENS = int(os.getenv("KB_QUERY_CHUNK_TOKENS", str(KB_CHUNK_TOKENS)))
+# Long RFPs are sampled evenly down to this many query chunks
+KB_MAX_QUERY_CHUNKS = int(os.getenv("KB_MAX_QUERY_CHUNKS", "32"))
+# Passages fetched per query chunk before pooling
+KB_CANDIDATES_PER_QUERY = int(os.getenv("KB_CANDIDATES_PER_QUERY", "20"))
+# Reference documents whose passages are returned
+KB_TOP_DOCUMENTS = int(os.getenv("KB_TOP_DOCUMENTS", "2"))
+# Document score = max_weight * (best chunk match) + mean_weight * (average chunk match)
+KB_POOL_MAX_WEIGHT = float(os.getenv("KB_POOL_MAX_WEIGHT", "0.5"))
+KB_POOL_MEAN_WEIGHT = float(os.getenv("KB_POOL_MEAN_WEIGHT", "0.5"))
+# Reciprocal-rank fusion: score = sum over rankers of weight / (KB_RRF_K + rank)
+KB_RRF_K = int(os.getenv("KB_RRF_K", "60"))
+KB_DENSE_WEIGHT = float(os.getenv("KB_DENSE_WEIGHT", "1.0"))
+KB_BM25_WEIGHT = float(os.getenv("KB_BM25_WEIGHT", "1.0"))
+
+
+def retrieval_settings():
+    """Module-wide tuning that changes retrieval results (part of every retrieval cache key)."""
+    return {
+        "query_chunk_tokens": KB_QUERY_CHUNK_TOKENS, "max_query_chunks": KB_MAX_QUERY_CHUNKS,
+        "pool": [KB_POOL_MAX_WEIGHT, KB_POOL_MEAN_WEIGHT], "rrf_k": KB_RRF_K,
+        "weights": [KB_DENSE_WEIGHT, KB_BM25_WEIGHT],
+        "reranker": [RERANKER_BACKEND, RERANKER_MODEL_NAME, RERANK_CANDIDATES],
+    }
+
+
+def rfp_query_chunks(rfp_text, chunk_tokens=KB_QUERY_CHUNK_TOKENS, max_chunks=KB_MAX_QUERY_CHUNKS):
+    """Cut the RFP into embedding-sized query chunks, sampled evenly when there are too many."""
+    blocks = [{"type": "paragraph", "text": line.strip()} for line in re.split(r"\n+", rfp_text or "") if line.strip()]
+    chunks = [p["text"] for p in chunk_blocks(blocks, chunk_tokens, 0)]
+    if len(chunks) > max_chunks:
+        keep = np.linspace(0, len(chunks) - 1, max_chunks).round().astype(int)
+        chunks = [chunks[i] for i in sorted(set(keep.tolist()))]
+    return chunks
+
+
+def namespace_filter(namespace):
+    """Metadata filter restricting a search to one module's passages (None searches everything)."""
+    return {"namespace": namespace} if namespace else None
+
+
+def search_by_vectors(vector_store, query_vectors, k, filter=None):
+    """
+    Top-k passages per query vector as [(document, cosine similarity), ...].
+    The NumPy index answers the whole batch with one matrix product; other
+    stores are queried once per vector.
+    """
+    if hasattr(vector_store, "search_vectors"):
+        return [
+            [(vector_store._document(i), score) for i, score in hits]
+            for hits in vector_store.search_vectors(query_vectors, k, filter)
+        ]
+    if hasattr(vector_store, "similarity_search_by_vector_with_score"):
+        # Pinecone returns cosine similarity
+        return [vector_store.similarity_search_by_vector_with_score(vec, k=k, filter=filter) for vec in query_vectors]
+    # Chroma returns cosine distance
+    return [
+        [(doc, 1.0 - distance) for doc, distance
+         in vector_store.similarity_search_by_vector_with_relevance_scores(vec, k=k, filter=filter)]
+        for vec in query_vectors
+    ]
+
+
+def pool_scores(similarity, doc_sources, max_weight=KB_POOL_MAX_WEIGHT, mean_weight=KB_POOL_MEAN_WEIGHT):
+    """
+    similarity: (query chunks x passages) score matrix, 0 where a passage was not a hit.
+    Returns {source: score} pooled over query chunks from each chunk's best passage of that source.
+    """
+    sources = sorted(set(doc_sources))
+    doc_sources = np.asarray(doc_sources)
+    # (query chunks x sources): best passage of each source for each chunk
+    per_source = np.stack([similarity[:, doc_sources == source].max(axis=1) for source in sources], axis=1)
+    pooled = max_weight * per_source.max(axis=0) + mean_weight * per_source.mean(axis=0)
+    return dict(zip(sources, pooled.tolist()))
+
+
+def _passage_key(doc):
+    return doc.metadata.get("source", ""), doc.metadata.get("chunk_index", 0)
+
+
+def fuse_rankings(rankings, n_queries):
+    """
+    Reciprocal-rank fusion of several rankers.
+    rankings: [(weight, hits per query chunk as [(document, score), ...] best first), ...]
+    Returns (passages, fused (query chunks x passages) score matrix).
+    """
+    passages, columns = [], {}
+    for _, hits in rankings:
+        for query_hits in hits:
+            for doc, _ in query_hits:
+                if _passage_key(doc) not in columns:
+                    columns[_passage_key(doc)] = len(passages)
+                    passages.append(doc)
+
+    # Passages outside a chunk's candidates contribute nothing for that chunk
+    fused = np.zeros((n_queries, len(passages)), dtype=np.float32)
+    for weight, hits in rankings:
+        for row, query_hits in enumerate(hits):
+            for rank, (doc, _) in enumerate(query_hits, start=1):
+                fused[row, columns[_passage_key(doc)]] += weight / (KB_RRF_K + rank)
+    return passages, fused
+
+
+def hybrid_rankings(knowledge_base, queries, query_vectors, candidates_per_query=KB_CANDIDATES_PER_QUERY,
+                    namespace=None):
+    """Dense and (when indexed) BM25 rankings for a batch of queries, as fuse_rankings() input."""
+    filter = namespace_filter(namespace)
+    rankings = [(KB_DENSE_WEIGHT, search_by_vectors(knowledge_base.vector_store, query_vectors, candidates_per_query, filter))]
+    sparse_index = knowledge_base.sparse_index
+    if sparse_index is not None and len(sparse_index):
+        rankings.append((KB_BM25_WEIGHT, [
+            [(sparse_index.document(i), score) for i, score in hits]
+            for hits in sparse_index.search(queries, candidates_per_query, filter)
+        ]))
+    return rankings
+
+
+def rank_documents(passages, fused, top_documents=KB_TOP_DOCUMENTS):
+    """Pooled per-document scores and the best `top_documents` sources."""
+    doc_scores = pool_scores(fused, [doc.metadata.get("source", "") for doc in passages])
+    best_sources = sorted(doc_scores, key=doc_scores.get, reverse=True)[:top_documents]
+    print("🔎 Reference documents: " + ", ".join(f"{s} ({doc_scores[s]:.4f})" for s in best_sources))
+    return doc_scores, best_sources
+
+
+def select_passages(passages, fused, sources, k, doc_scores=None, queries=None):
+    """
+    Top-k passages from `sources` by their best fused score over the queries.
+    With `queries` and a reranker, the top RERANK_CANDIDATES are reordered by
+    cross-encoder score against the query each passage matched best.
+    """
+    passage_scores = fused.max(axis=0)
+    ranked = [i for i in np.argsort(-passage_scores) if passages[i].metadata.get("source", "") in sources]
+    reranked = {}
+    if queries is not None and get_reranker() is not None:
+        candidates = ranked[:max(k, RERANK_CANDIDATES)]
+        best_query = fused.argmax(axis=0)
+        scores = rerank_scores([(queries[best_query[i]], passages[i].page_content) for i in candidates])
+        if scores is not None:
+            reranked = dict(zip(candidates, scores))
+            ranked = sorted(candidates, key=reranked.get, reverse=True)
+    results = []
+    for i in ranked[:k]:
+        doc = passages[i]
+        doc.metadata = {**doc.metadata, "score": float(passage_scores[i])}
+        if doc_scores is not None:
+            doc.metadata["document_score"] = doc_scores[doc.metadata.get("source", "")]
+        if i in reranked:
+            doc.metadata["rerank_score"] = float(reranked[i])
+        results.append(doc)
+    return results
+
+
+def _cacheable(*doc_lists):
+    """Results that fell back to fused ordering (rerank over budget) are not cached."""
+    if get_reranker() is None:
+        return True
+    return all("rerank_score" in doc.metadata for docs in doc_lists for doc in docs)
+
+
+def retrieve_reference(knowledge_base, rfp_text, k=KB_TOP_K, top_documents=KB_TOP_DOCUMENTS,
+                       candidates_per_query=KB_CANDIDATES_PER_QUERY, namespace=DEFAULT_NAMESPACE):
+    """
+    Reference passages for an RFP: embed its query chunks in one batch, fuse dense
+    and BM25 hits within `namespace`, pool them per reference document, and return
+    up to k passages from the best documents. Repeat calls are served from the
+    retrieval cache until the index changes.
+    """
+    chunks = rfp_query_chunks(rfp_text)
+    if not chunks:
+        return []
+    cache_key = make_retrieval_key(
+        "reference", rfp_text, knowledge_base.index_version, k=k, top_documents=top_documents,
+        candidates_per_query=candidates_per_query, namespace=namespace, **retrieval_settings(),
+    )
+    cached = load_retrieval(knowledge_base, cache_key)
+    if cached is not None:
+        return cached[0]
+
+    query_vectors = embed_queries(knowledge_base.vector_store.embeddings, chunks)
+    rankings = hybrid_rankings(knowledge_base, chunks, query_vectors, candidates_per_query, namespace)
+    passages, fused = fuse_rankings(rankings, len(chunks))
+    if not passages:
+        return []
+    doc_scores, best_sources = rank_documents(passages, fused, top_documents)
+    reference = select_passages(passages, fused, best_sources, k, doc_scores, chunks)
+    if _cacheable(reference):
+        store_retrieval(cache_key, reference)
+    return reference
+
+
+# -------------------------------------------------------
+# Per-section targeted retrieval
+#   Each section generator declares what evidence it needs (query template),
+#   how many candidate passages to retrieve (k) and the token budget its
+#   assembled reference is packed into (tokens). The RFP chunks and all section queries
+#   are embedded in one batch; the searches then run concurrently and each
+#   section is restricted to the reference documents chosen for the whole RFP,
+#   so its prompt carries only its own top passages.
+# -------------------------------------------------------
+# {rfp_focus} is the opening of the RFP (title / cover / summary); generic sections leave it out
+SECTION_RETRIEVAL = {
+    "exec_summary": {
+        "query": "Executive summary, company introduction, SAP partnership and project objectives for {rfp_focus}",
+        "k": 6,
+        "tokens": 700,
+    },
+    "scope": {
+        "query": "In scope, out of scope, migration project prerequisites and assumptions for {rfp_focus}",
+        "k": 10,
+        "tokens": 1200,
+    },
+    "resource_schedule": {
+        "query": "Resource schedule, team roles and weekly loading, rate table, commercials, cost, "
+                 "timesheet, invoices and payment terms for {rfp_focus}",
+        "k": 10,
+        "tokens": 1200,
+    },
+    "communication_plan": {
+        "query": "Governance, communication plan, status reports and meetings, steering committee, "
+                 "issue resolution and escalation procedure",
+        "k": 8,
+        "tokens": 900,
+    },
+}
+# Words of the RFP opening substituted into {rfp_focus}
+RFP_FOCUS_WORDS = 40
+
+
+async def retrieve_section_references(knowledge_base, rfp_text, section_specs=None, top_documents=KB_TOP_DOCUMENTS,
+                                      candidates_per_query=KB_CANDIDATES_PER_QUERY, namespace=DEFAULT_NAMESPACE):
+    """
+    Returns (reference passages for the whole RFP, {task: passages for that section}).
+    One embedding batch covers the RFP chunks and every section query.
+    """
+    section_specs = section_specs or SECTION_RETRIEVAL
+    chunks = rfp_query_chunks(rfp_text)
+    if not chunks:
+        return [], {task: [] for task in section_specs}
+
+    cache_key = make_retrieval_key(
+        "sections", rfp_text, knowledge_base.index_version, section_specs=section_specs, k=KB_TOP_K,
+        top_documents=top_documents, candidates_per_query=candidates_per_query, namespace=namespace,
+        **retrieval_settings(),
+    )
+    cached = load_retrieval(knowledge_base, cache_key)
+    if cached is not None:
+        return cached
+
+    rfp_focus = " ".join(chunks[0].split()[:RFP_FOCUS_WORDS])
+    tasks = list(section_specs)
+    queries = [section_specs[task]["query"].format(rfp_focus=rfp_focus) for task in tasks]
+    vectors = await asyncio.to_thread(embed_queries, knowledge_base.vector_store.embeddings, chunks + queries)
+    chunk_vectors, query_vectors = vectors[:len(chunks)], vectors[len(chunks):]
+
+    def search(search_queries, search_vectors):
+        rankings = hybrid_rankings(knowledge_base, search_queries, search_vectors, candidates_per_query, namespace)
+        return fuse_rankings(rankings, len(search_queries))
+
+    # Document ranking and every section search run concurrently
+    document_hits, *section_hits = await asyncio.gather(
+        asyncio.to_thread(search, chunks, chunk_vectors),
+        *(asyncio.to_thread(search, [query], [vector]) for query, vector in zip(queries, query_vectors)),
+    )
+
+    passages, fused = document_hits
+    if not passages:
+        return [], {task: [] for task in tasks}
+    doc_scores, best_sources = rank_documents(passages, fused, top_documents)
+
+    def select(section_passages, section_fused, k, section_queries):
+        if not section_passages:
+            return []
+        return select_passages(section_passages, section_fused, best_sources, k, doc_scores, section_queries)
+
+    # Reranking (when enabled) of the reference and each section also runs concurrently
+    reference, *selected = await asyncio.gather(
+        asyncio.to_thread(select, passages, fused, KB_TOP_K, chunks),
+        *(asyncio.to_thread(select, section_passages, section_fused, section_specs[task]["k"], [query])
+          for task, query, (section_passages, section_fused) in zip(tasks, queries, section_hits)),
+    )
+    by_section = dict(zip(tasks, selected))
+    for task, docs in by_section.items():
+        print(f"🔎 {task}: {len(docs)} passages")
+    if _cacheable(reference, *by_section.values()):
+        store_retrieval(cache_key, reference, by_section)
+    return reference, by_section
+
+
+# -------------------------------------------------------
+# Module reference slices (GTS, CoreAssess)
+# -------------------------------------------------------
+
+def retrieve_module_reference(knowledge_base, query_text, namespace, max_tokens, model=None, k=KB_TOP_K,
+                              top_documents=KB_TOP_DOCUMENTS):
+    """
+    A bounded, relevant slice of one module's corpus: the best passages for
+    `query_text` within `namespace`, assembled into `max_tokens`.
+    Returns (reference text, source files used).
+    """
+    docs = retrieve_reference(knowledge_base, query_text, k=k, top_documents=top_documents, namespace=namespace)
+    sources = sorted({doc.metadata.get("source", "") for doc in docs})
+    return assemble_reference(knowledge_base, docs, max_tokens, model), sources
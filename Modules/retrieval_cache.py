@@ -0,0 +1,98 @@
+import os
+import re
+import json
+import hashlib
+from functools import lru_cache
+from dotenv import load_dotenv
+from Modules.knowledge_base import vector_id
+from Modules.llm_cache import LLMCache
+
+
+# -------------------------------------------------------
+# Persistent retrieval cache
+#   Repeat runs on the same RFP skip query embedding and every index search.
+#   Key: normalised RFP text hash + index version (manifest fingerprint, so any
+#   re-index invalidates it) + retrieval parameters. Value: the selected
+#   passage ids and scores; passage text is read back from the BM25 index,
+#   which holds every indexed passage.
+# -------------------------------------------------------
+load_dotenv()
+
+RETRIEVAL_CACHE_PATH = os.getenv("RETRIEVAL_CACHE_PATH", ".cache/retrieval_cache.sqlite3")
+RETRIEVAL_CACHE_MAX_BYTES = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+RETRIEVAL_CACHE_BYPASS = os.getenv("RETRIEVAL_CACHE_BYPASS", "").strip().lower() in ("1", "true", "yes")
+
+
+def normalize_rfp_text(text):
+    """Whitespace-insensitive form of the RFP text (re-extracted uploads often differ only in spacing)."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def make_retrieval_key(kind, rfp_text, index_version, **params):
+    """Stable key from retrieval kind, normalised RFP hash, index version and parameters."""
+    payload = {
+        "kind": kind,
+        "rfp": hashlib.sha256(normalize_rfp_text(rfp_text).encode("utf-8")).hexdigest(),
+        "index": index_version,
+        **params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_retrieval_cache():
+    """Process-wide retrieval cache (same SQLite LRU + TTL store as the LLM cache, separate file)."""
+    return LLMCache(RETRIEVAL_CACHE_PATH, RETRIEVAL_CACHE_MAX_BYTES, RETRIEVAL_CACHE_TTL_SECONDS)
+
+
+# Retrieval scores carried in passage metadata
+SCORE_FIELDS = ("score", "document_score", "rerank_score")
+
+
+def _encode_passages(docs):
+    return [
+        {
+            "id": vector_id(doc.metadata.get("source", ""), doc.metadata.get("chunk_index", 0)),
+            **{field: doc.metadata[field] for field in SCORE_FIELDS if field in doc.metadata},
+        }
+        for doc in docs
+    ]
+
+
+def _decode_passages(sparse_index, entries):
+    docs = sparse_index.documents_by_id([entry["id"] for entry in entries])
+    if any(doc is None for doc in docs):
+        return None
+    for doc, entry in zip(docs, entries):
+        doc.metadata.update({field: entry[field] for field in SCORE_FIELDS if field in entry})
+    return docs
+
+
+def load_retrieval(knowledge_base, key):
+    """
+    Cached (reference passages, {task: passages}) for `key`, or None on a miss
+    (including when a cached passage is no longer indexed).
+    """
+    sparse_index = knowledge_base.sparse_index
+    if RETRIEVAL_CACHE_BYPASS or sparse_index is None or not len(sparse_index):
+        return None
+    value = get_retrieval_cache().get(key)
+    if value is None:
+        return None
+    entry = json.loads(value)
+    reference = _decode_passages(sparse_index, entry["reference"])
+    sections = {task: _decode_passages(sparse_index, docs) for task, docs in entry["sections"].items()}
+    if reference is None or any(docs is None for docs in sections.values()):
+        return None
+    print(f"♻️ Retrieval cache hit ({len(reference)} passages)")
+    return reference, sections
+
+
+def store_retrieval(key, reference, sections=None):
+    if RETRIEVAL_CACHE_BYPASS:
+        return
+    get_retrieval_cache().put(key, json.dumps({
+        "reference": _encode_passages(reference),
+        "sections": {task: _encode_passages(docs) for task, docs in (sections or {}).items()},
+    }))
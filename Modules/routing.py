@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import time
+import threading
+from dotenv import load_dotenv
+from Modules.llm import last_call_cached
+from Modules.tokens import count_tokens
+
+
+# -------------------------------------------------------
+# Per-task model routing
+#   task -> deployment, max_tokens, temperature, in one table instead of
+#   deployment names hardcoded at every call site. Point boilerplate and
+#   condensation routes at a cheap/fast deployment and keep the large model
+#   for the sections that need it; route_stats() shows what each route costs.
+# -------------------------------------------------------
+load_dotenv()
+
+# Numbered tasks ("gts_section_3") fall back to their family ("gts_section"),
+# so a family route sets the deployment for every section and a numbered route
+# overrides a single one. Override with
+#   LLM_ROUTES='{"condense": {"deployment": "gpt-4o-mini"}, "gts_section_7": {"max_tokens": 400}}'
+# or a JSON file of the same shape in LLM_ROUTES_FILE.
+ROUTES = {
+    "condense": {"deployment": "gpt-4o", "max_tokens": 1200, "temperature": 0.3},
+    "condense_chunk": {"deployment": "gpt-4o", "max_tokens": int(os.getenv("CHUNK_SUMMARY_MAX_TOKENS", "500")), "temperature": 0.0},
+    "exec_summary": {"deployment": "Codetest", "max_tokens": 2000, "temperature": 0.3},
+    "scope": {"deployment": "Codetest", "max_tokens": 1500, "temperature": 0.3},
+    "resource_schedule": {"deployment": "Codetest", "max_tokens": 2000, "temperature": 0.3},
+    "communication_plan": {"deployment": "gpt-4o", "max_tokens": 2500, "temperature": 0.3},
+    "gts_section": {"deployment": "codetest", "temperature": 0.4},
+    "ai_section": {"deployment": "codetest", "temperature": 0.4},
+    "coreassess_section": {"deployment": "codetest", "temperature": 0.4},
+    "coreassess_classification": {"deployment": "codetest", "temperature": 0.4},
+}
+
+
+def _load_route_overrides():
+    overrides = {}
+    routes_file = os.getenv("LLM_ROUTES_FILE")
+    if routes_file and os.path.exists(routes_file):
+        with open(routes_file, "r", encoding="utf-8") as f:
+            overrides.update(json.load(f))
+    overrides.update(json.loads(os.getenv("LLM_ROUTES", "{}")))
+    return overrides
+
+
+for _task, _override in _load_route_overrides().items():
+    ROUTES[_task] = {**ROUTES.get(_task, {}), **_override}
+
+
+def get_route(task, **defaults):
+    """
+    Resolve a task to {"task", "deployment", "max_tokens", "temperature"}.
+    Precedence: exact route > family route (numbered suffix stripped) > defaults.
+    """
+    family = re.sub(r"_\d+$", "", task)
+    route = {"max_tokens": None, "temperature": 0.3, **defaults}
+    if family != task:
+        route.update(ROUTES.get(family, {}))
+    route.update(ROUTES.get(task, {}))
+    if not route.get("deployment"):
+        raise KeyError(f"No deployment configured for LLM route '{task}'")
+    route["task"] = task
+    return route
+
+
+# -------------------------------------------------------
+# Per-route latency / token metrics
+# -------------------------------------------------------
+_route_stats = {}
+_route_stats_lock = threading.Lock()
+
+
+def _route_entry(route):
+    return _route_stats.setdefault(route["task"], {
+        "deployment": route["deployment"], "calls": 0, "failures": 0, "cache_hits": 0,
+        "latency_total": 0.0, "latency_max": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+    })
+
+
+def record_route(route, latency, prompt_tokens, completion_tokens, failed=False):
+    with _route_stats_lock:
+        stats = _route_entry(route)
+        stats["calls"] += 1
+        stats["failures"] += int(failed)
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+
+
+def record_route_cache_hit(route):
+    # Served from the LLM cache: no deployment call, latency or tokens to account for
+    with _route_stats_lock:
+        _route_entry(route)["cache_hits"] += 1
+
+
+def route_stats():
+    """Per-task calls, cache hits, latency and token counters since startup."""
+    with _route_stats_lock:
+        return {task: dict(stats) for task, stats in _route_stats.items()}
+
+
+async def track_route(route, prompt, coro):
+    """Await an LLM call made for `route`, logging its latency and token counts."""
+    start = time.perf_counter()
+    prompt_tokens = count_tokens(prompt, route["deployment"])
+    try:
+        result = await coro
+    except Exception:
+        record_route(route, time.perf_counter() - start, prompt_tokens, 0, failed=True)
+        raise
+    latency = time.perf_counter() - start
+    if last_call_cached():
+        record_route_cache_hit(route)
+        print(f"📊 {route['task']} → {route['deployment']}: served from LLM cache")
+        return result
+    output = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    completion_tokens = count_tokens(output, route["deployment"])
+    record_route(route, latency, prompt_tokens, completion_tokens)
+    print(
+        f"📊 {route['task']} → {route['deployment']}: {latency:.1f}s, "
+        f"{prompt_tokens} prompt / {completion_tokens} completion tokens"
+    )
+    return result
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from dotenv import load_dotenv
+import openai
+from Modules.tokens import CHAT_OVERHEAD_TOKENS, count_tokens
+
+
+# -------------------------------------------------------
+# Rate-limit-aware LLM scheduler
+#   - token buckets for requests/min and tokens/min per deployment
+#   - callers wait for budget instead of failing
+#   - retries 429 / 5xx / connection errors with exponential backoff + full jitter
+# -------------------------------------------------------
+load_dotenv()
+
+DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "60"))
+DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "60000"))
+
+# Per-deployment budgets; override with LLM_RATE_LIMITS='{"gpt-4o": {"rpm": 120, "tpm": 150000}}'
+DEPLOYMENT_LIMITS = {
+    "Codetest": {"rpm": DEFAULT_RPM, "tpm": DEFAULT_TPM},
+    "codetest": {"rpm": DEFAULT_RPM, "tpm": DEFAULT_TPM},
+    "gpt-4o": {"rpm": DEFAULT_RPM, "tpm": DEFAULT_TPM},
+}
+DEPLOYMENT_LIMITS.update(json.loads(os.getenv("LLM_RATE_LIMITS", "{}")))
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60.0"))
+
+
+class TokenBucket:
+    """
+    Reservation-style token bucket. reserve() always succeeds and returns how long
+    the caller must wait, so concurrent callers queue in arrival order.
+    Thread-safe and event-loop agnostic (callers sleep themselves).
+    """
+
+    def __init__(self, capacity, per_minute):
+        self.capacity = float(capacity)
+        self.rate = per_minute / 60.0
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def refund(self, amount):
+        """Give back (or take, if negative) budget once the real usage is known."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class DeploymentLimiter:
+    """RPM + TPM buckets and call statistics for one Azure deployment."""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm, rpm)
+        self.tokens = TokenBucket(tpm, tpm)
+        self.stats = {
+            "calls": 0, "retries": 0, "failures": 0,
+            "queue_wait_total": 0.0, "queue_wait_max": 0.0, "backoff_total": 0.0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def reserve(self, estimated_tokens):
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def record(self, queue_wait=0.0, backoff=0.0, retried=False, failed=False, call=False):
+        # queue_wait is time spent waiting for RPM/TPM budget; retry backoff is kept apart
+        with self._stats_lock:
+            self.stats["calls"] += int(call)
+            self.stats["retries"] += int(retried)
+            self.stats["failures"] += int(failed)
+            self.stats["queue_wait_total"] += queue_wait
+            self.stats["queue_wait_max"] = max(self.stats["queue_wait_max"], queue_wait)
+            self.stats["backoff_total"] += backoff
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model):
+    with _limiters_lock:
+        if model not in _limiters:
+            limits = DEPLOYMENT_LIMITS.get(model, {"rpm": DEFAULT_RPM, "tpm": DEFAULT_TPM})
+            _limiters[model] = DeploymentLimiter(limits["rpm"], limits["tpm"])
+        return _limiters[model]
+
+
+def scheduler_stats():
+    """Per-deployment call, retry, queue-wait and retry-backoff counters."""
+    with _limiters_lock:
+        return {model: dict(limiter.stats) for model, limiter in _limiters.items()}
+
+
+def estimate_tokens(prompt, max_tokens=None, model=None):
+    """Prompt tokens (exact, via tiktoken) + reserved completion tokens, used for TPM admission."""
+    return count_tokens(prompt, model) + CHAT_OVERHEAD_TOKENS + (max_tokens or 1000)
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_delay(error, attempt):
+    """Exponential backoff with full jitter, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            delay = max(delay, float(headers["retry-after-ms"]) / 1000.0)
+        elif headers.get("retry-after"):
+            delay = max(delay, float(headers["retry-after"]))
+    except ValueError:
+        pass
+    return min(delay, BACKOFF_MAX_SECONDS)
+
+
+async def run_scheduled(model, estimated_tokens, call):
+    """
+    Await call() once the deployment has RPM/TPM budget, retrying transient failures.
+    `call` is a zero-argument coroutine factory so each retry issues a fresh request.
+    """
+    limiter = get_limiter(model)
+    queue_wait = 0.0
+    backoff = 0.0
+    for attempt in range(MAX_RETRIES + 1):
+        wait = limiter.reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            queue_wait += wait
+        try:
+            result = await call()
+            limiter.record(queue_wait=queue_wait, backoff=backoff, call=True)
+            if queue_wait > 0 or backoff > 0:
+                print(f"⏳ {model}: waited {queue_wait:.2f}s in queue, {backoff:.2f}s in retry backoff")
+            return result
+        except Exception as e:
+            if not _is_retryable(e) or attempt == MAX_RETRIES:
+                limiter.record(queue_wait=queue_wait, backoff=backoff, failed=True)
+                raise
+            delay = _retry_delay(e, attempt)
+            limiter.record(retried=True)
+            print(f"🔁 {model}: {type(e).__name__}, retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            backoff += delay
+
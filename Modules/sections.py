@@ -0,0 +1,76 @@
+import asyncio
+from Modules.llm import async_stream_chat_completion
+from Modules.routing import get_route, track_route
+
+
+# -------------------------------------------------------
+# Section-parallel SOW engine
+#   Each SOW section is its own completion; all sections run concurrently
+#   (same idea as integration.py's asyncio.gather) and are stitched back in order.
+#   Section N is routed as "<route_prefix>_section_N" (or the section's own "route"),
+#   so its deployment / max_tokens / temperature come from Modules.routing.
+# -------------------------------------------------------
+
+def build_section_prompt(preamble, number, section, closing_rules=""):
+    """Prompt for a single numbered SOW section sharing the module's common preamble."""
+    return f"""{preamble}
+
+Now write ONLY the following section of the proposal — other sections are written separately.
+
+{number}. {section["title"]}
+{section["instructions"]}
+
+Output rules:
+- Begin directly with the heading line "{number}. {section["title"]}" — no preamble, title or summary before it.
+- Number sub-sections as {number}.1, {number}.2, … where the instructions ask for them.
+- Do not write any other section, and do not conclude the whole proposal unless this section asks for it.
+{closing_rules}
+"""
+
+
+async def generate_sections_async(client, route_prefix, preamble, sections, closing_rules="", on_delta=None,
+                                  on_error=None):
+    """
+    Generate all sections concurrently and return the stitched document text.
+    on_delta(document_so_far) receives the in-order concatenation as sections stream in.
+    A section that fails is left out of the document and reported through
+    on_error(number, title, error); without on_error the failure is raised.
+    """
+    partial = [""] * len(sections)
+
+    def stitch():
+        return "\n\n".join(text for text in partial if text)
+
+    async def run_section(index, section):
+        def on_section_delta(text):
+            partial[index] = text
+            if on_delta:
+                on_delta(stitch())
+
+        route = get_route(
+            section.get("route") or f"{route_prefix}_section_{index + 1}",
+            max_tokens=section.get("max_tokens"),
+        )
+        prompt = build_section_prompt(preamble, index + 1, section, closing_rules)
+        try:
+            text = await track_route(route, prompt, async_stream_chat_completion(
+                client,
+                model=route["deployment"],
+                prompt=prompt,
+                temperature=route["temperature"],
+                max_tokens=route["max_tokens"],
+                on_delta=on_section_delta,
+            ))
+        except Exception as e:
+            partial[index] = ""
+            if on_error is None:
+                raise
+            on_error(index + 1, section["title"], e)
+            return ""
+        partial[index] = text
+        return text
+
+    await asyncio.gather(*(run_section(i, section) for i, section in enumerate(sections)))
+    if on_delta:
+        on_delta(stitch())
+    return stitch()
@@ -0,0 +1,169 @@
+import os
+import json
+import struct
+import hashlib
+from datetime import datetime, timezone
+import numpy as np
+from Modules.chunking import chunker_config
+from Modules.embeddings import EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME, embedding_config
+from Modules.knowledge_base import KB_SNAPSHOT_PATH, MANIFEST_VERSION, save_manifest
+
+
+# -------------------------------------------------------
+# Portable knowledge-base snapshot (one file)
+#   Exported once at build time:  python -m Modules.snapshot export [path]
+#   and shipped with the deployment (KB_SNAPSHOT_PATH). At startup the file is
+#   memory-mapped and installed as the NumPy index plus its BM25 index and
+#   manifest; no passage is re-embedded and no vector service is contacted.
+#   A snapshot built with another embedding model or runtime, chunker or
+#   manifest version is rejected (and the index is built the normal way).
+#
+#   Layout:  MAGIC | header length (uint64 LE) | JSON header | zero padding to
+#            64 bytes | float32 embedding matrix (passages x dimension)
+#   The header holds format/model/runtime/chunker versions, the manifest and the
+#   passage ids, texts and metadata.
+# -------------------------------------------------------
+SNAPSHOT_MAGIC = b"RFPKBSNP"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64
+DEFAULT_SNAPSHOT_PATH = KB_SNAPSHOT_PATH or "knowledge_base.kbsnap"
+
+
+def _matrix_offset(header_length):
+    used = len(SNAPSHOT_MAGIC) + 8 + header_length
+    return -(-used // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+def _snapshot_id(header, vectors):
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    digest.update(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def write_snapshot(path, ids, texts, metadatas, vectors, manifest):
+    """Write one snapshot file atomically; returns its header."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+    header = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding": embedding_config(),
+        "dimension": int(vectors.shape[1]) if len(ids) else EMBEDDING_DIMENSION,
+        "chunker": chunker_config(),
+        "manifest_version": MANIFEST_VERSION,
+        "manifest": manifest,
+        "count": len(ids),
+        "ids": list(ids),
+        "texts": list(texts),
+        "metadatas": list(metadatas),
+    }
+    header["snapshot_id"] = _snapshot_id(header, vectors)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (_matrix_offset(len(header_bytes)) - f.tell()))
+        f.write(vectors.tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+def open_snapshot(path):
+    """
+    Read a snapshot's header and memory-map its embedding matrix.
+    Raises ValueError when the file is not a snapshot or was built with another
+    format, embedding model or runtime, chunker or manifest version.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError("not a knowledge-base snapshot")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length).decode("utf-8"))
+
+    expected = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding": embedding_config(),
+        "chunker": chunker_config(),
+        "manifest_version": MANIFEST_VERSION,
+    }
+    for field, value in expected.items():
+        if header.get(field) != value:
+            raise ValueError(f"snapshot {field} is {header.get(field)!r}, this build expects {value!r}")
+
+    shape = (header["count"], header["dimension"])
+    vectors = (
+        np.memmap(path, dtype=np.float32, mode="r", offset=_matrix_offset(header_length), shape=shape)
+        if header["count"] else np.empty(shape, dtype=np.float32)
+    )
+    return header, vectors
+
+
+def install_snapshot(header, vectors, vector_store, index_name, manifest_path, sparse_index):
+    """
+    Replace the NumPy index, BM25 index and manifest with the snapshot's contents.
+    Skipped when this snapshot is already installed (the marker next to the
+    manifest records its id), so restarts only pay for the memory map.
+    """
+    marker_path = f"{os.path.splitext(manifest_path)[0]}.snapshot"
+    try:
+        with open(marker_path, "r", encoding="utf-8") as f:
+            installed = f.read().strip()
+    except OSError:
+        installed = None
+    if installed == header["snapshot_id"] and len(vector_store) and len(sparse_index):
+        return False
+
+    from langchain_core.documents import Document as LDocument
+
+    ids, texts, metadatas = header["ids"], header["texts"], header["metadatas"]
+    vector_store.load_vectors(ids, texts, metadatas, vectors)
+    sparse_index.delete(list(sparse_index.ids))
+    sparse_index.add_documents(
+        [LDocument(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)], ids,
+    )
+    sparse_index.save()
+    save_manifest({**header["manifest"], "index": index_name}, manifest_path)
+    with open(marker_path, "w", encoding="utf-8") as f:
+        f.write(header["snapshot_id"])
+    print(f"📦 Installed knowledge-base snapshot {header['snapshot_id'][:12]} ({header['count']} passages, built {header['created_at']})")
+    return True
+
+
+def export_snapshot(path=DEFAULT_SNAPSHOT_PATH, folder=None, backend=None):
+    """Sync the configured knowledge base and write every indexed passage with its embedding to `path`."""
+    from Modules.context import passage_vectors
+    from Modules.knowledge_base import KNOWLEDGE_FOLDER, load_knowledge_base
+
+    knowledge_base = load_knowledge_base(folder or KNOWLEDGE_FOLDER, backend, snapshot_path="")
+    sparse_index = knowledge_base.sparse_index
+    docs = [sparse_index.document(i) for i in range(len(sparse_index))]
+    vectors = passage_vectors(knowledge_base, docs) if docs else np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+    with open(knowledge_base.manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    header = write_snapshot(
+        path, [doc.id for doc in docs], [doc.page_content for doc in docs],
+        [doc.metadata for doc in docs], vectors, manifest,
+    )
+    print(f"📦 Exported {header['count']} passages ({len(manifest.get('files', {}))} files) to {path} "
+          f"[{header['snapshot_id'][:12]}, {os.path.getsize(path) / 1e6:.1f} MB]")
+    return header
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    target = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SNAPSHOT_PATH
+    if command == "export":
+        export_snapshot(target)
+    elif command == "info":
+        info, _ = open_snapshot(target)
+        print(json.dumps({k: v for k, v in info.items() if k not in ("ids", "texts", "metadatas", "manifest")}, indent=2))
+    else:
+        sys.exit("usage: python -m Modules.snapshot [export|info] [path]")
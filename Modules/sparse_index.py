@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import numpy as np
+from scipy import sparse
+from langchain_core.documents import Document as LDocument
+
+
+# -------------------------------------------------------
+# BM25 inverted index over knowledge-base passages
+#   Built at indexing time next to the dense index. Passages are stored as a
+#   CSR matrix of precomputed BM25 term weights (passages x terms), so scoring
+#   a batch of queries is one sparse matrix product.
+#   <prefix>.npz  — term-weight matrix
+#   <prefix>.json — passage ids, texts, metadata and term counts
+# -------------------------------------------------------
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Compound SAP identifiers (PI/PO, S/4HANA, SAP-GTS, CO-PA, 7.5) are kept as one
+# token and also split into their parts, so "PI/PO" matches both "PI/PO" and "PO"
+_TOKEN = re.compile(r"[a-z0-9]+(?:[/\-.&+][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "we our you your they their which who all any can may shall should not no".split()
+)
+
+
+def sap_tokenize(text):
+    """Lowercased terms with SAP compound identifiers kept whole and also split."""
+    terms = []
+    for token in _TOKEN.findall((text or "").lower()):
+        parts = re.split(r"[/\-.&+]", token)
+        if len(parts) > 1:
+            terms.append(token)
+            # "s/4hana" is also written "s4hana"
+            terms.append("".join(parts))
+            terms.extend(p for p in parts if p not in _STOPWORDS and (len(p) > 1 or p.isdigit()))
+        elif token not in _STOPWORDS and (len(token) > 1 or token.isdigit()):
+            terms.append(token)
+    return terms
+
+
+def _term_counts(text):
+    counts = {}
+    for term in sap_tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+class SparseIndex:
+    """BM25 index with upsert/delete by passage id, persisted to <prefix>.npz / <prefix>.json."""
+
+    def __init__(self, path_prefix):
+        self.matrix_path = f"{path_prefix}.npz"
+        self.meta_path = f"{path_prefix}.json"
+        self.ids, self.texts, self.metadatas, self.counts = [], [], [], []
+        self.vocabulary = {}
+        self.matrix = None
+        self._dirty = False
+        if os.path.exists(self.meta_path) and os.path.exists(self.matrix_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.ids, self.texts, self.metadatas = meta["ids"], meta["texts"], meta["metadatas"]
+            self.counts, self.vocabulary = meta["counts"], meta["vocabulary"]
+            self.matrix = sparse.load_npz(self.matrix_path).tocsr()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---- Writes ----
+    def add_documents(self, docs, ids):
+        position = {vid: i for i, vid in enumerate(self.ids)}
+        for vid, doc in zip(ids, docs):
+            row = (doc.page_content, dict(doc.metadata), _term_counts(doc.page_content))
+            if vid in position:
+                i = position[vid]
+                self.texts[i], self.metadatas[i], self.counts[i] = row
+            else:
+                position[vid] = len(self.ids)
+                self.ids.append(vid)
+                self.texts.append(row[0])
+                self.metadatas.append(row[1])
+                self.counts.append(row[2])
+        self._dirty = True
+
+    def delete(self, ids):
+        drop = set(ids)
+        keep = [i for i, vid in enumerate(self.ids) if vid not in drop]
+        if len(keep) != len(self.ids):
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.counts = [self.counts[i] for i in keep]
+            self._dirty = True
+
+    def _build_matrix(self):
+        """Recompute vocabulary and BM25 weights (idf and length normalisation depend on the whole corpus)."""
+        self.vocabulary = {}
+        rows, cols, tfs = [], [], []
+        for row, counts in enumerate(self.counts):
+            for term, tf in counts.items():
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                tfs.append(tf)
+        n_docs, n_terms = len(self.counts), len(self.vocabulary)
+        tf = sparse.csr_matrix((np.asarray(tfs, dtype=np.float32), (rows, cols)), shape=(n_docs, n_terms))
+        if not n_docs:
+            self.matrix = tf
+            return
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = max(doc_len.mean(), 1.0)
+        df = np.bincount(tf.indices, minlength=n_terms)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        tf = tf.tocoo()
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[tf.row] / avg_len)
+        weights = idf[tf.col] * tf.data * (BM25_K1 + 1) / (tf.data + norm)
+        self.matrix = sparse.csr_matrix((weights.astype(np.float32), (tf.row, tf.col)), shape=(n_docs, n_terms))
+
+    def save(self):
+        if not self._dirty:
+            return
+        self._build_matrix()
+        os.makedirs(os.path.dirname(self.meta_path) or ".", exist_ok=True)
+        tmp_matrix = f"{self.matrix_path}.tmp.npz"
+        tmp_meta = f"{self.meta_path}.tmp"
+        sparse.save_npz(tmp_matrix, self.matrix)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": self.ids, "texts": self.texts, "metadatas": self.metadatas,
+                "counts": self.counts, "vocabulary": self.vocabulary,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_meta, self.meta_path)
+        self._dirty = False
+
+    # ---- Queries ----
+    def query_matrix(self, queries):
+        """(queries x terms) sparse matrix of query term counts; unknown terms are dropped."""
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for term in sap_tokenize(query):
+                col = self.vocabulary.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary)),
+        )
+
+    def search(self, queries, k=10, filter=None):
+        """
+        Top-k BM25 hits per query as [(row index, score), ...], best first; zero scores are dropped.
+        `filter` restricts hits to passages whose metadata equals every given field.
+        """
+        if self.matrix is None or not self.ids or self._dirty:
+            return [[] for _ in queries]
+        scores = (self.query_matrix(queries) @ self.matrix.T).toarray()
+        if filter:
+            allowed = np.fromiter(
+                (all(m.get(key) == value for key, value in filter.items()) for m in self.metadatas),
+                dtype=bool, count=len(self.ids),
+            )
+            scores[:, ~allowed] = 0.0
+        results = []
+        for row in scores:
+            k_row = min(k, len(row))
+            idx = np.argpartition(-row, k_row - 1)[:k_row]
+            idx = idx[np.argsort(-row[idx])]
+            results.append([(int(i), float(row[i])) for i in idx if row[i] > 0])
+        return results
+
+    def document(self, index):
+        return LDocument(id=self.ids[index], page_content=self.texts[index], metadata=dict(self.metadatas[index]))
+
+    def documents_by_id(self, ids):
+        """Passages for the given ids (None for ids no longer indexed)."""
+        position = {vid: i for i, vid in enumerate(self.ids)}
+        return [self.document(position[vid]) if vid in position else None for vid in ids]
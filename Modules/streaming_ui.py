@@ -0,0 +1,37 @@
+import time
+import streamlit as st
+
+
+# -------------------------------------------------------
+# Live markdown preview for streamed LLM output
+# -------------------------------------------------------
+
+def make_live_preview(ui, title="📝 Live preview", expanded=True):
+    """
+    Create an expander that re-renders streamed markdown.
+    Returns (on_delta, timings) — pass on_delta to async_stream_chat_completion and
+    `ui` (a Modules.azure_client.UiDispatcher) to run_async so rendering happens on
+    the script thread; timings["ttft"] holds seconds until the first token arrived.
+    """
+    container = st.expander(title, expanded=expanded)
+    render = ui.wrap(container.empty().markdown)
+    timings = {"start": time.perf_counter()}
+
+    def on_delta(text):
+        if "ttft" not in timings:
+            timings["ttft"] = time.perf_counter() - timings["start"]
+        render(text)
+
+    return on_delta, timings
+
+
+def report_timings(timings, label="Generation"):
+    """Show time-to-first-token and total time under the preview."""
+    total = time.perf_counter() - timings["start"]
+    ttft = timings.get("ttft", total)
+    st.caption(f"⏱️ {label}: first token after {ttft:.1f}s, completed in {total:.1f}s")
+
+
+def report_section_error(number, title, error):
+    """Flag a section that failed to generate (it is left out of the document)."""
+    st.error(f"⚠️ Section {number}. {title} could not be generated and is missing from the document: {error}")
@@ -0,0 +1,251 @@
+import json
+import re
+from Modules.llm import async_stream_chat_completion
+
+
+# -------------------------------------------------------
+# Structured (JSON schema) section output
+#   Sections come back as typed block records instead of markdown, so callers
+#   no longer regex-split the output or re-parse it line by line:
+#     {"type": "heading" | "paragraph" | "bullets" | "table",
+#      "text": str, "items": [str], "headers": [str], "rows": [[str]]}
+#   Fields a block type does not use are left empty.
+#   Needs a deployment and API version with strict json_schema support, so
+#   integration.py only uses it with STRUCTURED_OUTPUT=1.
+# -------------------------------------------------------
+
+BLOCK_TYPES = ["heading", "paragraph", "bullets", "table"]
+
+BLOCK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string", "enum": BLOCK_TYPES},
+        "text": {"type": "string"},
+        "items": {"type": "array", "items": {"type": "string"}},
+        "headers": {"type": "array", "items": {"type": "string"}},
+        "rows": {"type": "array", "items": {"type": "array", "items": {"type": "string"}}},
+    },
+    "required": ["type", "text", "items", "headers", "rows"],
+    "additionalProperties": False,
+}
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+### 🔹 OUTPUT FORMAT (overrides any Markdown formatting asked for above):
+Return a JSON object with one array of blocks per section key: {section_keys}.
+Each block is one of:
+- "heading": a sub-heading in "text" (no #, ** or trailing colon)
+- "paragraph": one paragraph in "text"
+- "bullets": one bullet list, one entry per item in "items" (no leading - or •)
+- "table": column names in "headers" and one list of cell values per row in "rows"
+Leave fields a block does not use empty. Write plain text — no Markdown syntax inside values.
+Reproduce any fixed sentences and tables required above in the matching blocks, in order.
+"""
+
+
+def sections_response_format(section_keys, name="proposal_sections"):
+    """json_schema response_format with one required array of blocks per section key."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {key: {"type": "array", "items": BLOCK_SCHEMA} for key in section_keys},
+                "required": list(section_keys),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def with_structured_output(prompt_fn, section_keys):
+    """Wrap a section prompt builder so the prompt ends with the JSON output instructions."""
+    instructions = STRUCTURED_OUTPUT_INSTRUCTIONS.format(section_keys=", ".join(f'"{k}"' for k in section_keys))
+
+    def build(*args, **kwargs):
+        return prompt_fn(*args, **kwargs) + instructions
+
+    return build
+
+
+def parse_sections(text, section_keys):
+    """Parse a structured response into {section_key: [block, ...]}; raises ValueError if invalid."""
+    data = json.loads(text)
+    if not isinstance(data, dict) or any(not isinstance(data.get(key), list) for key in section_keys):
+        raise ValueError(f"Structured output is missing sections {list(section_keys)}")
+    return {key: data[key] for key in section_keys}
+
+
+def _complete_block(block):
+    """Fill fields a truncated block never received."""
+    return {"type": "paragraph", "text": "", "items": [], "headers": [], "rows": [], **block}
+
+
+def salvage_sections(text, section_keys, max_attempts=200):
+    """
+    Sections recovered from a response cut off at max_tokens: the longest prefix
+    (trimmed back element by element) that closes into valid JSON.
+    Returns None when nothing can be recovered.
+    """
+    cut = len(text)
+    for _ in range(max_attempts):
+        try:
+            data = json.loads(close_partial_json(text[:cut]))
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return {
+                key: [_complete_block(b) for b in data.get(key) or [] if isinstance(b, dict)]
+                for key in section_keys
+            }
+        cut = text.rfind(",", 0, cut)
+        if cut <= 0:
+            return None
+    return None
+
+
+def is_valid_sections(text, section_keys):
+    try:
+        parse_sections(text, section_keys)
+        return True
+    except ValueError:
+        return False
+
+
+def close_partial_json(text):
+    """Best-effort completion of a truncated JSON document (for live previews while streaming)."""
+    stack, in_string, escape = [], False, False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    closed = text[:-1] if escape else text
+    if in_string:
+        closed += '"'
+    closed = re.sub(r"[,:]\s*$", "", closed)
+    return closed + "".join(reversed(stack))
+
+
+# -------------------------------------------------------
+# Block helpers
+# -------------------------------------------------------
+
+def blocks_to_markdown(blocks):
+    """Render block records as markdown for the Streamlit review tabs."""
+    lines = []
+    for block in blocks or []:
+        kind = block.get("type")
+        if kind == "heading" and block.get("text"):
+            lines.append(f"**{block['text']}**")
+        elif kind == "bullets":
+            lines.extend(f"- {item}" for item in block.get("items") or [])
+        elif kind == "table" and block.get("headers"):
+            headers = block["headers"]
+            lines.append("| " + " | ".join(headers) + " |")
+            lines.append("|" + "---|" * len(headers))
+            lines.extend("| " + " | ".join(row) + " |" for row in block.get("rows") or [])
+        elif block.get("text"):
+            lines.append(block["text"])
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def sections_to_markdown(sections):
+    """Markdown preview of several sections, each under its own title."""
+    if len(sections) == 1:
+        return blocks_to_markdown(next(iter(sections.values())))
+    return "\n\n".join(
+        f"### {key.replace('_', ' ').title()}\n\n{blocks_to_markdown(blocks)}" for key, blocks in sections.items()
+    )
+
+
+def markdown_to_blocks(text):
+    """Convert legacy markdown section text into block records (same rules the DOCX renderer used)."""
+    lines = [line.strip() for line in (text or "").split("\n") if line.strip()]
+    blocks = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        # Markdown-style table
+        if line.startswith("|"):
+            table_lines = []
+            while i < len(lines) and lines[i].startswith("|"):
+                table_lines.append(lines[i])
+                i += 1
+            headers = [h.strip("* ") for h in table_lines[0].strip("|").split("|")]
+            rows = [[c.strip() for c in r.strip("|").split("|")] for r in table_lines[2:]]
+            blocks.append({"type": "table", "text": "", "items": [], "headers": headers, "rows": rows})
+            continue
+
+        # Section heading
+        if line.startswith("**") or line.startswith("###"):
+            blocks.append({"type": "heading", "text": line.strip("*# ").rstrip(":"), "items": [], "headers": [], "rows": []})
+            i += 1
+            continue
+
+        # Bullets: consecutive lines become one list
+        if line.startswith("- ") or line.startswith("• "):
+            items = []
+            while i < len(lines) and (lines[i].startswith("- ") or lines[i].startswith("• ")):
+                items.append(lines[i][2:].strip() if lines[i].startswith("- ") else lines[i][1:].strip())
+                i += 1
+            blocks.append({"type": "bullets", "text": "", "items": items, "headers": [], "rows": []})
+            continue
+
+        blocks.append({"type": "paragraph", "text": line, "items": [], "headers": [], "rows": []})
+        i += 1
+    return blocks
+
+
+# -------------------------------------------------------
+# Structured completion
+# -------------------------------------------------------
+
+async def async_structured_completion(client, model, prompt, section_keys, temperature=0.3, max_tokens=None,
+                                      on_delta=None):
+    """
+    Stream a json_schema completion and return {section_key: [block, ...]}.
+    on_delta receives a markdown preview rendered from the partial JSON as it arrives.
+    Only responses that parse are cached, so a truncated answer is not replayed;
+    it is salvaged instead (complete blocks up to the cut-off are kept).
+    """
+    def on_json_delta(text):
+        try:
+            partial = json.loads(close_partial_json(text))
+        except ValueError:
+            return
+        if isinstance(partial, dict):
+            on_delta(sections_to_markdown({key: partial.get(key) or [] for key in section_keys}))
+
+    text = await async_stream_chat_completion(
+        client,
+        model=model,
+        prompt=prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        on_delta=on_json_delta if on_delta else None,
+        response_format=sections_response_format(section_keys),
+        validate=lambda t: is_valid_sections(t, section_keys),
+    )
+    try:
+        return parse_sections(text, section_keys)
+    except ValueError:
+        sections = salvage_sections(text, section_keys)
+        if sections is None:
+            raise
+        print(f"⚠️ Structured output for {list(section_keys)} was incomplete (max_tokens={max_tokens}); "
+              f"kept {sum(len(blocks) for blocks in sections.values())} blocks")
+        return sections
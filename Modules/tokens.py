@@ -0,0 +1,117 @@
+import os
+import json
+from functools import lru_cache
+from dotenv import load_dotenv
+import tiktoken
+
+
+# -------------------------------------------------------
+# Token budgeting (tiktoken) — replaces character slicing of prompt inputs
+# -------------------------------------------------------
+load_dotenv()
+
+# Azure deployment name -> tiktoken encoding. Deployment names are arbitrary,
+# so map them explicitly; override with LLM_DEPLOYMENT_ENCODINGS='{"Codetest": "cl100k_base"}'
+DEPLOYMENT_ENCODINGS = {
+    "gpt-4o": "o200k_base",
+    "Codetest": "o200k_base",
+    "codetest": "o200k_base",
+}
+DEPLOYMENT_ENCODINGS.update(json.loads(os.getenv("LLM_DEPLOYMENT_ENCODINGS", "{}")))
+
+# Context window per deployment (prompt + completion)
+DEPLOYMENT_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "Codetest": 128000,
+    "codetest": 128000,
+}
+DEPLOYMENT_CONTEXT_WINDOWS.update(json.loads(os.getenv("LLM_DEPLOYMENT_CONTEXT_WINDOWS", "{}")))
+
+DEFAULT_ENCODING = os.getenv("LLM_DEFAULT_ENCODING", "o200k_base")
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("LLM_DEFAULT_CONTEXT_WINDOW", "128000"))
+# Per-message overhead of the chat format (role markers etc.)
+CHAT_OVERHEAD_TOKENS = 8
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """Exact tiktoken encoding for a deployment name (or OpenAI model name)."""
+    name = DEPLOYMENT_ENCODINGS.get(model)
+    if name:
+        return tiktoken.get_encoding(name)
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text, model):
+    if not text:
+        return 0
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model):
+    """Cut text to at most max_tokens tokens (on a token boundary)."""
+    if not text or max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def input_budget(model, max_output_tokens, cap=None):
+    """Tokens available for the prompt once the completion is reserved."""
+    window = DEPLOYMENT_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    budget = window - (max_output_tokens or 0) - CHAT_OVERHEAD_TOKENS
+    return min(budget, cap) if cap else budget
+
+
+def allocate_budget(lengths, weights, budget):
+    """
+    Split `budget` tokens across named parts proportionally to `weights`.
+    Parts shorter than their share keep their full length and hand the
+    remainder to the others (water-filling), so no budget is wasted.
+    """
+    allocation = {}
+    remaining = dict(lengths)
+    while remaining:
+        total_weight = sum(weights.get(name, 1.0) for name in remaining)
+        fits = {
+            name: length for name, length in remaining.items()
+            if length <= budget * weights.get(name, 1.0) / total_weight
+        }
+        if not fits:
+            for name in remaining:
+                allocation[name] = int(budget * weights.get(name, 1.0) / total_weight)
+            break
+        for name, length in fits.items():
+            allocation[name] = length
+            budget -= length
+            del remaining[name]
+    return allocation
+
+
+def fit_prompt_parts(build_prompt, parts, model, max_output_tokens, weights=None, cap=None):
+    """
+    Fit variable prompt parts (e.g. reference / RFP text) into the deployment's budget.
+    `build_prompt(**parts)` renders the prompt; its instruction-only size is measured
+    with empty parts, the rest of the budget is allocated with allocate_budget().
+    Returns the fitted parts dict, ready for build_prompt(**fitted).
+    """
+    weights = weights or {}
+    instructions = count_tokens(build_prompt(**{name: "" for name in parts}), model)
+    available = max(0, input_budget(model, max_output_tokens, cap) - instructions)
+    lengths = {name: count_tokens(text, model) for name, text in parts.items()}
+    if sum(lengths.values()) <= available:
+        return dict(parts)
+
+    allocation = allocate_budget(lengths, weights, available)
+    fitted = {name: truncate_to_tokens(text, allocation[name], model) for name, text in parts.items()}
+    print(
+        f"✂️ {model}: fitted prompt inputs to {available} tokens "
+        + ", ".join(f"{name} {lengths[name]}→{allocation[name]}" for name in parts)
+    )
+    return fitted
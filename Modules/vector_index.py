@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import numpy as np
+from langchain_core.documents import Document as LDocument
+from langchain_core.vectorstores import VectorStore
+
+
+# -------------------------------------------------------
+# In-process vector index over a memory-mapped embedding matrix
+#   <name>.<generation>.npy  — one row per passage: normalized float32 / float16
+#                              embeddings, or quantized codes (see below)
+#   <name>.meta.json         — parallel table of ids, texts and metadata, plus
+#                              the generation whose matrix files belong to it
+#   The matrix is opened with mmap_mode="r", so startup does no rebuild and
+#   several Streamlit processes share the same page-cache pages. A query is one
+#   matrix product plus argpartition. Every write saves a new generation of
+#   matrix files and then switches to it by renaming the metadata file over the
+#   old one, so a reader always pairs matrices with their own metadata and picks
+#   up the new version on its next query.
+#
+# Quantized storage (dtype "int8" / "binary")
+#   int8:   round(x / scale) with a per-vector scale (<name>.scales.npy)  — 4x smaller
+#   binary: sign bits packed 8 per byte                                   — 32x smaller
+#   The codes are loaded into memory; full float32 rows stay on disk in
+#   <name>.<generation>.float.npy (memory-mapped). Search is two-stage: the codes rank every
+#   row (int8 dot product / Hamming distance), then only the best
+#   k * rescore_factor rows are re-scored with their float vectors.
+# -------------------------------------------------------
+
+INDEX_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8, "binary": np.uint8}
+QUANTIZED_DTYPES = ("int8", "binary")
+# Shortlist size per result re-scored with float vectors; sign codes are coarser than int8
+DEFAULT_RESCORE_FACTORS = {"int8": 4, "binary": 16}
+
+# Set bits per byte value, for Hamming distance on packed sign codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(vectors):
+    """Per-vector symmetric int8 codes and their scales (x ≈ code * scale)."""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def binarize(vectors):
+    """Sign bits of each vector, packed 8 dimensions per byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def hamming_distances(query_codes, codes):
+    """(queries x rows) Hamming distances between packed sign codes."""
+    return _POPCOUNT[np.bitwise_xor(query_codes[:, None, :], codes[None, :, :])].sum(axis=2)
+
+
+def matches_filter(metadata, filter):
+    """Equality filter on metadata fields ({"namespace": "gts"}), as LangChain stores take it."""
+    return all(metadata.get(key) == value for key, value in (filter or {}).items())
+
+
+def top_k(scores, k):
+    """Indices and scores of the k best columns per row of `scores`, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    if k < scores.shape[1]:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class NumpyVectorStore(VectorStore):
+    """LangChain vector store backed by a memory-mapped .npy matrix and a JSON metadata table."""
+
+    def __init__(self, embedding, index_dir, name="index", dtype="float32", rescore_factor=None):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported index dtype '{dtype}' (expected one of {sorted(INDEX_DTYPES)})")
+        self._embedding = embedding
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor or DEFAULT_RESCORE_FACTORS.get(dtype, 4)
+        self.index_dir = index_dir
+        self.name = name
+        self.meta_path = os.path.join(index_dir, f"{name}.meta.json")
+        os.makedirs(index_dir, exist_ok=True)
+        self._loaded_version = None
+        self._loaded_dtype = dtype
+        self._generation = None
+        self._matrix = None
+        self._scales = None
+        self._float_matrix = None
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._reload_if_changed()
+        if self._ids and self._loaded_dtype != dtype:
+            # Re-encode an index written with another storage dtype
+            print(f"🔁 Converting vector index {name} from {self._loaded_dtype} to {dtype}")
+            self._write(self._ids, self._texts, self._metadatas, self._float_rows())
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    # ---- Storage ----
+    def _version(self):
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _files(self, generation):
+        """Matrix, scales and float file paths of one generation."""
+        prefix = os.path.join(self.index_dir, f"{self.name}.{generation}")
+        return f"{prefix}.npy", f"{prefix}.scales.npy", f"{prefix}.float.npy"
+
+    def _reload_if_changed(self, attempts=3):
+        """Re-map the files when another process (or a write) replaced them."""
+        for attempt in range(attempts):
+            version = self._version()
+            if version == self._loaded_version:
+                return
+            try:
+                self._load(version)
+                return
+            except FileNotFoundError:
+                # A writer switched to a newer generation and pruned this one mid-load
+                if attempt == attempts - 1:
+                    raise
+
+    def _load(self, version):
+        ids, texts, metadatas = [], [], []
+        matrix = scales = float_matrix = generation = None
+        dtype = self._loaded_dtype
+        if version is not None:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            ids, texts, metadatas = meta["ids"], meta["texts"], meta["metadatas"]
+            dtype = meta.get("dtype", "float32")
+            generation = meta["generation"]
+            matrix_path, scales_path, float_path = self._files(generation)
+            if ids:
+                if dtype in QUANTIZED_DTYPES:
+                    # Compact codes stay resident; float rows are only paged in for re-scoring
+                    matrix = np.load(matrix_path)
+                    float_matrix = np.load(float_path, mmap_mode="r")
+                    if dtype == "int8":
+                        scales = np.load(scales_path)
+                else:
+                    matrix = np.load(matrix_path, mmap_mode="r")
+        self._ids, self._texts, self._metadatas = ids, texts, metadatas
+        self._matrix, self._scales, self._float_matrix = matrix, scales, float_matrix
+        self._loaded_dtype, self._generation = dtype, generation
+        self._loaded_version = version
+
+    def _float_rows(self):
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if self._float_matrix is not None:
+            return np.array(self._float_matrix, dtype=np.float32)
+        return np.array(self._matrix, dtype=np.float32)
+
+    def _write(self, ids, texts, metadatas, rows):
+        """
+        Write the rows as a new generation of matrix files, then switch readers to it
+        with a single rename of the metadata file; older generations are removed after.
+        """
+        generation = os.urandom(8).hex()
+        matrix_path, scales_path, float_path = self._files(generation)
+        if self.dtype == "int8":
+            codes, scales = quantize_int8(rows)
+            files = {matrix_path: codes, scales_path: scales, float_path: rows}
+        elif self.dtype == "binary":
+            files = {matrix_path: binarize(rows), float_path: rows}
+        else:
+            files = {matrix_path: rows.astype(INDEX_DTYPES[self.dtype])}
+
+        for path, array in files.items():
+            np.save(path, array)
+        tmp_meta = f"{self.meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(
+                {"dtype": self.dtype, "generation": generation, "ids": ids, "texts": texts, "metadatas": metadatas},
+                f, ensure_ascii=False,
+            )
+        os.replace(tmp_meta, self.meta_path)
+        self._prune(generation)
+        self._loaded_version = None
+        self._reload_if_changed()
+
+    def _prune(self, generation):
+        """Remove the matrix files of every generation but `generation`."""
+        pattern = re.compile(rf"{re.escape(self.name)}\.([0-9a-f]{{16}})\.(?:scales\.|float\.)?npy")
+        for filename in os.listdir(self.index_dir):
+            match = pattern.fullmatch(filename)
+            if not match or match.group(1) == generation:
+                continue
+            try:
+                os.remove(os.path.join(self.index_dir, filename))
+            except OSError:
+                # Already gone, or still mapped on a platform that refuses the delete (next write retries)
+                pass
+
+    # ---- Writes ----
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embed and upsert texts; existing ids are replaced in place."""
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [os.urandom(16).hex() for _ in texts]
+        if not texts:
+            return []
+        self._reload_if_changed()
+        new_rows = normalize(self._embedding.embed_documents(texts))
+
+        all_ids, all_texts, all_metas = list(self._ids), list(self._texts), list(self._metadatas)
+        rows = self._float_rows()
+        rows = rows if len(rows) else np.empty((0, new_rows.shape[1]), dtype=np.float32)
+        position = {vid: i for i, vid in enumerate(all_ids)}
+        appended = []
+        for vid, text, meta, row in zip(ids, texts, metadatas, new_rows):
+            if vid in position:
+                i = position[vid]
+                all_texts[i], all_metas[i] = text, meta
+                rows[i] = row
+            else:
+                position[vid] = len(all_ids)
+                all_ids.append(vid)
+                all_texts.append(text)
+                all_metas.append(meta)
+                appended.append(row)
+        if appended:
+            rows = np.vstack([rows, np.asarray(appended, dtype=np.float32)])
+        self._write(all_ids, all_texts, all_metas, rows)
+        return ids
+
+    def load_vectors(self, ids, texts, metadatas, vectors):
+        """Replace the whole index with precomputed embeddings (no embedding calls)."""
+        self._write(list(ids), list(texts), list(metadatas), normalize(vectors))
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        self._reload_if_changed()
+        drop = set(ids)
+        keep = [i for i, vid in enumerate(self._ids) if vid not in drop]
+        if len(keep) == len(self._ids):
+            return True
+        rows = self._float_rows()[keep] if keep else np.empty((0, self._matrix.shape[1]), dtype=np.float32)
+        self._write(
+            [self._ids[i] for i in keep],
+            [self._texts[i] for i in keep],
+            [self._metadatas[i] for i in keep],
+            rows,
+        )
+        return True
+
+    # ---- Queries ----
+    def _coarse_scores(self, queries):
+        """(queries x rows) first-stage scores; higher is better."""
+        if self._loaded_dtype == "int8":
+            # int8 dot product, then the per-row scale back to cosine
+            return (queries @ self._matrix.T.astype(np.float32)) * self._scales
+        if self._loaded_dtype == "binary":
+            return -hamming_distances(binarize(queries), self._matrix).astype(np.float32)
+        return queries @ self._matrix.T.astype(np.float32, copy=False)
+
+    def search_vectors(self, query_vectors, k=4, filter=None):
+        """
+        Top-k cosine search for a batch of query vectors, optionally restricted to rows matching `filter`.
+        Returns one list of (row index, score) per query, best first.
+        """
+        self._reload_if_changed()
+        if self._matrix is None:
+            return [[] for _ in query_vectors]
+        queries = normalize(np.atleast_2d(query_vectors))
+        scores = self._coarse_scores(queries)
+        if filter:
+            allowed = np.fromiter((matches_filter(m, filter) for m in self._metadatas), dtype=bool, count=len(self._ids))
+            scores[:, ~allowed] = -np.inf
+            k = min(k, int(allowed.sum()))
+        if self._float_matrix is None:
+            indices, values = top_k(scores, k)
+            return [list(zip(row_idx.tolist(), row_scores.tolist())) for row_idx, row_scores in zip(indices, values)]
+
+        # Second stage: exact cosine on the float rows of each query's shortlist
+        shortlist, coarse = top_k(scores, k * self.rescore_factor)
+        results = []
+        for query, candidates, candidate_scores in zip(queries, shortlist, coarse):
+            # Filtered-out rows (-inf) fill the shortlist when few rows match; never re-score them
+            rows = np.sort(candidates[np.isfinite(candidate_scores)])
+            exact = np.asarray(self._float_matrix[rows], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:k]
+            results.append(list(zip(rows[order].tolist(), exact[order].tolist())))
+        return results
+
+    def vectors_by_id(self, ids):
+        """Stored float vectors for passage ids, in order (None when any id is not indexed)."""
+        self._reload_if_changed()
+        position = {vid: i for i, vid in enumerate(self._ids)}
+        if self._matrix is None or any(vid not in position for vid in ids):
+            return None
+        rows = np.array([position[vid] for vid in ids], dtype=np.int64)
+        if self._float_matrix is not None:
+            return np.asarray(self._float_matrix[rows], dtype=np.float32)
+        return np.asarray(self._matrix[rows], dtype=np.float32)
+
+    def _document(self, index):
+        return LDocument(id=self._ids[index], page_content=self._texts[index], metadata=dict(self._metadatas[index]))
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        return [(self._document(i), score) for i, score in self.search_vectors([embedding], k, filter)[0]]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _similarity_search_with_relevance_scores(self, query, k=4, filter=None, **kwargs):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return [(doc, (score + 1) / 2) for doc, score in self.similarity_search_with_score(query, k, filter)]
+
+    def batch_similarity_search(self, queries, k=4, filter=None):
+        """One embedding call and one matrix product for several query strings."""
+        query_vectors = self._embedding.embed_documents(list(queries))
+        return [[self._document(i) for i, _ in hits] for hits in self.search_vectors(query_vectors, k, filter)]
+
+    def __len__(self):
+        self._reload_if_changed()
+        return len(self._ids)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, index_dir=".cache/kb_index", **kwargs):
+        store = cls(embedding, index_dir, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+
+# -------------------------------------------------------
+# Background warm-up
+#   Started once per process from main.py so the first user after a deploy
+#   does not pay for model loading, index opening/sync and the first TLS
+#   handshake to Azure. Each step loads the same process-wide singleton the
+#   request path uses; those getters are lock-guarded, so a request that
+#   arrives mid-warm-up simply waits for the in-flight load instead of
+#   starting a second one. wait_for_warmup() makes that wait explicit.
+# -------------------------------------------------------
+load_dotenv()
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+# Longest a request waits for one unfinished step before doing the work itself
+WARMUP_WAIT_SECONDS = float(os.getenv("WARMUP_WAIT_SECONDS", "600"))
+WARMUP_PROBE_QUERY = "SAP PI/PO to Integration Suite migration"
+
+
+def _warm_azure_client():
+    from Modules.azure_client import get_async_client, run_async
+
+    client = get_async_client()
+    if not os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"):
+        return
+
+    async def ping():
+        # Any response (even 401/404) leaves a pooled keep-alive connection behind
+        try:
+            await client.models.list()
+        except Exception:
+            pass
+
+    run_async(ping())
+
+
+def _warm_embedding_model():
+    from Modules.embeddings import get_embedding_service
+
+    # One inference initialises the runtime's kernels (not cached, unlike a query)
+    get_embedding_service().runtime.encode([WARMUP_PROBE_QUERY])
+
+
+def _warm_knowledge_base():
+    from Modules.knowledge_base import get_knowledge_base
+
+    get_knowledge_base()
+
+
+def _warm_vector_index():
+    from Modules.embeddings import get_embedding_service
+    from Modules.knowledge_base import get_knowledge_base
+    from Modules.retrieval import search_by_vectors
+
+    # Page in the dense index (memory map / HNSW graph) and the BM25 matrix
+    knowledge_base = get_knowledge_base()
+    vectors = get_embedding_service().runtime.encode([WARMUP_PROBE_QUERY])
+    search_by_vectors(knowledge_base.vector_store, vectors.tolist(), 1)
+    if knowledge_base.sparse_index is not None:
+        knowledge_base.sparse_index.search([WARMUP_PROBE_QUERY], 1)
+
+
+def _warm_reranker():
+    from Modules.reranker import get_reranker
+
+    get_reranker()
+
+
+# Run in order on one background thread
+WARMUP_STEPS = {
+    "azure_client": _warm_azure_client,
+    "embedding_model": _warm_embedding_model,
+    "knowledge_base": _warm_knowledge_base,
+    "vector_index": _warm_vector_index,
+    "reranker": _warm_reranker,
+}
+
+_status = {step: {"state": "pending", "seconds": None, "error": None} for step in WARMUP_STEPS}
+_done = {step: threading.Event() for step in WARMUP_STEPS}
+_thread = None
+_lock = threading.Lock()
+
+
+def _run_warmup():
+    start = time.perf_counter()
+    for step, warm in WARMUP_STEPS.items():
+        step_start = time.perf_counter()
+        _status[step]["state"] = "running"
+        try:
+            warm()
+            _status[step]["state"] = "ready"
+        except Exception as e:
+            # The request path retries the same load and surfaces the error there
+            _status[step].update(state="failed", error=str(e))
+            print(f"⚠️ Warm-up step {step} failed: {e}")
+        _status[step]["seconds"] = round(time.perf_counter() - step_start, 2)
+        _done[step].set()
+    print(
+        f"🔥 Warm-up finished in {time.perf_counter() - start:.1f}s: "
+        + ", ".join(f"{step} {s['state']} ({s['seconds']}s)" for step, s in _status.items())
+    )
+
+
+def start_warmup():
+    """Start the warm-up thread (once per process; Streamlit reruns call this again harmlessly)."""
+    global _thread
+    with _lock:
+        if _thread is None and WARMUP_ENABLED:
+            _thread = threading.Thread(target=_run_warmup, name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def wait_for_warmup(*steps, timeout=WARMUP_WAIT_SECONDS):
+    """
+    Block until the given steps (all when none given) have finished warming up.
+    Returns immediately when warm-up was never started or already finished;
+    True when every step is ready.
+    """
+    if _thread is None:
+        return False
+    steps = steps or tuple(WARMUP_STEPS)
+    pending = [step for step in steps if not _done[step].is_set()]
+    if pending:
+        print(f"⏳ Waiting for warm-up: {', '.join(pending)}")
+        for step in pending:
+            _done[step].wait(timeout)
+    return all(_status[step]["state"] == "ready" for step in steps)
+
+
+def warmup_status():
+    """{step: {"state": pending|running|ready|failed, "seconds", "error"}} for readiness reporting."""
+    return {step: dict(status) for step, status in _status.items()}
+
+
+def warmup_ready():
+    return _thread is not None and all(event.is_set() for event in _done.values())
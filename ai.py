@@ -1,5 +1,4 @@
 import streamlit as st
-from openai import AzureOpenAI
 import os, io
 from docx import Document
 from PyPDF2 import PdfReader
@@ -10,6 +9,139 @@ from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL
 import re
+from Modules.azure_client import UiDispatcher, get_async_client, run_async
+from Modules.routing import get_route
+from Modules.sections import generate_sections_async
+from Modules.streaming_ui import make_live_preview, report_section_error, report_timings
+
+# SOW sections in document order; each is generated by its own (parallel) LLM call
+AI_SECTIONS = [
+    {
+        "title": "Introduction",
+        "max_tokens": 900,
+        "instructions": """
+   The Introduction should open the document with a concise, narrative-style overview of the project’s purpose, primary objectives, and key technologies involved.
+   Expand this into 3–4 rich paragraphs that clearly connect the business objectives to Crave InfoTech’s expertise in **SAP AI, Machine Learning, and SAP Business Technology Platform (BTP)**.
+   Describe how Crave leverages its **SAP AI Core and AI Launchpad**, **SAP Build Process Automation (SBPA)**, and **SAP Datasphere** capabilities to deliver actionable intelligence, operational efficiency, and predictive insights.
+   Focus on how Crave InfoTech’s experience in **AI-driven process automation**, **data modeling**, and **intelligent integrations** will enable client to achieve accuracy, scalability, and innovation at enterprise scale.
+   Maintain a formal and consultative tone that positions Crave InfoTech as a trusted partner for intelligent automation and AI adoption within SAP landscapes.
+""",
+    },
+    {
+        "title": "Project Scope",
+        "max_tokens": 1500,
+        "instructions": """
+   2.1. In-Scope Items
+       - Define the AI implementation scope: model development, integration, training data pipelines, monitoring, and governance.
+   2.2. Solution Architecture
+       - Describe proposed SAP AI architecture, including components like AI Core, AI Launchpad, SAP Datasphere, and SBPA integration.
+   2.3. Prerequisites and Key Assumptions
+       - Outline data readiness, model deployment prerequisites, and environment setup on SAP BTP.
+   2.4. Out of Scope
+       - Clearly list excluded modules, non-SAP integrations, or experimental features.
+   2.5. Project Document Deliverables
+       - Enumerate expected deliverables such as Design Document, Training Dataset Summary, Model Deployment Guide, and User Handbook.
+""",
+    },
+    {
+        "title": "Bill of Materials (BOM)",
+        "max_tokens": 700,
+        "instructions": """
+   - Mention major components, licenses, and tools (e.g., SAP AI Core, SAP Datasphere, TensorFlow, Python SDK) in tabular format.
+""",
+    },
+    {
+        "title": "Responsibility Matrix",
+        "max_tokens": 1200,
+        "instructions": """
+   **Part 1 – RACI Table:**
+   Provide a table with the following columns:
+   *Task* | *Crave InfoTech (R/A/C/I)* | *Client (R/A/C/I)*
+
+   **Part 2 – Roles & Responsibilities Table:**
+   Below the RACI, add a second table titled “Roles & Responsibilities” with:
+   *Role* | *Key Responsibilities*
+   (e.g., AI Architect, Data Engineer, Functional Consultant, Project Manager, QA Lead)
+""",
+    },
+    {
+        "title": "Project Delivery Approach",
+        "max_tokens": 2500,
+        "instructions": """
+   - Project Organization Structure
+   - Project Resource Planning
+       Begin with a short paragraph describing how Crave’s Delivery and Project Managers identify and allocate resources for AI lifecycle management—from data engineering and model training to deployment and support.
+       Then generate a detailed table titled **“Exhibit: Project Resource Planning”**, with columns:
+       *Project Phase* | *Functional Consultant* | *Technical Consultant* | *Other Roles (Developer, Tester, PM, Data Scientist, Architect, etc.)*
+       Include realistic project phases:
+       - Project Preparation
+       - Business Blueprint / Detailed Design
+       - Model Development and Training
+       - Validation and Integration Testing
+       - Documentation and User Training
+       - Deployment and Go-Live
+       - Post Go-Live Support
+       Fill each cell with indicative resource involvement.
+
+   - Implementation Methodology
+       Describe Crave’s methodology combining **SAP Activate** and **AI lifecycle best practices** — data preprocessing, model iteration, explainability, and continuous retraining.
+
+   - Communication Plan
+       **Part 1 – Communication Schedule Table:**
+       Columns: *Interaction*, *Frequency*, *Purpose* (daily stand-ups, weekly governance calls, monthly reviews).
+
+       **Part 2 – Issue Management and Escalation Process:**
+       Columns: *Task*, *Timescale*, *Responsibility* (define SLAs and escalation triggers).
+
+       **Part 3 – Issue Classification Table:**
+       Columns: *Severity Level*, *Definition*, *Reporting Process*, *Solution Responsible* (Low, Serious, Critical).
+
+       **Part 4 – Escalation Process Table:**
+       Columns: *Issue Type*, *Escalation Point*, *Escalation Criteria* (e.g., unresolved issues, model performance gaps, or missed delivery timelines).
+       Populate realistic governance levels such as:
+       - Governance Role (Project Core Group)
+       - Project Delivery Manager
+       - Crave Technology Project Manager
+       - Crave Technology Delivery Manager
+""",
+    },
+    {
+        "title": "Timelines",
+        "max_tokens": 1200,
+        "instructions": """
+   The overall delivery duration should be around **3 months (12 weeks)**.
+   Provide 1 concise paragraph describing Crave InfoTech’s milestone-based delivery approach ensuring quality and on-time completion.
+
+   6.1. Delivery Timeliness
+        - Mention total duration (≈12 weeks) and Crave’s structured phase-wise governance.
+
+   6.2. Efforts and Resource Allocation
+        - Include a brief **table** with columns: *Phase*, *Duration (Weeks)*, *Key Activities*, *Indicative Resources*.
+        - Example phases: Kickoff, Design, Development, Testing, Go-Live, Post-Go-Live.
+        - Keep descriptions short (1 line each).
+
+   6.4. Payment Terms
+       Present typical milestones in tabular format (e.g., Kickoff, Design Sign-off, Model Deployment, UAT Completion, Go-Live).
+""",
+    },
+    {
+        "title": "Sign-Off",
+        "max_tokens": 500,
+        "instructions": """
+   Add formal sign-off language ensuring mutual agreement on scope, deliverables, and timelines.
+""",
+    },
+    {
+        "title": "Other Assumptions",
+        "max_tokens": 900,
+        "instructions": """
+   Highlight additional assumptions for clarity.
+   8.1. Dependency – Specify dependencies like client-provided data, test environments, or API access.
+   8.2. Limitations – Mention limitations of model accuracy, third-party data quality, or change control.
+   8.3. General Provisions – Include standard terms, confidentiality, and governance provisions.
+""",
+    },
+]
 
 
 
@@ -158,122 +290,31 @@ def generate_ai_sow(client, model_name):
     # reference_text = re.sub(r"(?i)(^|\n)\s*1\.\s*proposal\s+for\s+.*", "", reference_text)
     # reference_text = re.sub(r"(?i)sap\s+gts\s+processes\s+and\s+enhancements", "", reference_text)
 
-    # --- Build LLM prompt ---
-    prompt = f"""
+    # --- Shared context for every section call ---
+    preamble = f"""
 You are a Senior SAP AI consultant from Crave InfoTech preparing a professional
 RFP Response / Statement of Work for client.
 
-Now, generate a **comprehensive and polished proposal** structured with the following sections:
-
-1. Introduction
-   The Introduction should open the document with a concise, narrative-style overview of the project’s purpose, primary objectives, and key technologies involved.  
-   Expand this into 3–4 rich paragraphs that clearly connect the business objectives to Crave InfoTech’s expertise in **SAP AI, Machine Learning, and SAP Business Technology Platform (BTP)**.  
-   Describe how Crave leverages its **SAP AI Core and AI Launchpad**, **SAP Build Process Automation (SBPA)**, and **SAP Datasphere** capabilities to deliver actionable intelligence, operational efficiency, and predictive insights.  
-   Focus on how Crave InfoTech’s experience in **AI-driven process automation**, **data modeling**, and **intelligent integrations** will enable client to achieve accuracy, scalability, and innovation at enterprise scale.  
-   Maintain a formal and consultative tone that positions Crave InfoTech as a trusted partner for intelligent automation and AI adoption within SAP landscapes.
-
-2. Project Scope
-   2.1. In-Scope Items  
-       - Define the AI implementation scope: model development, integration, training data pipelines, monitoring, and governance.  
-   2.2. Solution Architecture  
-       - Describe proposed SAP AI architecture, including components like AI Core, AI Launchpad, SAP Datasphere, and SBPA integration.  
-   2.3. Prerequisites and Key Assumptions  
-       - Outline data readiness, model deployment prerequisites, and environment setup on SAP BTP.  
-   2.4. Out of Scope  
-       - Clearly list excluded modules, non-SAP integrations, or experimental features.  
-   2.5. Project Document Deliverables  
-       - Enumerate expected deliverables such as Design Document, Training Dataset Summary, Model Deployment Guide, and User Handbook.
-
-3. Bill of Materials (BOM)  
-   - Mention major components, licenses, and tools (e.g., SAP AI Core, SAP Datasphere, TensorFlow, Python SDK) in tabular format.
-
-4. Responsibility Matrix  
-   **Part 1 – RACI Table:**  
-   Provide a table with the following columns:  
-   *Task* | *Crave InfoTech (R/A/C/I)* | *Client (R/A/C/I)*  
-
-   **Part 2 – Roles & Responsibilities Table:**  
-   Below the RACI, add a second table titled “Roles & Responsibilities” with:  
-   *Role* | *Key Responsibilities*  
-   (e.g., AI Architect, Data Engineer, Functional Consultant, Project Manager, QA Lead)
-
-5. Project Delivery Approach  
-   - Project Organization Structure  
-   - Project Resource Planning  
-       Begin with a short paragraph describing how Crave’s Delivery and Project Managers identify and allocate resources for AI lifecycle management—from data engineering and model training to deployment and support.  
-       Then generate a detailed table titled **“Exhibit: Project Resource Planning”**, with columns:  
-       *Project Phase* | *Functional Consultant* | *Technical Consultant* | *Other Roles (Developer, Tester, PM, Data Scientist, Architect, etc.)*  
-       Include realistic project phases:  
-       - Project Preparation  
-       - Business Blueprint / Detailed Design  
-       - Model Development and Training  
-       - Validation and Integration Testing  
-       - Documentation and User Training  
-       - Deployment and Go-Live  
-       - Post Go-Live Support  
-       Fill each cell with indicative resource involvement.  
-
-   - Implementation Methodology  
-       Describe Crave’s methodology combining **SAP Activate** and **AI lifecycle best practices** — data preprocessing, model iteration, explainability, and continuous retraining.  
-
-   - Communication Plan  
-       **Part 1 – Communication Schedule Table:**  
-       Columns: *Interaction*, *Frequency*, *Purpose* (daily stand-ups, weekly governance calls, monthly reviews).  
-
-       **Part 2 – Issue Management and Escalation Process:**  
-       Columns: *Task*, *Timescale*, *Responsibility* (define SLAs and escalation triggers).  
-
-       **Part 3 – Issue Classification Table:**  
-       Columns: *Severity Level*, *Definition*, *Reporting Process*, *Solution Responsible* (Low, Serious, Critical).  
-
-       **Part 4 – Escalation Process Table:**  
-       Columns: *Issue Type*, *Escalation Point*, *Escalation Criteria* (e.g., unresolved issues, model performance gaps, or missed delivery timelines).  
-       Populate realistic governance levels such as:  
-       - Governance Role (Project Core Group)  
-       - Project Delivery Manager  
-       - Crave Technology Project Manager  
-       - Crave Technology Delivery Manager  
-
-6. Timelines  
-   The overall delivery duration should be around **3 months (12 weeks)**.  
-   Provide 1 concise paragraph describing Crave InfoTech’s milestone-based delivery approach ensuring quality and on-time completion.
-
-   6.1. Delivery Timeliness  
-        - Mention total duration (≈12 weeks) and Crave’s structured phase-wise governance.
-
-   6.2. Efforts and Resource Allocation  
-        - Include a brief **table** with columns: *Phase*, *Duration (Weeks)*, *Key Activities*, *Indicative Resources*.  
-        - Example phases: Kickoff, Design, Development, Testing, Go-Live, Post-Go-Live.  
-        - Keep descriptions short (1 line each).
- 
-   6.4. Payment Terms  
-       Present typical milestones in tabular format (e.g., Kickoff, Design Sign-off, Model Deployment, UAT Completion, Go-Live).
-
-7. Sign-Off  
-   Add formal sign-off language ensuring mutual agreement on scope, deliverables, and timelines.
-
-8. Other Assumptions  
-   Highlight additional assumptions for clarity.  
-   8.1. Dependency – Specify dependencies like client-provided data, test environments, or API access.  
-   8.2. Limitations – Mention limitations of model accuracy, third-party data quality, or change control.  
-   8.3. General Provisions – Include standard terms, confidentiality, and governance provisions.  
+The proposal has the following sections, each written separately:
+{", ".join(f"{i}. {s['title']}" for i, s in enumerate(AI_SECTIONS, start=1))}
 
 Ensure:
 - Content flows logically and professionally.
 - Use **SAP AI**, **SAP BTP**, and **SBPA** terminology appropriately.
 - Tone: confident, formal, and consultative.
 - Avoid bullet overload; prefer paragraph narrative where possible.
-- The document **must begin directly with the section heading “1. Introduction”**, without any preamble or title like “Proposal for …”.
-
 """
-    # --- Call Azure LLM ---
+    # --- Call Azure LLM: one call per section, all in parallel ---
     try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4
+        ui = UiDispatcher()
+        on_delta, timings = make_live_preview(ui, "📝 Live preview of generated SOW")
+        sow_text = run_async(
+            generate_sections_async(
+                client, "ai", preamble, AI_SECTIONS, on_delta=on_delta, on_error=ui.wrap(report_section_error),
+            ),
+            ui=ui,
         )
-        sow_text = response.choices[0].message.content.strip()
+        report_timings(timings, f"SOW generation ({len(AI_SECTIONS)} sections in parallel)")
         # --- 🧹 Clean unwanted headers ---
         cleanup_patterns = [
             r"(?i)^crave\s+infotech\s+proposal.*\n?",
@@ -327,12 +368,8 @@ def main():
     # )
 
     # Azure setup
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
-    model_name = "codetest"
+    client = get_async_client()
+    model_name = get_route("ai_section")["deployment"]
 
     if st.button("⚡ Generate Full SOW Document"):
 
@@ -1,19 +1,24 @@
 import streamlit as st
 import pandas as pd
 import re
-import glob
 import io
 import os
 from pptx import Presentation
 from docx import Document
-from openai import AzureOpenAI
 from dotenv import load_dotenv
+from Modules.azure_client import UiDispatcher, get_async_client, run_async
+from Modules.routing import get_route
+from Modules.sections import generate_sections_async
+from Modules.streaming_ui import make_live_preview, report_section_error, report_timings
+from Modules.knowledge_base import get_knowledge_base
+from Modules.retrieval import retrieve_module_reference
 import re
 
 
 
 # --- Load your .env file safely ---
 load_dotenv()
+COREASSESS_REFERENCE_TOKENS = int(os.getenv("COREASSESS_REFERENCE_TOKENS", "8000"))
 
 # # --- Normalize environment variables for Azure SDK ---
 # # These three lines make sure AzureOpenAI gets what it expects
@@ -37,15 +42,16 @@ load_dotenv()
 # Helper Functions
 # ============================================================
 
-def call_llm(prompt, client, model_name):
-    """Call Azure OpenAI model."""
+def call_llm(preamble, sections, client, model_name, on_delta=None, ui=None):
+    """Generate the SOW sections in parallel on the shared async client, streaming the stitched text to on_delta."""
     try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4
+        return run_async(
+            generate_sections_async(
+                client, "coreassess", preamble, sections, on_delta=on_delta,
+                on_error=ui.wrap(report_section_error) if ui else None,
+            ),
+            ui=ui,
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
         return f"Error: {e}"
 
@@ -515,20 +521,129 @@ def insert_formatted_text(doc, placeholder, raw_text):
 # Core Function
 # ============================================================
 
-def generate_sow(df, client, model_name, client_name=None, repo_dir="Knowledge_Repo/Coreassess_KR"):
-    """Generate full SOW docx directly."""
-    client_ref = client_name if client_name else "the Client"
+def build_coreassess_sections(client_ref, total, sample_issues):
+    """SOW sections in document order; each is generated by its own (parallel) LLM call."""
+    return [
+        {
+            "title": "Introduction",
+            "max_tokens": 900,
+            "instructions": f"""
+   - Provide a high-level narrative overview of the Clean Core Assessment initiative, its purpose, and value to {client_ref}.
+   - Explain how Crave Infotech’s CoreAssess.AI helps organizations modernize ABAP custom objects, identify technical debt, and align with SAP’s Clean Core strategy.
+   - Mention Crave’s SAP Build Process Automation (SBPA), AI-driven analysis, and clean-core accelerators that enhance assessment accuracy, performance, and compliance.
+   - Use a formal, consultative tone that emphasizes Crave Infotech’s delivery capability and alignment with SAP’s modernization roadmap.
+""",
+        },
+        {
+            "title": "Project Scope",
+            "max_tokens": 1500,
+            "instructions": """
+   2.1 In-Scope Items
+   - Clearly outline activities under the Clean Core Assessment scope — e.g., object evaluation, extensibility classification (On-Stack, Side-by-Side, Retire), and modernization recommendations.
+   2.2 Solution Architecture
+   - Describe the technical architecture and toolset used — including CoreAssess.AI platform, ABAP parser, and integration with BTP or Solution Manager.
+   2.3 Prerequisites and Key Assumptions
+   - List all assumptions (e.g., system access, readiness of transport data, and availability of ABAP repository).
+   2.4 Out of Scope
+   - Clearly state excluded items (e.g., remediation implementation, non-ABAP system assessments).
+   2.5 Deliverables
+   - Summarize deliverables such as Assessment Report, Insights Summary, Recommendation Deck, and Modernization Plan.
+""",
+        },
+        {
+            "title": "Key Insights and Recommendations",
+            "route": "coreassess_classification",
+            "max_tokens": 1500,
+            "instructions": f"""
+   - Using the provided data summary below, identify key patterns in ABAP object issues and modernization approaches.
+   - Provide categorized recommendations:
+       3.1. On-Stack Extensibility
+       3.2. Side-by-Side Extensibility
+       3.3. Retire Candidates
+   - Reference technical metrics and business rationale, focusing on cost optimization and compliance benefits.
+   - End this section with a summary paragraph linking findings to SAP’s Clean Core strategy.
+
+   Total Objects: {total}
+   Example Issues: {sample_issues}
+""",
+        },
+        {
+            "title": "Benefits of CoreAssess.AI",
+            "max_tokens": 900,
+            "instructions": f"""
+   - Compare Crave’s AI-driven assessment with traditional manual clean-core evaluations.
+   - Highlight benefits like automated code scanning, structured modernization mapping, ROI analysis, and faster turnaround time.
+   - Emphasize measurable business outcomes for {client_ref} — improved performance, reduced technical debt, and audit-ready modernization planning.
+""",
+        },
+        {
+            "title": "Project Delivery Approach",
+            "max_tokens": 2500,
+            "instructions": f"""
+   5.1 Project Organization Structure
+   - Describe Crave’s typical project governance and communication model for a Clean Core Assessment engagement.
+   5.2 Project Resource Planning
+   - Add a short description of resource allocation and Crave’s hybrid delivery model (onsite–offshore mix).
+   - Then include a **Project Resource Planning Table** with columns:
+        *Project Phase*, *Functional Consultant*, *Technical Consultant*, *Other Roles (Developer, Tester, PM, Architect, etc.)*
+     and rows such as:
+        - Project Preparation
+        - Discovery & Object Extraction
+        - Assessment & Categorization
+        - Insights & Recommendation
+        - Report Preparation & Review
+        - Presentation & Sign-off
+   5.3 Implementation Methodology
+   - Outline the phased approach Crave follows, from assessment kickoff to presentation and handover.
+   5.4 Communication Plan
+   - Describe how Crave and {client_ref} will communicate and manage progress throughout the project.
+   - Include these tables:
+       **Communication Schedule** (Interaction | Frequency | Purpose)
+       **Issue Management and Escalation** (Task | Timescale | Responsibility)
+       **Issue Classification** (Severity | Definition | Reporting | Resolution Owner)
+       **Escalation Process** (Issue Type | Escalation Point | Criteria | Governance Role)
+""",
+        },
+        {
+            "title": "Timelines",
+            "max_tokens": 1200,
+            "instructions": """
+   6.1 Delivery Timeliness
+   - Provide an indicative duration for each phase (typically 3–6 weeks total).
+   6.2 Efforts and Resource Allocation
+   - Present a short summary of resource utilization (Consultants, PM, ABAP Specialist, QA).
+   6.3 Commercials
+   - Describe how Crave offers flexible engagement options (e.g., per-object, per-phase, or fixed-scope pricing).
+   6.4 Payment Terms
+   - List typical payment milestones (e.g., Kickoff – 20%, Report Delivery – 50%, Final Presentation – 30%) in tabular format.
+""",
+        },
+        {
+            "title": "Sign-Off",
+            "max_tokens": 500,
+            "instructions": f"""
+   - Add formal sign-off and acceptance text for both Crave Infotech and {client_ref}.
+   - *Party*, *Designation*, *Signature*, *Date*.
+""",
+        },
+        {
+            "title": "Other Assumptions",
+            "max_tokens": 900,
+            "instructions": """
+   8.1 Dependencies
+   - List client-side dependencies (e.g., system access, object data extraction support).
+   8.2 Limitations
+   - Mention constraints (e.g., tool version, scope limits, data quality).
+   8.3 General Provisions
+   - Add closing statements about intellectual property, confidentiality, and engagement validity.
+""",
+        },
+    ]
 
-    # Find available PPT references
-    ppt_files = glob.glob(os.path.join(repo_dir, "*.pptx"))
-    if not ppt_files:
-        ppt_text = "No PPTs found."
-        chosen_ppt = "None"
-    else:
-        # ppt_text, working_together_objects, working_together_abap = extract_ppt_text(ppt_files[0])
-        ppt_text = extract_ppt_text(ppt_files[0])
-        chosen_ppt = ppt_files[0]
 
+def generate_sow(df, client, model_name, client_name=None):
+    """Generate full SOW docx directly."""
+    client_ref = client_name if client_name else "the Client"
 
     # Build prompt
     total = len(df)
@@ -541,116 +656,50 @@ def generate_sow(df, client, model_name, client_name=None, repo_dir="Knowledge_R
 
     sample_issues = "; ".join(sample_col.astype(str).tolist()[:5])
 
+    # Relevant slides from the CoreAssess corpus (Knowledge_Repo/Coreassess_KR, indexed once)
+    # instead of pasting the first PPT in full
+    query = f"Clean Core Assessment CoreAssess.AI SOW for {client_ref}: {total} findings such as {sample_issues}"
+    try:
+        ppt_text, ppt_sources = retrieve_module_reference(
+            get_knowledge_base(), query, "coreassess", COREASSESS_REFERENCE_TOKENS, model_name,
+        )
+    except Exception as e:
+        print(f"⚠️ CoreAssess knowledge retrieval failed: {e}")
+        ppt_text, ppt_sources = "", []
+    if not ppt_text:
+        ppt_text = "No PPTs found."
+    chosen_ppt = ", ".join(os.path.basename(p) for p in ppt_sources) or "None"
 
-    prompt = f"""
+
+    sections = build_coreassess_sections(client_ref, total, sample_issues)
+    preamble = f"""
 You are a Senior SAP consultant from Crave InfoTech preparing a professional
 Statement of Work (SOW) for a Clean Core Assessment (CoreAssess.AI) engagement with {client_ref}.
 
-Below is Crave Infotech’s internal knowledge reference extracted from our Clean Core Assessment repository (PPT/Knowledge Base). 
+Below is Crave Infotech’s internal knowledge reference extracted from our Clean Core Assessment repository (PPT/Knowledge Base).
 Use it to infer tone, structure, and technical depth:
 
 REFERENCE MATERIAL:
 {ppt_text}
 
-Using this reference as context, generate a **comprehensive, client-ready Statement of Work** structured as follows:
-
-1. Introduction  
-   - Provide a high-level narrative overview of the Clean Core Assessment initiative, its purpose, and value to {client_ref}.  
-   - Explain how Crave Infotech’s CoreAssess.AI helps organizations modernize ABAP custom objects, identify technical debt, and align with SAP’s Clean Core strategy.  
-   - Mention Crave’s SAP Build Process Automation (SBPA), AI-driven analysis, and clean-core accelerators that enhance assessment accuracy, performance, and compliance.  
-   - Use a formal, consultative tone that emphasizes Crave Infotech’s delivery capability and alignment with SAP’s modernization roadmap.  
-
-2. Project Scope  
-   2.1 In-Scope Items  
-   - Clearly outline activities under the Clean Core Assessment scope — e.g., object evaluation, extensibility classification (On-Stack, Side-by-Side, Retire), and modernization recommendations.  
-   2.2 Solution Architecture  
-   - Describe the technical architecture and toolset used — including CoreAssess.AI platform, ABAP parser, and integration with BTP or Solution Manager.  
-   2.3 Prerequisites and Key Assumptions  
-   - List all assumptions (e.g., system access, readiness of transport data, and availability of ABAP repository).  
-   2.4 Out of Scope  
-   - Clearly state excluded items (e.g., remediation implementation, non-ABAP system assessments).  
-   2.5 Deliverables  
-   - Summarize deliverables such as Assessment Report, Insights Summary, Recommendation Deck, and Modernization Plan.  
-
-3. Key Insights and Recommendations  
-   - Using the provided data summary below, identify key patterns in ABAP object issues and modernization approaches.  
-   - Provide categorized recommendations:  
-       3.1. On-Stack Extensibility  
-       3.2. Side-by-Side Extensibility  
-       3.3. Retire Candidates  
-   - Reference technical metrics and business rationale, focusing on cost optimization and compliance benefits.  
-   - End this section with a summary paragraph linking findings to SAP’s Clean Core strategy.  
-
-   Total Objects: {total}  
-   Example Issues: {sample_issues}  
-
-4. Benefits of CoreAssess.AI  
-   - Compare Crave’s AI-driven assessment with traditional manual clean-core evaluations.  
-   - Highlight benefits like automated code scanning, structured modernization mapping, ROI analysis, and faster turnaround time.  
-   - Emphasize measurable business outcomes for {client_ref} — improved performance, reduced technical debt, and audit-ready modernization planning.  
-
-5. Project Delivery Approach  
-   5.1 Project Organization Structure  
-   - Describe Crave’s typical project governance and communication model for a Clean Core Assessment engagement.  
-   5.2 Project Resource Planning  
-   - Add a short description of resource allocation and Crave’s hybrid delivery model (onsite–offshore mix).  
-   - Then include a **Project Resource Planning Table** with columns:  
-        *Project Phase*, *Functional Consultant*, *Technical Consultant*, *Other Roles (Developer, Tester, PM, Architect, etc.)*  
-     and rows such as:  
-        - Project Preparation  
-        - Discovery & Object Extraction  
-        - Assessment & Categorization  
-        - Insights & Recommendation  
-        - Report Preparation & Review  
-        - Presentation & Sign-off  
-   5.3 Implementation Methodology  
-   - Outline the phased approach Crave follows, from assessment kickoff to presentation and handover.  
-   5.4 Communication Plan  
-   - Describe how Crave and {client_ref} will communicate and manage progress throughout the project.  
-   - Include these tables:  
-       **Communication Schedule** (Interaction | Frequency | Purpose)  
-       **Issue Management and Escalation** (Task | Timescale | Responsibility)  
-       **Issue Classification** (Severity | Definition | Reporting | Resolution Owner)  
-       **Escalation Process** (Issue Type | Escalation Point | Criteria | Governance Role)  
-
-6. Timelines  
-   6.1 Delivery Timeliness  
-   - Provide an indicative duration for each phase (typically 3–6 weeks total).  
-   6.2 Efforts and Resource Allocation  
-   - Present a short summary of resource utilization (Consultants, PM, ABAP Specialist, QA).  
-   6.3 Commercials  
-   - Describe how Crave offers flexible engagement options (e.g., per-object, per-phase, or fixed-scope pricing).  
-   6.4 Payment Terms  
-   - List typical payment milestones (e.g., Kickoff – 20%, Report Delivery – 50%, Final Presentation – 30%) in tabular format.  
-
-7. Sign-Off  
-   - Add formal sign-off and acceptance text for both Crave Infotech and {client_ref}.  
-   - *Party*, *Designation*, *Signature*, *Date*.  
-
-8. Other Assumptions  
-   8.1 Dependencies  
-   - List client-side dependencies (e.g., system access, object data extraction support).  
-   8.2 Limitations  
-   - Mention constraints (e.g., tool version, scope limits, data quality).  
-   8.3 General Provisions  
-   - Add closing statements about intellectual property, confidentiality, and engagement validity.
-
----
+The Statement of Work has the following sections, each written separately:
+{", ".join(f"{i}. {s['title']}" for i, s in enumerate(sections, start=1))}
 
 Formatting Instructions:
-- Use numbered section headings exactly as shown above.  
-- Each section must contain well-written paragraphs — avoid short bullets except inside structured tables.  
-- Maintain Crave Infotech’s corporate tone: **formal, confident, and consultative**.  
-- Avoid generic wording or references to other organizations (e.g., “Oatey Co.”).  
-- Begin the document directly with the section heading **“1. Introduction”** — do not include titles like “Statement of Work” or “Proposal for …”.  
-- Total length: around **5–6 Word pages**.
+- Each section must contain well-written paragraphs — avoid short bullets except inside structured tables.
+- Maintain Crave Infotech’s corporate tone: **formal, confident, and consultative**.
+- Avoid generic wording or references to other organizations (e.g., “Oatey Co.”).
+- Do not include titles like “Statement of Work” or “Proposal for …”.
+- Total length of the whole document: around **5–6 Word pages**, so keep this section proportionate.
 """
 
 
-    # Get LLM result
-    # --- Split SOW by numbered headings like "1. Executive Summary" ---
+    # Get LLM result: all sections generated in parallel, stitched in order
 
-    full_sow = call_llm(prompt, client, model_name)
+    ui = UiDispatcher()
+    on_delta, timings = make_live_preview(ui, "📝 Live preview of generated SOW")
+    full_sow = call_llm(preamble, sections, client, model_name, on_delta=on_delta, ui=ui)
+    report_timings(timings, f"SOW generation ({len(sections)} sections in parallel)")
 
 
     # --- Use Template ---
@@ -774,7 +823,7 @@ Formatting Instructions:
     # preview_text = "\n".join(full_sow.split("\n")[:50])
     # st.text(preview_text.strip())
 
-    st.success(f"✅ SOW generated using `{os.path.basename(chosen_ppt)}` and inserted into template.")
+    st.success(f"✅ SOW generated using `{chosen_ppt}` and inserted into template.")
     st.download_button(
         label="📥 Download SOW Document (.docx)",
         data=buffer,
@@ -798,12 +847,8 @@ def main():
         st.dataframe(df.head(5))
 
         # Azure OpenAI setup
-        client = AzureOpenAI(
-            azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-            api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-        )
-        model_name = "codetest"
+        client = get_async_client()
+        model_name = get_route("coreassess_section")["deployment"]
 
         if st.button("⚡ Generate SOW Document"):
             generate_sow(df, client, model_name, client_name)
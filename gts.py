@@ -1,5 +1,4 @@
 import streamlit as st
-from openai import AzureOpenAI
 import os, io
 from docx import Document
 from PyPDF2 import PdfReader
@@ -10,6 +9,146 @@ from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL
 import re
+from Modules.azure_client import UiDispatcher, get_async_client, run_async
+from Modules.condense import condense_rfp
+from Modules.routing import get_route
+from Modules.sections import generate_sections_async
+from Modules.streaming_ui import make_live_preview, report_section_error, report_timings
+from Modules.tokens import truncate_to_tokens
+from Modules.knowledge_base import get_knowledge_base
+from Modules.retrieval import retrieve_module_reference
+
+# Uploaded RFP text condensed (once per document) into the brief every section prompt shares
+GTS_REFERENCE_TOKENS = int(os.getenv("GTS_REFERENCE_TOKENS", "12000"))
+# Past GTS proposal passages (Knowledge_Repo/GTS) added to every section prompt; kept small
+# because all sections are sent at once and share the deployment's TPM budget
+GTS_KNOWLEDGE_TOKENS = int(os.getenv("GTS_KNOWLEDGE_TOKENS", "1500"))
+
+# SOW sections in document order; each is generated by its own (parallel) LLM call
+GTS_SECTIONS = [
+    {
+        "title": "Introduction",
+        "max_tokens": 900,
+        "instructions": """
+   The Introduction should open the document with a concise, narrative-style overview of the project’s purpose, primary objectives, and key technologies involved.
+   Expand this into 3–4 rich paragraphs that clearly connect the business objectives to Crave InfoTech’s capabilities. Describe how Crave leverages its SAP Build Process Automation (SBPA) expertise, domain understanding, and delivery accelerators to help the client achieve measurable efficiency, compliance, and scalability improvements.
+   Focus on how Crave InfoTech’s expertise in SAP Build Process Automation (SBPA), domain knowledge, and implementation experience will enable the client to achieve accuracy, compliance, and operational efficiency.
+   Maintain a formal and consultative tone that naturally positions Crave InfoTech as the trusted delivery partner for the initiative.
+""",
+    },
+    {
+        "title": "Project Scope",
+        "max_tokens": 1500,
+        "instructions": """
+    2.1 in-scope items with clarity and structure
+    2.2. Solution Architecture
+    - Describe proposed SAP GTS architecture, integration, and key components
+    2.3.Prerequisites and Key Assumptions
+   - Outline key preconditions and technical assumptions
+    2.4.Out of Scope
+   - Clearly list all out-of-scope functionalities
+    2.5.Project Documents Deliverables
+   - Enumerate Documents deliverables
+""",
+    },
+    {
+        "title": "Bill of Materials (BOM)",
+        "max_tokens": 700,
+        "instructions": """
+   - Mention major components, licenses, and tools (if applicable) in tabular format
+""",
+    },
+    {
+        "title": "Responsibility Matrix",
+        "max_tokens": 1200,
+        "instructions": """
+   This section should have 2 parts
+   - Define RACI (Crave / Client) responsibilities in tabular format - The table must include the following columns:
+   *Task* | *Crave InfoTech (R/A/C/I)* | *client (R/A/C/I)*
+
+   - **Part 2 – Roles & Responsibilities Table:**
+        Below the RACI table, provide a second table titled “Roles & Responsibilities” with two columns:
+        1. *Role*
+        2. *Key Responsibilities*
+""",
+    },
+    {
+        "title": "Project Delivery Approach",
+        "max_tokens": 2500,
+        "instructions": """
+   - Project Organization Structure
+   - Project Resource Planning
+        - Begin with a short paragraph describing how Crave’s Delivery and Project Managers identify and allocate resources during project initiation.
+        - Then generate a detailed **Project Resource Planning Table** that lists project phases vs. indicative roles and resource involvement.
+        - Title the table as **“Exhibit: Project Resource Planning”**, and include the following columns:
+            - *Project Phase*
+            - *Functional Consultant*
+            - *Technical Consultant*
+            - *Other Roles (Developer, Tester, PM, ABAP, Architect, etc.)*
+   - The rows should include realistic phases such as:
+       - Project Preparation
+       - Business Blueprint / Detailed Design
+       - Realization – Development
+       - Unit and Integration Testing
+       - Documentation and User Training
+       - Cutover and Go-Live
+       - Post Go-Live Support
+   - Fill each cell with “Yes” or short role mentions (e.g., “PM, Functional Consultant, and Developer”) as per typical Crave-style staffing exhibits.
+   - Implementation Methodology
+   - Communication Plan
+       This section should describe how Crave InfoTech and the Client will communicate and manage issues throughout the project lifecycle.
+
+        **Part 1 – Interaction Table:**
+        Create a table titled “Communication Schedule” with columns such as *Interaction*, *Frequency*, and *Purpose* to outline daily, weekly, and monthly touchpoints.
+
+        **Part 2 – Issue Management and Escalation Process:**
+        Add a second table titled “Issue Management and Escalation Process” that includes columns like *Task*, *Timescale*, *Resposibility*.
+
+        **Part 3 – Issue Classification Table:**
+        Include a third table titled “Issue Classification” to categorize issues by severity (e.g., Low, Serious, Critical) with Definition, Reporting Process and Solution Responsible.
+
+        Part 4 - Escalation Process
+        Include fourth table titles as "Escalation Process"  to categorize escalation handling across roles and governance levels.
+        - The table should have the following columns: *Issue Type*, *Escalation Point*, *Escalation Criteria*.
+        - Populate the table with realistic entries such as:
+            - Governance Role (Project Core Group)
+            - Project Delivery Manager
+            - Crave Technology Project Manager
+            - Crave Technology Delivery Manager
+        - Each row should include escalation criteria (e.g., “If plan to resolve the issue is not outlined within 48 hrs”, “Weekly checkpoints”, “Quality issues”, “Unresolved delivery issue”, etc.).
+""",
+    },
+    {
+        "title": "Timelines",
+        "max_tokens": 1200,
+        "instructions": """
+   6.1 Delivery Timeliness
+   6.2 Efforts and Resource Allocation
+   6.3 Commercials
+   6.4 Payment Terms - - List typical payment milestones in tabular format
+""",
+    },
+    {
+        "title": "Sign-Off",
+        "max_tokens": 500,
+        "instructions": """
+   - Add formal sign-off language
+""",
+    },
+    {
+        "title": "Other Assumptions",
+        "max_tokens": 900,
+        "instructions": """
+   - Highlight additional assumptions for clarity
+    8.1. Dependency
+    8.2. Limitations
+   - Mention project or technical limitations
+    8.3. General Provisions
+   - Include standard terms and closing remarks
+""",
+    },
+]
+
 
 def detect_client_name_from_text(text: str) -> str:
     """
@@ -244,6 +383,48 @@ This recognition underscores our focus on ethical business practices, sustainabl
 # Helper: Generate GTS RFP/SOW Response
 # ============================================================
 
+def build_gts_preamble(rfp_brief, knowledge_text, client_name):
+    """Shared context for every GTS section call."""
+    return f"""
+You are a Senior SAP GTS consultant from Crave InfoTech preparing a professional
+RFP Response / Statement of Work for client.
+
+Below is a brief of the input RFP or reference document provided by the client or user.
+Use it to infer project context, objectives, requirements, and tone.
+
+RFP BRIEF:
+{rfp_brief}
+
+CRAVE INFOTECH PAST GTS PROPOSAL EXCERPTS (for structure, depth and tone only — not client facts):
+{knowledge_text or "None available."}
+
+The proposal has the following sections, each written separately:
+{", ".join(f"{i}. {s['title']}" for i, s in enumerate(GTS_SECTIONS, start=1))}
+
+Use only the detected client name `{client_name}` where relevant, and avoid referring to unrelated
+organizations or prior examples (e.g., Eli Lilly, GTS Enhancements).
+The section must be clearly titled (Heading 1) and written in Crave Infotech's professional proposal tone.
+
+Ensure:
+- Content flows logically and professionally.
+- No bullet formatting unless it improves clarity.
+- Tone: confident, formal, consultative.
+- Personalize context for client.
+"""
+
+
+async def generate_gts_sections(client, reference_text, knowledge_text, client_name, on_delta=None, on_error=None):
+    """
+    Condense the RFP once, then write every section from that brief in parallel
+    (the full RFP in each of the section prompts would exhaust the TPM budget).
+    """
+    rfp_brief = await condense_rfp(client, "", reference_text)
+    preamble = build_gts_preamble(rfp_brief, knowledge_text, client_name)
+    return await generate_sections_async(
+        client, "gts", preamble, GTS_SECTIONS, on_delta=on_delta, on_error=on_error,
+    )
+
+
 def generate_gts_sow(client, model_name,  reference_text,client_name):
     """Generate a detailed SOW response document using Azure OpenAI."""
     today = datetime.now().strftime("%d %B %Y")
@@ -264,123 +445,32 @@ def generate_gts_sow(client, model_name,  reference_text,client_name):
     reference_text = re.sub(r"(?i)(^|\n)\s*1\.\s*proposal\s+for\s+.*", "", reference_text)
     reference_text = re.sub(r"(?i)sap\s+gts\s+processes\s+and\s+enhancements", "", reference_text)
 
-    # --- Build LLM prompt ---
-    prompt = f"""
-You are a Senior SAP GTS consultant from Crave InfoTech preparing a professional
-RFP Response / Statement of Work for client.
-
-Below is the input RFP or reference document provided by the client or user.
-Use it to infer project context, objectives, requirements, and tone.
-
-REFERENCE DOCUMENT:
-{reference_text}
-
-Now, generate a **comprehensive and polished proposal** structured with the following sections:
-
-Introduction - 
-   The Introduction should open the document with a concise, narrative-style overview of the project’s purpose, primary objectives, and key technologies involved.  
-    Expand this into 3–4 rich paragraphs that clearly connect the business objectives to Crave InfoTech’s capabilities. Describe how Crave leverages its SAP Build Process Automation (SBPA) expertise, domain understanding, and delivery accelerators to help the client achieve measurable efficiency, compliance, and scalability improvements.  
- 
-   Focus on how Crave InfoTech’s expertise in SAP Build Process Automation (SBPA), domain knowledge, and implementation experience will enable the client to achieve accuracy, compliance, and operational efficiency.  
-   Use only the detected client name `{client_name}` where relevant, and avoid referring to unrelated organizations or prior examples (e.g., Eli Lilly, GTS Enhancements).  
-   Maintain a formal and consultative tone that naturally positions Crave InfoTech as the trusted delivery partner for the initiative.  
-Project Scope
-    2.1 in-scope items with clarity and structure
-    2.2. Solution Architecture  
-    - Describe proposed SAP GTS architecture, integration, and key components
-    2.3.Prerequisites and Key Assumptions  
-   - Outline key preconditions and technical assumptions
-    2.4.Out of Scope  
-   - Clearly list all out-of-scope functionalities
-    2.5.Project Documents Deliverables  
-   - Enumerate Documents deliverables
-Bill of Materials (BOM)  
-   - Mention major components, licenses, and tools (if applicable) in tabular format
-Responsibility Matrix : This section should have 2 parts
-   - Define RACI (Crave / Client) responsibilities in tabular format - The table must include the following columns:
-   *Task* | *Crave InfoTech (R/A/C/I)* | *client (R/A/C/I)*  
-
-   - **Part 2 – Roles & Responsibilities Table:**  
-        Below the RACI table, provide a second table titled “Roles & Responsibilities” with two columns:  
-        1. *Role*  
-        2. *Key Responsibilities*  
-Project Delivery Approach 
-   - Project Organization Structure
-   - Project Resource Planning
-        - Begin with a short paragraph describing how Crave’s Delivery and Project Managers identify and allocate resources during project initiation.  
-        - Then generate a detailed **Project Resource Planning Table** that lists project phases vs. indicative roles and resource involvement.  
-        - Title the table as **“Exhibit: Project Resource Planning”**, and include the following columns:  
-            - *Project Phase*  
-            - *Functional Consultant*  
-            - *Technical Consultant*  
-            - *Other Roles (Developer, Tester, PM, ABAP, Architect, etc.)*  
-   - The rows should include realistic phases such as:  
-       - Project Preparation  
-       - Business Blueprint / Detailed Design  
-       - Realization – Development  
-       - Unit and Integration Testing  
-       - Documentation and User Training  
-       - Cutover and Go-Live  
-       - Post Go-Live Support  
-   - Fill each cell with “Yes” or short role mentions (e.g., “PM, Functional Consultant, and Developer”) as per typical Crave-style staffing exhibits.  
-   - Implementation Methodology
-   - Communication Plan 
-       This section should describe how Crave InfoTech and the Client will communicate and manage issues throughout the project lifecycle.  
-   
-        **Part 1 – Interaction Table:**  
-        Create a table titled “Communication Schedule” with columns such as *Interaction*, *Frequency*, and *Purpose* to outline daily, weekly, and monthly touchpoints.  
-
-        **Part 2 – Issue Management and Escalation Process:**  
-        Add a second table titled “Issue Management and Escalation Process” that includes columns like *Task*, *Timescale*, *Resposibility*.  
-
-        **Part 3 – Issue Classification Table:**  
-        Include a third table titled “Issue Classification” to categorize issues by severity (e.g., Low, Serious, Critical) with Definition, Reporting Process and Solution Responsible. 
-
-        Part 4 - Escalation Process
-        Include fourth table titles as "Escalation Process"  to categorize escalation handling across roles and governance levels.  
-        - The table should have the following columns: *Issue Type*, *Escalation Point*, *Escalation Criteria*.  
-        - Populate the table with realistic entries such as:  
-            - Governance Role (Project Core Group)  
-            - Project Delivery Manager  
-            - Crave Technology Project Manager  
-            - Crave Technology Delivery Manager  
-        - Each row should include escalation criteria (e.g., “If plan to resolve the issue is not outlined within 48 hrs”, “Weekly checkpoints”, “Quality issues”, “Unresolved delivery issue”, etc.).  
+    # Keep the uploaded RFP within the input token budget (exact, per deployment encoding)
+    reference_text = truncate_to_tokens(reference_text, GTS_REFERENCE_TOKENS, model_name)
 
+    # --- Relevant passages from our past GTS proposals ---
+    try:
+        knowledge_text, knowledge_sources = retrieve_module_reference(
+            get_knowledge_base(), reference_text, "gts", GTS_KNOWLEDGE_TOKENS, model_name,
+        )
+    except Exception as e:
+        print(f"⚠️ GTS knowledge retrieval failed: {e}")
+        knowledge_text, knowledge_sources = "", []
+    if knowledge_sources:
+        st.info(f"📚 Using past GTS proposal excerpts from: {', '.join(knowledge_sources)}")
 
-Timelines  
-   6.1 Delivery Timeliness
-   6.2 Efforts and Resource Allocation
-   6.3 Commercials
-   6.4 Payment Terms - - List typical payment milestones in tabular format
-Sign-Off  
-   - Add formal sign-off language
-Other Assumptions  
-   - Highlight additional assumptions for clarity
-    8.1. Dependency
-    8.2. Limitations  
-   - Mention project or technical limitations
-    8.3. General Provisions  
-   - Include standard terms and closing remarks
-
-Each section must be clearly titled (Heading 1) and contain 1–2 detailed paragraphs written
-in Crave Infotech’s professional proposal tone.
-
-Ensure:
-- Content flows logically and professionally.
-- No bullet formatting unless it improves clarity.
-- Tone: confident, formal, consultative.
-- Personalize context for client.
-- The document **must begin directly with the section heading "1. Introduction"**, without any preamble, title, or summary lines like “Proposal for …”.
-"""
-
-    # --- Call Azure LLM ---
+    # --- Call Azure LLM: RFP condensed once, then one call per section, all in parallel ---
     try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4
+        ui = UiDispatcher()
+        on_delta, timings = make_live_preview(ui, "📝 Live preview of generated SOW")
+        sow_text = run_async(
+            generate_gts_sections(
+                client, reference_text, knowledge_text, client_name,
+                on_delta=on_delta, on_error=ui.wrap(report_section_error),
+            ),
+            ui=ui,
         )
-        sow_text = response.choices[0].message.content.strip()
+        report_timings(timings, f"SOW generation ({len(GTS_SECTIONS)} sections in parallel)")
         # --- 🧹 Clean unwanted headers ---
         cleanup_patterns = [
             r"(?i)^crave\s+infotech\s+proposal.*\n?",
@@ -444,12 +534,8 @@ def main():
         st.info(f"📌 Detected Client Name: **{client_name}**")
 
     # Azure setup
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
-    model_name = "codetest"
+    client = get_async_client()
+    model_name = get_route("gts_section")["deployment"]
 
     if st.button("⚡ Generate Full SOW Document"):
         if not reference_text:
@@ -7,25 +7,37 @@ from dotenv import load_dotenv
 from PyPDF2 import PdfReader
 import docx
 from docx import Document
-from openai import AzureOpenAI
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain_core.documents import Document as LDocument
 from docx.shared import Inches, RGBColor
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL
+from Modules.context import KB_REFERENCE_TOKENS, assemble_reference
+from Modules.knowledge_base import get_knowledge_base
+from Modules.warmup import wait_for_warmup
+from Modules.retrieval import SECTION_RETRIEVAL, retrieve_section_references
 from Modules.prompts import (
+    build_fitted_prompt,
     get_executive_summary_and_objective_prompt,
     get_scope_prereq_assumptions_prompt,
     get_resource_schedule_and_commercial_prompt,
     get_communication_plan_prompt
 )
 import asyncio
-import concurrent.futures
-import aiohttp
-from openai import AsyncAzureOpenAI
+import hashlib
+from collections import OrderedDict
+from Modules.azure_client import UiDispatcher, get_async_client, run_async
+from Modules.llm import async_stream_chat_completion, cache_stats
+from Modules.scheduler import scheduler_stats
+from Modules.condense import condense_rfp
+from Modules.routing import get_route, route_stats, track_route
+from Modules.structured import (
+    async_structured_completion,
+    blocks_to_markdown,
+    markdown_to_blocks,
+    with_structured_output,
+)
 
 
 
@@ -34,17 +46,16 @@ from openai import AsyncAzureOpenAI
 # -------------------------------------------------------
 load_dotenv()
 KNOWLEDGE_FOLDER = "Knowledge_Repo"
-PERSIST_DIR = "chroma_db"
+# Sections come back as JSON block records (json_schema response format) instead of markdown.
+# Opt-in: deployments / API versions without strict json_schema support reject every section call
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "0").strip().lower() in ("1", "true", "yes")
+# JSON blocks spend more tokens than the same text in markdown, so structured calls get a larger completion budget
+STRUCTURED_MAX_TOKENS_FACTOR = float(os.getenv("STRUCTURED_MAX_TOKENS_FACTOR", "1.6"))
 
-# ---- Shared Async Azure Client + Caching ----
-@st.cache_resource
+# ---- Shared Async Azure Client (process-wide, pooled connections) ----
 def get_azure_client():
-    """Create and cache Async Azure OpenAI client"""
-    return AsyncAzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
+    """Return the process-wide Async Azure OpenAI client"""
+    return get_async_client()
 
 async_client = get_azure_client()
 
@@ -128,31 +139,42 @@ div.stButton > button:hover {
 # -------------------------------------------------------
 # --- Helper: Condensed Context ---
 async def get_condensed_context(client, reference_text, rfp_text):
-    """Summarize RFP + reference text into compact context for faster, stable LLM calls."""
-    condense_prompt = f"""
-    You are a professional SAP proposal analyst.
-    Summarize the following RFP and reference text into about 800–1000 tokens.
-    Include:
-    - Project purpose
-    - Scope
-    - Objectives
-    - Detected technologies and tone
-    ---
-    RFP TEXT:
-    {rfp_text[:7000]}
-
-    REFERENCE MATERIAL:
-    {reference_text[:4000]}
-    """
+    """Summarize RFP + reference text into compact context for faster, stable LLM calls (map-reduce for long RFPs)."""
+    return await condense_rfp(client, reference_text, rfp_text)
 
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0.3,
-        max_tokens=1200,
-        messages=[{"role": "user", "content": condense_prompt}]
-    )
-    return response.choices[0].message.content.strip()
 
+# --- Helper: Single-flight Condensed Context ---
+# All four section generators condense the same (reference, RFP) pair.
+# The first caller starts the LLM call; the others await the same task.
+_CONDENSE_TASKS_MAX = 16
+_condense_tasks = OrderedDict()
+
+async def get_shared_condensed_context(client, reference_text, rfp_text):
+    """Condense once per (reference, RFP) pair and share the result with every concurrent caller."""
+    key = hashlib.sha256(f"{reference_text}\x00{rfp_text}".encode("utf-8")).hexdigest()
+    loop = asyncio.get_running_loop()
+
+    task = _condense_tasks.get(key)
+    if task is not None and task.done() and not task.cancelled() and task.exception() is None:
+        # Finished on an earlier rerun's loop — the result is still valid
+        _condense_tasks.move_to_end(key)
+        return task.result()
+
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = loop.create_task(get_condensed_context(client, reference_text, rfp_text))
+        _condense_tasks[key] = task
+        while len(_condense_tasks) > _CONDENSE_TASKS_MAX:
+            _condense_tasks.popitem(last=False)
+
+        def _forget_on_failure(t, key=key):
+            # Drop failed calls so the next caller retries instead of re-raising a stale error
+            if (t.cancelled() or t.exception() is not None) and _condense_tasks.get(key) is t:
+                _condense_tasks.pop(key, None)
+
+        task.add_done_callback(_forget_on_failure)
+
+    # Shield so one cancelled section does not cancel the shared call for the others
+    return await asyncio.shield(task)
 
 
 def extract_text(file):
@@ -166,48 +188,12 @@ def extract_text(file):
     return ""
 
 
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
-from langchain_community.embeddings import HuggingFaceEmbeddings
-import os
-
 @st.cache_resource
 def build_knowledge_base(folder="Knowledge_Repo"):
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index_name = "response-generator"
-
-    # Create index if it doesn't exist
-    if index_name not in [idx["name"] for idx in pc.list_indexes()]:
-        pc.create_index(
-            name=index_name,
-            dimension=384,  # ✅ MiniLM-L6-v2 has 384 dims (not 1024)
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-
-    index = pc.Index(index_name)
-
-    vector_store = PineconeVectorStore(index=index, embedding=embedding_model)
-
-    # --- Upload documents if index is empty ---
-    stats = pc.describe_index(index_name)
-    if stats.get("status", {}).get("ready", False):
-        # Load local RFP references
-        docs = []
-        for file in os.listdir(folder):
-            if file.endswith((".pdf", ".docx")):
-                path = os.path.join(folder, file)
-                text = extract_text(open(path, "rb"))
-                if text.strip():
-                    docs.append(LDocument(page_content=text, metadata={"source": file}))
-
-        if docs:
-            vector_store.add_documents(docs)
-            print(f"✅ Uploaded {len(docs)} docs to Pinecone index '{index_name}'")
-
-    return vector_store
+    """Process-wide knowledge base (all module namespaces); only new/changed files are re-indexed (see Modules.knowledge_base)."""
+    # Waits only while the background warm-up is still loading it
+    wait_for_warmup("embedding_model", "knowledge_base")
+    return get_knowledge_base(folder)
 
 
 
@@ -244,7 +230,7 @@ def insert_executive_summary_into_template(
     """
     Replace placeholders in the template:
     <<EXEC_SUMMARY>>, <<OBJECTIVE>>, <<SCOPE_TEXT>>, <<RESOURCE_SCHEDULE>>, <<COMMUNICATION_PLAN>>
-    Now includes robust bullet point handling.
+    Each section is either a list of structured block records or legacy markdown text.
     """
 
     doc = Document(template_path)
@@ -313,9 +299,43 @@ def insert_executive_summary_into_template(
 
         return table
 
-    def replace_placeholder(doc, placeholder, new_text):
-        if not new_text:
+    def render_blocks(doc, blocks):
+        """Create document elements for structured block records."""
+        elements = []
+        for block in blocks:
+            kind = block.get("type")
+
+            if kind == "table" and block.get("headers"):
+                width = len(block["headers"])
+                rows = [(list(row) + [""] * width)[:width] for row in block.get("rows") or []]
+                table = insert_styled_table(doc, block["headers"], rows)
+                elements.append(table._element)
+
+            # Section heading
+            elif kind == "heading":
+                new_para = doc.add_paragraph(block.get("text", "").strip())
+                new_para.style = "Table Column Heading"
+                new_para.paragraph_format.space_after = Pt(4)
+                elements.append(new_para._element)
+
+            elif kind == "bullets":
+                for item in block.get("items") or []:
+                    new_para = doc.add_paragraph(item.strip(), style="List Bullet 2")
+                    new_para.paragraph_format.left_indent = Pt(18)
+                    new_para.paragraph_format.space_after = Pt(2)
+                    elements.append(new_para._element)
+
+            # Regular text
+            elif block.get("text", "").strip():
+                new_para = doc.add_paragraph(block["text"].strip())
+                elements.append(new_para._element)
+        return elements
+
+    def replace_placeholder(doc, placeholder, content):
+        """Replace a placeholder with block records, or with legacy markdown text."""
+        if not content:
             return
+        blocks = markdown_to_blocks(content) if isinstance(content, str) else content
 
         for para in doc.paragraphs:
             if placeholder in "".join(run.text for run in para.runs):
@@ -323,55 +343,8 @@ def insert_executive_summary_into_template(
                 idx = parent.index(para._element)
                 parent.remove(para._element)
 
-                lines = [line.strip() for line in new_text.split("\n") if line.strip()]
-                new_elements = []  # collect to insert once
-
-                i = 0
-                while i < len(lines):
-                    line = lines[i]
-
-                    # Markdown-style table
-                    if line.startswith("|") and "|" in line:
-                        table_lines = []
-                        while i < len(lines) and lines[i].startswith("|"):
-                            table_lines.append(lines[i])
-                            i += 1
-                        headers = [h.strip("* ") for h in table_lines[0].strip("|").split("|")]
-                        rows = [
-                            [c.strip() for c in r.strip("|").split("|")]
-                            for r in table_lines[2:]
-                        ]
-                        table = insert_styled_table(doc, headers, rows)
-                        new_elements.append(table._element)
-                        continue
-
-                    # Section heading
-                    if line.startswith("**") or line.startswith("###"):
-                        header_text = line.strip("*# ").rstrip(":")
-                        new_para = doc.add_paragraph(header_text)
-                        new_para.style = "Table Column Heading"
-                        new_para.paragraph_format.space_after = Pt(4)
-                        new_elements.append(new_para._element)
-                        i += 1
-                        continue
-
-                    # Markdown bullets (FIXED: Use apply_bullet_to_para for robustness)
-                    if line.startswith("- ") or line.startswith("• "):
-                        bullet_text = line[2:].strip() if line.startswith("- ") else line[1:].strip()
-                        new_para = doc.add_paragraph(bullet_text, style="List Bullet 2")
-                        new_para.paragraph_format.left_indent = Pt(18)
-                        new_para.paragraph_format.space_after = Pt(2)
-                        new_elements.append(new_para._element)
-                        i += 1
-                        continue
-
-                    # Regular text
-                    new_para = doc.add_paragraph(line)
-                    new_elements.append(new_para._element)
-                    i += 1
-
                 # ⚡️ Insert all new elements once
-                for element in reversed(new_elements):
+                for element in reversed(render_blocks(doc, blocks)):
                     parent.insert(idx, element)
                 return
 
@@ -469,26 +442,62 @@ def insert_executive_summary_into_template(
 #         obj_text = full_output[len(full_output)//2:]
 
 #     return exec_text, obj_text
-async def async_generate_exec_summary_and_objective(reference_text, rfp_text, num_interfaces=113):
-    client = async_client
-    condensed_context = await get_condensed_context(client, reference_text, rfp_text)
+async def generate_section(task, prompt_fn, reference_text, condensed_context, *args,
+                           section_keys=("content",), on_delta=None):
+    """
+    Generate one section on its routed deployment.
+    Returns {section_key: [block, ...]} in structured mode, otherwise the streamed markdown text.
+    """
+    route = get_route(task)
+    max_tokens = route["max_tokens"]
+    if STRUCTURED_OUTPUT:
+        prompt_fn = with_structured_output(prompt_fn, section_keys)
+        max_tokens = int(max_tokens * STRUCTURED_MAX_TOKENS_FACTOR)
+    prompt = build_fitted_prompt(
+        prompt_fn, route["deployment"], max_tokens,
+        reference_text, condensed_context, *args,
+    )
 
-    prompt = get_executive_summary_and_objective_prompt(reference_text, condensed_context, num_interfaces)
+    if STRUCTURED_OUTPUT:
+        call = async_structured_completion(
+            async_client,
+            model=route["deployment"],
+            prompt=prompt,
+            section_keys=section_keys,
+            temperature=route["temperature"],
+            max_tokens=max_tokens,
+            on_delta=on_delta,
+        )
+    else:
+        call = async_stream_chat_completion(
+            async_client,
+            model=route["deployment"],
+            prompt=prompt,
+            temperature=route["temperature"],
+            max_tokens=route["max_tokens"],
+            on_delta=on_delta,
+        )
+    return await track_route(route, prompt, call)
 
-    response = await client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    full_output = response.choices[0].message.content.strip()
+async def async_generate_exec_summary_and_objective(reference_text, rfp_text, num_interfaces=113, on_delta=None,
+                                                    section_reference=None):
+    condensed_context = await get_shared_condensed_context(async_client, reference_text, rfp_text)
+
+    output = await generate_section(
+        "exec_summary", get_executive_summary_and_objective_prompt,
+        section_reference or reference_text, condensed_context, num_interfaces,
+        section_keys=("executive_summary", "objective"), on_delta=on_delta,
+    )
+    if STRUCTURED_OUTPUT:
+        # Both sections come back as separate JSON fields — no splitting needed
+        return output["executive_summary"], output["objective"]
 
-    match_exec = re.search(r"(?i)\bExecutive Summary\b\s*([\s\S]*?)(?=\bObjective\b|$)", full_output)
-    exec_text = match_exec.group(1).strip() if match_exec else full_output[:len(full_output)//2]
+    match_exec = re.search(r"(?i)\bExecutive Summary\b\s*([\s\S]*?)(?=\bObjective\b|$)", output)
+    exec_text = match_exec.group(1).strip() if match_exec else output[:len(output)//2]
 
-    match_obj = re.search(r"(?i)\bObjective\b\s*([\s\S]*)", full_output)
-    obj_text = match_obj.group(1).strip() if match_obj else full_output[len(full_output)//2:]
+    match_obj = re.search(r"(?i)\bObjective\b\s*([\s\S]*)", output)
+    obj_text = match_obj.group(1).strip() if match_obj else output[len(output)//2:]
 
     return exec_text, obj_text
 
@@ -512,19 +521,14 @@ async def async_generate_exec_summary_and_objective(reference_text, rfp_text, nu
     # )
     # return response.choices[0].message.content.strip()
 
-async def async_generate_scope_sections(reference_text, rfp_text, num_interfaces=None):
-    client = async_client
-    condensed_context = await get_condensed_context(client, reference_text, rfp_text)
-
-    prompt = get_scope_prereq_assumptions_prompt(reference_text, condensed_context, num_interfaces)
-
-    response = await client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=1500,
-        messages=[{"role": "user", "content": prompt}]
+async def async_generate_scope_sections(reference_text, rfp_text, num_interfaces=None, on_delta=None,
+                                        section_reference=None):
+    condensed_context = await get_shared_condensed_context(async_client, reference_text, rfp_text)
+    output = await generate_section(
+        "scope", get_scope_prereq_assumptions_prompt,
+        section_reference or reference_text, condensed_context, num_interfaces, on_delta=on_delta,
     )
-    return response.choices[0].message.content.strip()
+    return output["content"] if STRUCTURED_OUTPUT else output
 
 
 # async def async_generate_resource_schedule_and_commercial(reference_text,rfp_text):
@@ -545,19 +549,14 @@ async def async_generate_scope_sections(reference_text, rfp_text, num_interfaces
 #         messages=[{"role": "user", "content": prompt}]
 #     )
 #     return response.choices[0].message.content.strip()
-async def async_generate_resource_schedule_and_commercial(reference_text, rfp_text):
-    client = async_client
-    condensed_context = await get_condensed_context(client, reference_text, rfp_text)
-
-    prompt = get_resource_schedule_and_commercial_prompt(reference_text, condensed_context)
-
-    response = await client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
+async def async_generate_resource_schedule_and_commercial(reference_text, rfp_text, on_delta=None,
+                                                         section_reference=None):
+    condensed_context = await get_shared_condensed_context(async_client, reference_text, rfp_text)
+    output = await generate_section(
+        "resource_schedule", get_resource_schedule_and_commercial_prompt,
+        section_reference or reference_text, condensed_context, on_delta=on_delta,
     )
-    return response.choices[0].message.content.strip()
+    return output["content"] if STRUCTURED_OUTPUT else output
 
 
 # async def async_generate_communication_plan(reference_text, rfp_text):
@@ -579,19 +578,13 @@ async def async_generate_resource_schedule_and_commercial(reference_text, rfp_te
 #     )
 #     return response.choices[0].message.content.strip()
 
-async def async_generate_communication_plan(reference_text, rfp_text):
-    client = async_client
-    condensed_context = await get_condensed_context(client, reference_text, rfp_text)
-
-    prompt = get_communication_plan_prompt(reference_text, condensed_context)
-
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0.3,
-        max_tokens=2500,
-        messages=[{"role": "user", "content": prompt}]
+async def async_generate_communication_plan(reference_text, rfp_text, on_delta=None, section_reference=None):
+    condensed_context = await get_shared_condensed_context(async_client, reference_text, rfp_text)
+    output = await generate_section(
+        "communication_plan", get_communication_plan_prompt,
+        section_reference or reference_text, condensed_context, on_delta=on_delta,
     )
-    return response.choices[0].message.content.strip()
+    return output["content"] if STRUCTURED_OUTPUT else output
 
 
 # --- Conditional Logic ---
@@ -672,86 +665,157 @@ def main():
                     # STEP 2: Build or load knowledge base & Retrieve context
                     st.write("2/6 📚 Loading knowledge base and retrieving reference documents...")
                     knowledge_db = build_knowledge_base()
-                    retriever = knowledge_db.as_retriever(search_kwargs={"k": 1})
-                    ref_docs = retriever.invoke(rfp_text)
-                    reference_text = "\n\n".join([d.page_content for d in ref_docs])
-                    st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference documents!")
+                    # Whole-RFP passages feed the shared condensed brief; each section prompt gets its own passages
+                    ref_docs, section_docs = run_async(retrieve_section_references(knowledge_db, rfp_text))
+                    reference_text = assemble_reference(
+                        knowledge_db, ref_docs, KB_REFERENCE_TOKENS, get_route("condense")["deployment"],
+                    )
+                    section_refs = {
+                        task: assemble_reference(
+                            knowledge_db, docs, SECTION_RETRIEVAL[task]["tokens"], get_route(task)["deployment"],
+                        )
+                        for task, docs in section_docs.items()
+                    }
+                    st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference passages from {len({d.metadata.get('source') for d in ref_docs})} documents!")
                     status.update(label="🚀 Generating Proposal Sections... (40% Complete)", state="running")
 
 
-                                    
+
                     # Create placeholders for live status updates
                     progress_placeholder = st.empty()
-                    status_messages = [
-                        "🧠 Generating Executive Summary & Objective...",
-                        "🧩 Generating Scope & Assumptions...",
-                        "📊 Generating Resource Schedule & Commercials...",
-                        "📢 Generating Communication Plan..."
+                    section_labels = [
+                        "Executive Summary & Objective",
+                        "Scope & Assumptions",
+                        "Resource Schedule & Commercials",
+                        "Communication Plan",
                     ]
-                    completed = []
-
-                    async def generate_all_sections_async():
-                        async def wrapped_task(task_fn, label):
-                            try:
-                                result = await task_fn
-                                completed.append(f"✅ {label} generated successfully!")
-                                progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
-                                return result
-                            except Exception as e:
-                                completed.append(f"⚠️ {label} failed: {str(e)}")
-                                progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
-                                return None
-
-                        tasks = [
-                            wrapped_task(
-                                async_generate_exec_summary_and_objective(reference_text, rfp_text, num_interfaces),
-                                "Executive Summary & Objective"
+                    section_status = {label: f"⏳ {label} queued..." for label in section_labels}
+                    progress_placeholder.markdown("<br>".join(section_status.values()), unsafe_allow_html=True)
+
+                # --- Proposal Preview (filled live while sections stream) ---
+                st.markdown("## 🔍 Step 2: Review and Edit Content")
+                st.info("Review the AI-generated sections below before downloading the final document.")
+
+                tab1, tab2, tab3, tab4, tab5 = st.tabs([
+                    "Executive Summary", "Objective", "Scope & Assumptions",
+                    "Resource & Schedule", "Communication Plan"
+                ])
+                with tab1: exec_pane = st.empty()
+                with tab2: objective_pane = st.empty()
+                with tab3: scope_pane = st.empty()
+                with tab4: resource_pane = st.empty()
+                with tab5: communication_pane = st.empty()
+
+                # Sections run on the shared background loop; UI updates are replayed on this thread
+                ui = UiDispatcher()
+
+                def render_progress():
+                    progress_placeholder.markdown("<br>".join(section_status.values()), unsafe_allow_html=True)
+
+                refresh_progress = ui.wrap(render_progress)
+
+                async def generate_all_sections_async():
+                    async def wrapped_task(make_task, label, pane):
+                        start = time.perf_counter()
+                        first_token = {}
+                        render_pane = ui.wrap(pane.markdown)
+
+                        def on_delta(text):
+                            # Record time-to-first-token from the section's point of view
+                            if "ttft" not in first_token:
+                                first_token["ttft"] = time.perf_counter() - start
+                            render_pane(text)
+                            section_status[label] = (
+                                f"✍️ {label} — streaming ({len(text):,} chars, "
+                                f"first token {first_token['ttft']:.1f}s)"
+                            )
+                            refresh_progress()
+
+                        try:
+                            result = await make_task(on_delta)
+                            ttft = first_token.get("ttft", time.perf_counter() - start)
+                            section_status[label] = (
+                                f"✅ {label} generated — first token {ttft:.1f}s, "
+                                f"total {time.perf_counter() - start:.1f}s"
+                            )
+                            refresh_progress()
+                            return result
+                        except Exception as e:
+                            section_status[label] = f"⚠️ {label} failed: {str(e)}"
+                            refresh_progress()
+                            return None
+
+                    tasks = [
+                        wrapped_task(
+                            lambda cb: async_generate_exec_summary_and_objective(
+                                reference_text, rfp_text, num_interfaces, on_delta=cb,
+                                section_reference=section_refs.get("exec_summary"),
                             ),
-                            wrapped_task(
-                                async_generate_scope_sections(reference_text, rfp_text, num_interfaces),
-                                "Scope & Assumptions"
+                            "Executive Summary & Objective", exec_pane
+                        ),
+                        wrapped_task(
+                            lambda cb: async_generate_scope_sections(
+                                reference_text, rfp_text, num_interfaces, on_delta=cb,
+                                section_reference=section_refs.get("scope"),
                             ),
-                            wrapped_task(
-                                async_generate_resource_schedule_and_commercial(reference_text, rfp_text),
-                                "Resource Schedule & Commercials"
+                            "Scope & Assumptions", scope_pane
+                        ),
+                        wrapped_task(
+                            lambda cb: async_generate_resource_schedule_and_commercial(
+                                reference_text, rfp_text, on_delta=cb,
+                                section_reference=section_refs.get("resource_schedule"),
                             ),
-                            wrapped_task(
-                                async_generate_communication_plan(reference_text, rfp_text),
-                                "Communication Plan"
+                            "Resource Schedule & Commercials", resource_pane
+                        ),
+                        wrapped_task(
+                            lambda cb: async_generate_communication_plan(
+                                reference_text, rfp_text, on_delta=cb,
+                                section_reference=section_refs.get("communication_plan"),
                             ),
-                        ]
-
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
-                        return results
-
+                            "Communication Plan", communication_pane
+                        ),
+                    ]
 
-                    with st.spinner("🚀 Generating all proposal sections concurrently..."):
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        exec_obj, scope_text, resource_schedule_text, communication_plan_text = loop.run_until_complete(generate_all_sections_async())
+                    results = await asyncio.gather(*tasks, return_exceptions=True)
+                    return results
 
-                    # Unpack the tuple from first task
-                    exec_summary, objective = exec_obj if isinstance(exec_obj, tuple) else ("", "")
 
-                    # Final success message
-                    progress_placeholder.markdown("<br>".join(completed) + "<br>🎉 All sections generated successfully!", unsafe_allow_html=True)
-                    st.success("✅ All proposal sections generated in parallel using async!")
-                    status.update(label="✅ Proposal Content Complete!", state="complete", expanded=False)
+                with st.spinner("🚀 Generating all proposal sections concurrently..."):
+                    exec_obj, scope_text, resource_schedule_text, communication_plan_text = run_async(
+                        generate_all_sections_async(), ui=ui
+                    )
 
-                # --- Proposal Preview ---
-                st.markdown("## 🔍 Step 2: Review and Edit Content")
-                st.info("Review the AI-generated sections below before downloading the final document.")
-                
-                tab1, tab2, tab3, tab4, tab5 = st.tabs([
-                    "Executive Summary", "Objective", "Scope & Assumptions", 
-                    "Resource & Schedule", "Communication Plan"
-                ])
-                
-                with tab1: st.markdown(exec_summary)
-                with tab2: st.markdown(objective)
-                with tab3: st.markdown(scope_text)
-                with tab4: st.markdown(resource_schedule_text)
-                with tab5: st.markdown(communication_plan_text)
+                # Unpack the tuple from first task
+                exec_summary, objective = exec_obj if isinstance(exec_obj, tuple) else ("", "")
+
+                # Final render: the exec pane streamed the combined output, now show the split
+                def as_markdown(content):
+                    return blocks_to_markdown(content) if isinstance(content, list) else (content or "")
+
+                exec_pane.markdown(as_markdown(exec_summary))
+                objective_pane.markdown(as_markdown(objective))
+                scope_pane.markdown(as_markdown(scope_text))
+                resource_pane.markdown(as_markdown(resource_schedule_text))
+                communication_pane.markdown(as_markdown(communication_plan_text))
+
+                # Final success message
+                progress_placeholder.markdown("<br>".join(section_status.values()) + "<br>🎉 All sections generated successfully!", unsafe_allow_html=True)
+                st.success("✅ All proposal sections generated in parallel using async!")
+                stats = cache_stats()
+                st.caption(f"🗄️ LLM cache: {stats['hits']} hits / {stats['misses']} misses since startup")
+                for deployment, load in scheduler_stats().items():
+                    st.caption(
+                        f"🚦 {deployment}: {load['calls']} calls, {load['retries']} retries, "
+                        f"queue wait {load['queue_wait_total']:.1f}s total / {load['queue_wait_max']:.1f}s max, "
+                        f"retry backoff {load['backoff_total']:.1f}s since startup"
+                    )
+                for task, metrics in route_stats().items():
+                    st.caption(
+                        f"📊 {task} → {metrics['deployment']}: {metrics['calls']} calls, {metrics['cache_hits']} cache hits, "
+                        f"avg {metrics['latency_total'] / max(metrics['calls'], 1):.1f}s / max {metrics['latency_max']:.1f}s, "
+                        f"{metrics['prompt_tokens']:,} prompt + {metrics['completion_tokens']:,} completion tokens since startup"
+                    )
+                status.update(label="✅ Proposal Content Complete!", state="complete", expanded=False)
                 
                 # --- Download Section ---
                 st.markdown("---")
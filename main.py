@@ -1,5 +1,10 @@
 import streamlit as st
 import integration, coreasses, gts, ai # 👈 This will call your current async generator
+from Modules.warmup import start_warmup, warmup_status
+
+# Preload the embedding model, knowledge base, vector index and Azure connection
+# in the background (once per process) so the first request doesn't pay for them
+start_warmup()
 
 if "initialized" not in st.session_state:
     st.session_state.view = "home"
@@ -98,6 +103,10 @@ if st.session_state.view == "home":
     st.markdown("<div class='main-header'>Automate Your <span class='highlight-text'>Proposal Response</span></div>", unsafe_allow_html=True)
     st.markdown("<p class='sub-tagline'>Respond to RFPs in minutes with AI-driven content generation.</p>", unsafe_allow_html=True)
 
+    warming = [step for step, s in warmup_status().items() if s["state"] in ("pending", "running")]
+    if warming:
+        st.caption(f"⏳ Warming up: {', '.join(warming)} — the first generation may take a little longer.")
+
     st.markdown("<div class='button-box'>", unsafe_allow_html=True)
     st.markdown("<h3 style='text-align:center; color:#333;'>Select a Module to Continue</h3>", unsafe_allow_html=True)
 
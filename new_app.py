@@ -9,14 +9,17 @@ import docx
 from docx import Document
 from openai import AzureOpenAI
 from langchain_openai import AzureOpenAIEmbeddings
-from langchain_core.documents import Document as LDocument
 from docx.shared import Inches, RGBColor
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL
+from Modules.context import KB_REFERENCE_TOKENS, assemble_reference
+from Modules.knowledge_base import get_knowledge_base
+from Modules.retrieval import retrieve_reference
 from Modules.prompts import (
+    build_fitted_prompt,
     get_executive_summary_and_objective_prompt,
     get_scope_prereq_assumptions_prompt,
     get_resource_schedule_and_commercial_prompt,
@@ -34,7 +37,6 @@ from openai import AsyncAzureOpenAI
 # -------------------------------------------------------
 load_dotenv()
 KNOWLEDGE_FOLDER = "Knowledge_Repo"
-PERSIST_DIR = "chroma_db"
 
 st.set_page_config(page_title="RFP Proposal AI Generator", layout="wide")
 
@@ -125,47 +127,9 @@ def extract_text(file):
     return ""
 
 
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
-from langchain_community.embeddings import HuggingFaceEmbeddings
-import os
-
 def build_knowledge_base(folder="Knowledge_Repo"):
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index_name = "response-generator"
-
-    # Create index if it doesn't exist
-    if index_name not in [idx["name"] for idx in pc.list_indexes()]:
-        pc.create_index(
-            name=index_name,
-            dimension=384,  # ✅ MiniLM-L6-v2 has 384 dims (not 1024)
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-
-    index = pc.Index(index_name)
-
-    vector_store = PineconeVectorStore(index=index, embedding=embedding_model)
-
-    # --- Upload documents if index is empty ---
-    stats = pc.describe_index(index_name)
-    if stats.get("status", {}).get("ready", False):
-        # Load local RFP references
-        docs = []
-        for file in os.listdir(folder):
-            if file.endswith((".pdf", ".docx")):
-                path = os.path.join(folder, file)
-                text = extract_text(open(path, "rb"))
-                if text.strip():
-                    docs.append(LDocument(page_content=text, metadata={"source": file}))
-
-        if docs:
-            vector_store.add_documents(docs)
-            print(f"✅ Uploaded {len(docs)} docs to Pinecone index '{index_name}'")
-
-    return vector_store
+    """Process-wide knowledge base (all module namespaces); only new/changed files are re-indexed (see Modules.knowledge_base)."""
+    return get_knowledge_base(folder)
 
 
 
@@ -350,7 +314,10 @@ async def async_generate_exec_summary_and_objective(reference_text, condensed_rf
         api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
     )
 
-    prompt = get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, num_interfaces)
+    prompt = build_fitted_prompt(
+        get_executive_summary_and_objective_prompt, "Codetest", 2000,
+        reference_text, condensed_rfp, num_interfaces,
+    )
 
     response = await client.chat.completions.create(
         model="Codetest",
@@ -388,7 +355,10 @@ async def async_generate_scope_sections(reference_text, condensed_rfp, num_inter
         api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
         api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
     )
-    prompt = get_scope_prereq_assumptions_prompt(reference_text, condensed_rfp, num_interfaces)
+    prompt = build_fitted_prompt(
+        get_scope_prereq_assumptions_prompt, "Codetest", 1200,
+        reference_text, condensed_rfp, num_interfaces,
+    )
     response = await client.chat.completions.create(
         model="Codetest", temperature=0.3, max_tokens=1200,
         messages=[{"role": "user", "content": prompt}]
@@ -402,7 +372,10 @@ async def async_generate_resource_schedule_and_commercial(reference_text, conden
         api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
         api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
     )
-    prompt = get_resource_schedule_and_commercial_prompt(reference_text, condensed_rfp)
+    prompt = build_fitted_prompt(
+        get_resource_schedule_and_commercial_prompt, "Codetest", 2000,
+        reference_text, condensed_rfp,
+    )
     response = await client.chat.completions.create(
         model="Codetest", temperature=0.3, max_tokens=2000,
         messages=[{"role": "user", "content": prompt}]
@@ -416,7 +389,10 @@ async def async_generate_communication_plan(reference_text, condensed_rfp):
         api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
         api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
     )
-    prompt = get_communication_plan_prompt(reference_text, condensed_rfp)
+    prompt = build_fitted_prompt(
+        get_communication_plan_prompt, "Codetest", 2500,
+        reference_text, condensed_rfp,
+    )
     response = await client.chat.completions.create(
         model="Codetest", temperature=0.3, max_tokens=2500,
         messages=[{"role": "user", "content": prompt}]
@@ -507,10 +483,9 @@ if uploaded_file:
                 # STEP 2: Build or load knowledge base & Retrieve context
                 st.write("2/6 📚 Loading knowledge base and retrieving reference documents...")
                 knowledge_db = build_knowledge_base()
-                retriever = knowledge_db.as_retriever(search_kwargs={"k": 1})
-                ref_docs = retriever.invoke(rfp_text)
-                reference_text = "\n\n".join([d.page_content for d in ref_docs])
-                st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference documents!")
+                ref_docs = retrieve_reference(knowledge_db, rfp_text)
+                reference_text = assemble_reference(knowledge_db, ref_docs, KB_REFERENCE_TOKENS, "Codetest")
+                st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference passages from {len({d.metadata.get('source') for d in ref_docs})} documents!")
                 status.update(label="🚀 Generating Proposal Sections... (40% Complete)", state="running")
 
 
@@ -0,0 +1,57 @@
+import re
+import socket
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors, so indexing runs without a model download."""
+
+    def __init__(self, dimension=64):
+        self.dimension = dimension
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            vector[sum(word.encode("utf-8")) % self.dimension] += 1.0
+        return vector.tolist()
+
+
+class WhitespaceEncoding:
+    """Stand-in for a tiktoken encoding (tiktoken downloads its BPE files on first use)."""
+
+    def encode(self, text, **kwargs):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class WhitespaceTokenizer:
+    """Stand-in for the embedding model's WordPiece tokenizer: one piece per word, with offsets."""
+
+    def encode(self, text, add_special_tokens=True):
+        spans = [match.span() for match in re.finditer(r"\S+", text)]
+        return SimpleNamespace(ids=list(range(len(spans))), offsets=spans)
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Fail any attempt to open a network connection; count tokens without tiktoken / model downloads."""
+    def refuse(*args, **kwargs):
+        raise AssertionError("test tried to open a network connection")
+
+    monkeypatch.setattr(socket.socket, "connect", refuse)
+    monkeypatch.setattr(socket, "create_connection", refuse)
+    monkeypatch.setattr("Modules.tokens.get_encoding", lambda model: WhitespaceEncoding())
+    monkeypatch.setattr("Modules.chunking.get_passage_tokenizer", lambda: WhitespaceTokenizer())
+
+
+@pytest.fixture
+def embeddings():
+    return HashingEmbeddings()
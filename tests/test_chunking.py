@@ -0,0 +1,22 @@
+from Modules.chunking import chunk_blocks
+
+
+def test_long_paragraph_is_split_into_slices_of_the_original_text(offline):
+    words = [f"Interface{i}" for i in range(50)]
+    text = " ".join(words)
+    passages = chunk_blocks([{"type": "paragraph", "text": text}], chunk_tokens=20, overlap_tokens=5)
+
+    assert [p["text"].split()[0] for p in passages] == ["Interface0", "Interface15", "Interface30"]
+    assert all(p["text"] in text and len(p["text"].split()) <= 20 for p in passages)
+
+
+def test_paragraphs_are_packed_with_an_overlapping_tail(offline):
+    blocks = [
+        {"type": "heading", "text": "Scope", "level": 1},
+        {"type": "paragraph", "text": "SAP PI/PO interfaces move to Integration Suite in three waves."},
+        {"type": "paragraph", "text": "Each wave ends with regression testing and a cutover rehearsal."},
+    ]
+    passages = chunk_blocks(blocks, chunk_tokens=16, overlap_tokens=3)
+
+    assert [p["section"] for p in passages] == ["Scope", "Scope"]
+    assert passages[1]["text"] == "Scope\nin three waves.\nEach wave ends with regression testing and a cutover rehearsal."
@@ -0,0 +1,74 @@
+import os
+import docx
+from Modules.knowledge_base import sync_knowledge_base
+from Modules.sparse_index import SparseIndex
+from Modules.vector_index import NumpyVectorStore
+
+
+def write_docx(path, heading, paragraphs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    document = docx.Document()
+    document.add_heading(heading, level=1)
+    for text in paragraphs:
+        document.add_paragraph(text)
+    document.save(path)
+
+
+def open_stores(tmp_path, embeddings):
+    store = NumpyVectorStore(embeddings, str(tmp_path / "index"), name="kb")
+    return store, SparseIndex(str(tmp_path / "index" / "kb_bm25"))
+
+
+def test_incremental_sync_of_a_small_folder_offline(tmp_path, offline, embeddings):
+    folder = tmp_path / "Knowledge_Repo"
+    write_docx(str(folder / "SOW_PIPO_Migration.docx"), "Scope", [
+        "Migration of SAP PI/PO interfaces to SAP Integration Suite.",
+        "Crave will provide weekly status reports to the steering committee.",
+    ])
+    write_docx(str(folder / "GTS" / "GTS_Proposal.docx"), "Compliance", [
+        "Sanctioned party screening and export license determination in SAP GTS.",
+    ])
+    manifest_path = str(tmp_path / "index" / "kb_manifest.json")
+
+    store, sparse_index = open_stores(tmp_path, embeddings)
+    counts = sync_knowledge_base(store, "kb", str(folder), manifest_path, sparse_index)
+    assert (counts["added"], counts["unchanged"]) == (2, 0)
+    assert counts["passages"] == len(store) == len(sparse_index) > 0
+
+    # A second run (fresh process state) re-indexes nothing
+    store, sparse_index = open_stores(tmp_path, embeddings)
+    counts = sync_knowledge_base(store, "kb", str(folder), manifest_path, sparse_index)
+    assert (counts["added"], counts["updated"], counts["unchanged"], counts["passages"]) == (0, 0, 2, 0)
+
+    # Namespaces follow the sub-folder
+    query = embeddings.embed_query("export license screening")
+    hits = store.search_vectors([query], k=5, filter={"namespace": "gts"})[0]
+    assert hits and all(store._metadatas[row]["source"] == "GTS/GTS_Proposal.docx" for row, _ in hits)
+
+    # Deleting a file removes its passages from both indexes
+    os.remove(folder / "GTS" / "GTS_Proposal.docx")
+    counts = sync_knowledge_base(store, "kb", str(folder), manifest_path, sparse_index)
+    assert counts["removed"] == 1
+    assert {m["source"] for m in sparse_index.metadatas} == {"SOW_PIPO_Migration.docx"}
+    assert len(store) == len(sparse_index)
+
+
+def test_embedding_runtime_change_reindexes_every_file(tmp_path, offline, embeddings, monkeypatch):
+    import Modules.knowledge_base as knowledge_base
+
+    folder = tmp_path / "Knowledge_Repo"
+    write_docx(str(folder / "SOW_PIPO_Migration.docx"), "Scope", [
+        "Migration of SAP PI/PO interfaces to SAP Integration Suite.",
+    ])
+    manifest_path = str(tmp_path / "index" / "kb_manifest.json")
+    store, sparse_index = open_stores(tmp_path, embeddings)
+    sync_knowledge_base(store, "kb", str(folder), manifest_path, sparse_index)
+    fingerprint = knowledge_base.index_fingerprint(manifest_path)
+    passages = len(store)
+
+    other_runtime = {"model": "sentence-transformers/all-MiniLM-L6-v2", "runtime": "other", "onnx_file": None}
+    monkeypatch.setattr(knowledge_base, "embedding_config", lambda: other_runtime)
+    counts = sync_knowledge_base(store, "kb", str(folder), manifest_path, sparse_index)
+    assert (counts["updated"], counts["unchanged"]) == (1, 0)
+    assert len(store) == len(sparse_index) == passages
+    assert knowledge_base.index_fingerprint(manifest_path) != fingerprint
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import Modules.llm as llm
+import Modules.scheduler as scheduler
+
+
+class StreamingClient:
+    """Streams a fixed reply, optionally followed by a usage-only chunk."""
+
+    def __init__(self, pieces, total_tokens=None):
+        self.pieces = pieces
+        self.total_tokens = total_tokens
+        self.kwargs = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+
+        async def stream():
+            for piece in self.pieces:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+            if self.total_tokens is not None:
+                yield SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=self.total_tokens))
+
+        return stream()
+
+
+@pytest.fixture
+def fresh_limiter(monkeypatch, offline):
+    monkeypatch.setattr(llm, "LLM_CACHE_BYPASS", True)
+    monkeypatch.setattr(scheduler, "_limiters", {})
+    return lambda: scheduler.get_limiter("gpt-4o").tokens
+
+
+def test_streamed_call_settles_reservation_from_usage_chunk(fresh_limiter):
+    client = StreamingClient(["Scope ", "covers 113 interfaces."], total_tokens=250)
+    text = asyncio.run(llm.async_stream_chat_completion(client, "gpt-4o", "Describe the scope.", max_tokens=4000))
+
+    assert text == "Scope covers 113 interfaces."
+    assert client.kwargs["stream_options"] == {"include_usage": True}
+    bucket = fresh_limiter()
+    assert bucket.capacity - bucket.tokens == pytest.approx(250, abs=5)
+
+
+def test_streamed_call_without_usage_settles_from_counted_text(fresh_limiter):
+    client = StreamingClient(["Scope ", "covers 113 interfaces."])
+    asyncio.run(llm.async_stream_chat_completion(client, "gpt-4o", "Describe the scope.", max_tokens=4000))
+
+    counted = len("Describe the scope.".split()) + scheduler.CHAT_OVERHEAD_TOKENS + 4
+    bucket = fresh_limiter()
+    assert bucket.capacity - bucket.tokens == pytest.approx(counted, abs=5)
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import Modules.llm as llm
+import Modules.routing as routing
+from Modules.llm_cache import LLMCache
+
+
+class FakeClient:
+    """chat.completions.create stand-in that counts requests."""
+
+    def __init__(self, text):
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.text = text
+
+    async def create(self, **kwargs):
+        self.requests += 1
+        message = SimpleNamespace(content=self.text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def llm_cache(tmp_path, monkeypatch, offline):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(llm, "LLM_CACHE_BYPASS", False)
+    monkeypatch.setattr(routing, "_route_stats", {})
+    return cache
+
+
+def test_cache_hits_are_not_recorded_as_route_calls(llm_cache):
+    client = FakeClient("The migration covers 113 interfaces.")
+    route = {"task": "scope", "deployment": "gpt-4o", "max_tokens": 100, "temperature": 0.3}
+
+    async def generate():
+        call = llm.async_chat_completion(client, route["deployment"], "Describe the scope.", max_tokens=100)
+        return await routing.track_route(route, "Describe the scope.", call)
+
+    first = asyncio.run(generate())
+    second = asyncio.run(generate())
+
+    assert first == second
+    assert client.requests == 1
+    stats = routing.route_stats()["scope"]
+    assert stats["calls"] == 1
+    assert stats["cache_hits"] == 1
+    assert stats["completion_tokens"] == len(first.split())
@@ -0,0 +1,21 @@
+import asyncio
+import Modules.scheduler as scheduler
+
+
+def test_retry_backoff_is_not_counted_as_queue_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, "_limiters", {})
+    monkeypatch.setattr(scheduler, "_is_retryable", lambda error: True)
+    monkeypatch.setattr(scheduler, "_retry_delay", lambda error, attempt: 0.05)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("reset by peer")
+        return "ok"
+
+    assert asyncio.run(scheduler.run_scheduled("gpt-4o", 100, call)) == "ok"
+    stats = scheduler.scheduler_stats()["gpt-4o"]
+    assert (stats["calls"], stats["retries"]) == (1, 1)
+    assert stats["queue_wait_total"] == 0.0
+    assert stats["backoff_total"] == 0.05
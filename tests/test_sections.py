@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import Modules.llm as llm
+from Modules.sections import generate_sections_async
+
+
+class SectionClient:
+    """Streams back each section's heading; fails the request for one section."""
+
+    def __init__(self, failing_title):
+        self.failing_title = failing_title
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        if self.failing_title in prompt.split("Now write ONLY")[1]:
+            raise ValueError("content filter")
+        heading = prompt.split('Begin directly with the heading line "')[1].split('"')[0]
+
+        async def stream():
+            for piece in (heading, "\nBody."):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+        return stream()
+
+
+SECTIONS = [
+    {"title": "Introduction", "instructions": "Open the document."},
+    {"title": "Scope", "instructions": "List the scope."},
+    {"title": "Timeline", "instructions": "Give the timeline."},
+]
+
+
+@pytest.fixture
+def no_llm_cache(monkeypatch, offline):
+    monkeypatch.setattr(llm, "LLM_CACHE_BYPASS", True)
+
+
+def test_failed_section_is_reported_and_left_out(no_llm_cache):
+    errors = []
+    text = asyncio.run(generate_sections_async(
+        SectionClient("Scope"), "gts", "Preamble.", SECTIONS,
+        on_error=lambda number, title, error: errors.append((number, title, str(error))),
+    ))
+
+    assert errors == [(2, "Scope", "content filter")]
+    assert text == "1. Introduction\nBody.\n\n3. Timeline\nBody."
+
+
+def test_failed_section_raises_without_error_callback(no_llm_cache):
+    with pytest.raises(ValueError):
+        asyncio.run(generate_sections_async(SectionClient("Scope"), "gts", "Preamble.", SECTIONS))
@@ -0,0 +1,27 @@
+import json
+from Modules.structured import parse_sections, salvage_sections
+
+KEYS = ("executive_summary", "objective")
+
+
+def test_salvage_keeps_complete_blocks_of_truncated_response():
+    full = json.dumps({
+        "executive_summary": [
+            {"type": "paragraph", "text": "Crave InfoTech, an SAP partner, will migrate 113 ICOs.", "items": [], "headers": [], "rows": []},
+            {"type": "bullets", "text": "", "items": ["Assessment", "Migration", "Hypercare"], "headers": [], "rows": []},
+        ],
+        "objective": [
+            {"type": "paragraph", "text": "Move every interface to Integration Suite.", "items": [], "headers": [], "rows": []},
+        ],
+    })
+    for cut in (len(full) // 3, len(full) // 2, len(full) - 40, len(full) - 1):
+        sections = salvage_sections(full[:cut], KEYS)
+        assert sections is not None
+        assert set(sections) == set(KEYS)
+        for blocks in sections.values():
+            assert all({"type", "text", "items", "headers", "rows"} <= set(block) for block in blocks)
+    assert salvage_sections(full, KEYS) == parse_sections(full, KEYS)
+
+
+def test_salvage_gives_up_on_non_json():
+    assert salvage_sections("Executive Summary\nCrave InfoTech will", KEYS) is None
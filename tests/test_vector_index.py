@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from Modules.vector_index import NumpyVectorStore
+
+
+class FixedEmbeddings(Embeddings):
+    """Returns preset vectors by text (no model, no network)."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8", "binary"])
+def test_filtered_search_only_returns_matching_rows(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, 32)).astype(np.float32)
+    texts = [f"passage {i}" for i in range(20)]
+    metadatas = [{"ns": "a" if i < 2 else "b"} for i in range(20)]
+    store = NumpyVectorStore(FixedEmbeddings(dict(zip(texts, vectors.tolist()))), str(tmp_path), dtype=dtype)
+    store.add_texts(texts, metadatas=metadatas, ids=[str(i) for i in range(20)])
+
+    # The query is closest to rows outside the namespace
+    query = vectors[5] + vectors[4]
+    hits = store.search_vectors([query], k=2, filter={"ns": "a"})[0]
+
+    assert sorted(row for row, _ in hits) == [0, 1]
+    assert all(np.isfinite(score) for _, score in hits)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "binary"])
+def test_quantized_search_matches_float32_ranking(tmp_path, dtype):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(200, 64)).astype(np.float32)
+    texts = [f"passage {i}" for i in range(200)]
+    embeddings = FixedEmbeddings(dict(zip(texts, vectors.tolist())))
+    exact = NumpyVectorStore(embeddings, str(tmp_path / "float"), dtype="float32")
+    quantized = NumpyVectorStore(embeddings, str(tmp_path / dtype), dtype=dtype)
+    for store in (exact, quantized):
+        store.add_texts(texts, ids=[str(i) for i in range(200)])
+
+    queries = vectors[:10] + 0.1 * rng.normal(size=(10, 64)).astype(np.float32)
+    for expected, found in zip(exact.search_vectors(queries, k=5), quantized.search_vectors(queries, k=5)):
+        assert [row for row, _ in found][:1] == [row for row, _ in expected][:1]
+
+
+def test_writes_switch_generations_through_the_metadata_file(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(6, 16)).astype(np.float32)
+    texts = [f"passage {i}" for i in range(6)]
+    embeddings = FixedEmbeddings(dict(zip(texts, vectors.tolist())))
+    writer = NumpyVectorStore(embeddings, str(tmp_path), name="kb", dtype="int8")
+    writer.add_texts(texts[:3], ids=["0", "1", "2"])
+    reader = NumpyVectorStore(embeddings, str(tmp_path), name="kb", dtype="int8")
+    assert len(reader) == 3
+
+    writer.add_texts(texts[3:], ids=["3", "4", "5"])
+    writer.delete(["0"])
+    # One generation of matrix files on disk, named by the metadata file
+    generation = writer._generation
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [f"kb.{generation}.npy", f"kb.{generation}.scales.npy", f"kb.{generation}.float.npy", "kb.meta.json"]
+    )
+    # A reader opened on an older generation moves to the new one on its next query
+    hits = reader.search_vectors([vectors[4]], k=1)[0]
+    assert reader._ids[hits[0][0]] == "4"
+    assert len(reader) == 5
+